@@ -1,16 +1,44 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response, stream_with_context, send_from_directory
 from flask_dance.contrib.google import make_google_blueprint, google
 from flask_migrate import Migrate
 from flask_login import login_required, current_user, LoginManager
-from flask import current_app
+from flask import current_app, has_request_context
 from flask_sqlalchemy import SQLAlchemy
-import json, os, re, random, requests, smtplib
+import json, os, re, requests, smtplib, time
 from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config.database import Config
-from models.user import db, User, Report, SOSAlert, Admin, StarRating
+from config.cities import CITY_COORDS, DEFAULT_CENTER
+from models.user import db, User, Report, ReportSubmission, SOSAlert, Admin, StarRating, SafetyResource, Hotspot, HotspotRun, hash_password, bd_from_epoch_ms, bd_now
+from services.sos_tracking import sos_tracker
+from services.export import FORMATS as EXPORT_FORMATS, ExportError, parse_bbox, stream_export
+from services.metrics import instrumentation, render_metrics, timed
+from services.query_audit import query_auditor, query_budget
+from services.email_validation import EmailValidator
+from services.verification import VerificationStore, generate_code
+from services.sessions import init_sessions
+from services.ratelimit import rate_limiter
+from services.http_cache import http_cache, bump_data_version
+from services.compression import compression
+from services.idempotency import idempotency_store, idempotent
+from services.assets import assets
+from services.responders import KINDS as RESOURCE_KINDS, ResponderError, now_ms, parse_resource, responders
+from services.routing import RoutingError, route_planner
+from services.risk import RiskError, risk_grid
+from services.dedup import report_deduplicator
+from services.search import SearchError, report_search
+from services.user_directory import UserQueryError, page_of_users, parse_verified
+from services.partitions import partition_manager
+from services.sos_escalation import primary_contacts, sos_escalator
+from services.outbound import MailRateLimited, outbound_mail
+from services.serialization import (
+    SerializationError, columnar, dumps, iter_partitions, json_array_chunks, points_response, rows_response,
+    stream_json,
+)
+from sqlalchemy import select
 import base64
 import hashlib
 import hmac
@@ -34,6 +62,59 @@ with app.app_context():
 
 migrate = Migrate(app,db)
 
+# Server-side sessions: the cookie only carries a session id
+session_store = init_sessions(app)
+
+# Token-bucket limits on login, register, reports, ratings and SOS
+rate_limiter.init_app(app)
+
+# Client address from the trusted proxies' X-Forwarded-For hop. Wraps the IP rate limits,
+# which run before Flask, so they see it too
+if app.config["TRUSTED_PROXIES"]:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXIES"], x_proto=app.config["TRUSTED_PROXIES"])
+
+# ETag / 304 handling and cached bodies for reports, SOS alerts, map and resources
+http_cache.init_app(app)
+
+# gzip / brotli for text and JSON responses, compressed bodies cached by ETag
+compression.init_app(app)
+
+# Replay protection for SOS and reports resent by the offline queue
+idempotency_store.init_app(app)
+
+# Near-duplicate reports are merged into one report with a confirmation count
+report_deduplicator.init_app(app)
+
+# Full-text search over report descriptions (tsvector + GIN, FTS5 on SQLite)
+report_search.init_app(app)
+
+# Monthly partitions for reports and SOS alerts: make sure the coming months exist
+partition_manager.init_app(app)
+
+# Content-hashed static URLs with immutable caching, responsive image helper
+assets.init_app(app)
+
+# Police stations, hospitals and shelters in a KD-tree for nearest lookups
+responders.init_app(app)
+
+# Time-decayed risk scores per grid cell for map shading and route scoring
+risk_grid.init_app(app)
+
+# Road graph with report-weighted street costs for the safe route planner
+route_planner.init_app(app)
+
+# Batched writer for live SOS location updates
+sos_tracker.init_app(app)
+
+# Per-route latency, SQL and SMTP timings for /metrics
+instrumentation.init_app(app)
+
+# N+1 / slow query detection and query budgets (dev and tests)
+query_auditor.init_app(app)
+
+# Pending sign-ups: hashed codes with expiry, attempt and resend limits
+verification_store = VerificationStore.from_config(app.config)
+
 # ======= Google OAuth =======
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_OAUTH_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_OAUTH_CLIENT_SECRET")
@@ -61,32 +142,66 @@ def is_valid_email(email):
 
 MAILBOXLAYER_KEY = os.getenv("MAILBOXLAYER_KEY")
 
+# Pooled HTTP session + per-domain verdict cache (services/email_validation.py)
+email_validator = EmailValidator(api_key=MAILBOXLAYER_KEY)
+
 def mailboxlayer_check(email):
-    if DEV_MODE or not MAILBOXLAYER_KEY:
+    if DEV_MODE:
         return True, "Email validation skipped in dev mode"
-    url = f"http://apilayer.net/api/check?access_key={MAILBOXLAYER_KEY}&email={email}&smtp=1&format=1"
     try:
-        data = requests.get(url, timeout=8).json()  
-        if not data.get("success", True) and "error" in data:
-            return True, "Email validation service unavailable, skipping"
-        if not data.get("format_valid", False): return False, "Email format is invalid."
-        if not data.get("mx_found", False): return False, "Email domain has no MX records."
-        if not data.get("smtp_check", False): return False, "Email address does not exist or cannot receive mail."
-        if data.get("disposable", False): return False, "Disposable/temporary email addresses are not allowed."
-        return True, "Email is valid."
+        with timed("email_validation"):
+            return email_validator.check(email)
     except Exception:
         return True, "Email validation skipped"
 
 
 # ======= 6-digit code =======
 def generate_verification_code():
-    return str(random.randint(100000, 999999))
+    return generate_code()
+
+
+def queued_at_timestamp():
+    """Time the offline queue first tried the request (X-Queued-At, epoch ms), if plausible"""
+    try:
+        queued_ms = int(request.headers.get("X-Queued-At", ""))
+    except ValueError:
+        return None
+    now_ms = time.time() * 1000
+    if now_ms - 24 * 3600 * 1000 <= queued_ms <= now_ms + 60 * 1000:
+        return bd_from_epoch_ms(queued_ms)
+    return None
+
+
+def client_ip():
+    """Client address; behind TRUSTED_PROXIES, ProxyFix has already taken it from X-Forwarded-For"""
+    return request.remote_addr
 
 
 
 GMAIL_SENDER = os.getenv("GMAIL_SENDER")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
 
+# Overridable so benchmarks can point mail at a local sink (benchmarks/smtp_sink.py)
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "True").lower() in ("1", "true", "yes")
+
+def smtp_send(msg, sender, app_password, timeout=10):
+    """Deliver one message through Gmail, timing connect and send separately"""
+    with timed("smtp_connect"):
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=timeout)
+        if SMTP_STARTTLS:
+            server.starttls()
+        server.login(sender, app_password.replace(" ", ""))
+    try:
+        with timed("smtp_send"):
+            server.send_message(msg)
+    finally:
+        server.quit()
+
+# Outbound mail in priority lanes (SOS, transactional) sharing the Gmail quota
+outbound_mail.init_app(app, transport=lambda msg: smtp_send(msg, GMAIL_SENDER, GMAIL_APP_PASSWORD))
+
 def send_verification_code(email, code):
 
     if DEV_MODE:
@@ -98,15 +213,14 @@ def send_verification_code(email, code):
         msg['From'] = f"Proteeti <{GMAIL_SENDER}>"
         msg['To'] = email
         msg['Subject'] = "Proteeti Verification Code"
-        msg.attach(MIMEText(f"Your verification code is: {code}\n\nThis code will expire in 10 minutes.\n", 'plain'))
+        minutes = max(1, round(verification_store.ttl / 60))
+        msg.attach(MIMEText(f"Your verification code is: {code}\n\nThis code will expire in {minutes} minute{'s' if minutes != 1 else ''}.\n", 'plain'))
 
-        # hard timeout prevents long stall
-        server = smtplib.SMTP('smtp.gmail.com', 587, timeout=8)
-        server.starttls()
-        server.login(GMAIL_SENDER, GMAIL_APP_PASSWORD.replace(" ", ""))
-        server.send_message(msg)
-        server.quit()
-        return True
+        # Sent before the response; refused when a registration spike has used up the quota left beside SOS mail
+        return outbound_mail.deliver([msg], lane="transactional") == 1
+    except MailRateLimited as e:
+        app.logger.warning(f"Verification email to {email} not sent: {e}")
+        return False
     except Exception as e:
         try:
             app.logger.warning(f"Email send failed: {e}")
@@ -116,22 +230,59 @@ def send_verification_code(email, code):
 
 
 
-def send_sos_email_with_location(user, latitude, longitude):
-    """Send immediate SOS email with live location (no attachment)"""
-    if not user.trusted_contacts:
+def sos_track_token(alert_id):
+    """Token that lets trusted contacts follow an alert's live location without logging in"""
+    return hmac.new(
+        app.secret_key.encode("utf-8"),
+        f"sos-track:{alert_id}".encode("utf-8"),
+        hashlib.sha256
+    ).hexdigest()[:32]
+
+
+def sos_ack_token(alert_id):
+    """Token in the SOS emails that lets a trusted contact acknowledge the alert"""
+    return hmac.new(
+        app.secret_key.encode("utf-8"),
+        f"sos-ack:{alert_id}".encode("utf-8"),
+        hashlib.sha256
+    ).hexdigest()[:32]
+
+
+def external_url(endpoint, **values):
+    """Absolute URL, also from the escalation threads where there is no request to take the host from"""
+    if has_request_context():
+        return url_for(endpoint, _external=True, **values)
+    with app.test_request_context(base_url=app.config["PUBLIC_BASE_URL"]):
+        return url_for(endpoint, _external=True, **values)
+
+
+def send_sos_email_with_location(user, latitude, longitude, tracking_link=None, nearest_station=None,
+                                 contacts=None, ack_link=None):
+    """Send immediate SOS email with live location (no attachment); returns how many were delivered"""
+    contacts = user.trusted_contacts if contacts is None else contacts
+    if not contacts:
         print(f"[DEBUG] No trusted contacts found for {user.username}")
-        return False
+        return 0
     
     GMAIL_SENDER = os.getenv("GMAIL_SENDER")
     GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
     
     if not GMAIL_SENDER or not GMAIL_APP_PASSWORD:
-        print("[DEBUG] Gmail credentials not configured!")
-        return False
+        app.logger.warning("Gmail credentials not configured!")
+        return 0
     
     maps_link = f"https://www.google.com/maps?q={latitude},{longitude}"
+    tracking_line = f"\n📡 FOLLOW LIVE: {tracking_link}\n" if tracking_link else ""
+    station_line = ""
+    if nearest_station:
+        station_line = (f"\n🚓 NEAREST POLICE STATION: {nearest_station['name']} "
+                        f"({nearest_station['distance_km']} km away)"
+                        f"\nPhone: {nearest_station['phone'] or 'N/A'}\n")
     
-    for contact in user.trusted_contacts:
+    ack_line = f"\n✅ RESPONDING? Let others know: {ack_link}\n" if ack_link else ""
+    
+    messages = []
+    for contact in contacts:
         try:
             recipient_email = contact.get('email')
             print(f"[DEBUG] Sending location SOS to {recipient_email}")
@@ -147,43 +298,103 @@ def send_sos_email_with_location(user, latitude, longitude):
 
 📍 LIVE LOCATION: {maps_link}
 Coordinates: {latitude}, {longitude}
-
+{tracking_line}{station_line}{ack_line}
 IMMEDIATE ACTION REQUIRED!
 This is an automated SOS alert from Proteeti.
 An audio recording will follow shortly."""
             
             msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP('smtp.gmail.com', 587, timeout=10)
-            server.starttls()
-            server.login(GMAIL_SENDER, GMAIL_APP_PASSWORD.replace(" ", ""))
-            server.send_message(msg)
-            server.quit()
-            
-            print(f"[DEBUG] Location SOS sent to {recipient_email}")
+            messages.append(msg)
+        except Exception as e:
+            app.logger.warning(f"Failed to build location SOS: {e}")
+            continue
+    
+    # Sent before the request returns, so the response can say whether anyone was reached
+    sent = outbound_mail.deliver(messages)
+    app.logger.info(f"Location SOS delivered to {sent} of {len(contacts)} contacts")
+    return sent
+
+
+def send_sos_escalation_email(alert, user, level, contacts, flag_admins):
+    """Reminder for an SOS nobody has acknowledged yet; also mails SOS_ADMIN_EMAILS when admins are flagged.
+    Returns how many were delivered, or None when there is nobody to email"""
+    if not contacts and not (flag_admins and app.config["SOS_ADMIN_EMAILS"]):
+        return None
+    
+    GMAIL_SENDER = os.getenv("GMAIL_SENDER")
+    GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
+    
+    if not GMAIL_SENDER or not GMAIL_APP_PASSWORD:
+        app.logger.warning("Gmail credentials not configured!")
+        return 0
+    
+    latest = sos_tracker.snapshot(alert.id)["latest"] or {"lat": alert.lat, "lng": alert.lng}
+    maps_link = f"https://www.google.com/maps?q={latest['lat']},{latest['lng']}"
+    tracking_link = external_url("follow_sos_location", alert_id=alert.id, token=sos_track_token(alert.id))
+    ack_link = external_url("acknowledge_sos_alert", alert_id=alert.id, token=sos_ack_token(alert.id))
+    
+    recipients = [(c.get("email"), f"""SOS ALERT STILL UNANSWERED (reminder {level})
+
+{user.username} raised an SOS at {alert.created_at} and nobody has confirmed they are responding.
+
+📍 LATEST LOCATION: {maps_link}
+📡 FOLLOW LIVE: {tracking_link}
+
+✅ If you are responding, let the others know: {ack_link}
+
+This is an automated SOS reminder from Proteeti.""") for c in contacts]
+    
+    if flag_admins:
+        app.logger.info(f"SOS alert {alert.id} of {user.username} flagged for admins (level {level})")
+        admin_body = f"""SOS ALERT UNACKNOWLEDGED
+
+SOS #{alert.id} from {user.username}, raised at {alert.created_at}, has not been acknowledged
+by any trusted contact after {level} escalation steps.
+
+📍 LATEST LOCATION: {maps_link}
+📡 FOLLOW LIVE: {tracking_link}
+Acknowledge: {ack_link}"""
+        recipients += [(email, admin_body) for email in app.config["SOS_ADMIN_EMAILS"]]
+    
+    messages = []
+    for recipient_email, body in recipients:
+        try:
+            msg = MIMEMultipart()
+            msg['From'] = f"Proteeti <{GMAIL_SENDER}>"
+            msg['To'] = recipient_email
+            msg['Subject'] = f"🚨 SOS REMINDER - {user.username} STILL NEEDS HELP"
+            msg.attach(MIMEText(body, 'plain'))
+            messages.append(msg)
         except Exception as e:
-            print(f"[DEBUG] Failed to send location SOS: {e}")
+            app.logger.warning(f"Failed to build SOS reminder: {e}")
             continue
     
-    return True
+    sent = outbound_mail.deliver(messages)
+    app.logger.info(f"SOS reminder {level} delivered to {sent} of {len(recipients)} recipients")
+    return sent
+
+
+# Re-notify, widen to secondary contacts and flag admins while an SOS goes unacknowledged
+sos_escalator.init_app(app, notifier=send_sos_escalation_email)
 
 
 def send_sos_email_with_audio(user, audio_blob):
-    """Send SOS email with 2-minute audio recording"""
+    """Send SOS email with 2-minute audio recording; returns how many were delivered"""
     if not user.trusted_contacts:
         print(f"[DEBUG] No trusted contacts found for {user.username}")
-        return False
+        return 0
     
     GMAIL_SENDER = os.getenv("GMAIL_SENDER")
     GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
     
     if not GMAIL_SENDER or not GMAIL_APP_PASSWORD:
-        print("[DEBUG] Gmail credentials not configured!")
-        return False
+        app.logger.warning("Gmail credentials not configured!")
+        return 0
     
     audio_size_mb = len(audio_blob) / 1024 / 1024
     print(f"[DEBUG] Audio file size: {audio_size_mb:.2f} MB")
     
+    messages = []
     for contact in user.trusted_contacts:
         try:
             recipient_email = contact.get('email')
@@ -209,23 +420,47 @@ This is an automated SOS alert from Proteeti."""
             part = MIMEApplication(audio_blob)
             part.add_header('Content-Disposition', 'attachment', filename='emergency_audio.webm')
             msg.attach(part)
-            
-            server = smtplib.SMTP('smtp.gmail.com', 587, timeout=10)
-            server.starttls()
-            server.login(GMAIL_SENDER, GMAIL_APP_PASSWORD.replace(" ", ""))
-            server.send_message(msg)
-            server.quit()
-            
-            print(f"[DEBUG] Audio SOS sent successfully to {recipient_email}")
+            messages.append(msg)
         except Exception as e:
-            print(f"[DEBUG] Failed to send audio SOS: {e}")
+            app.logger.warning(f"Failed to build audio SOS: {e}")
             continue
     
-    return True
+    sent = outbound_mail.deliver(messages)
+    app.logger.info(f"Audio SOS delivered to {sent} of {len(user.trusted_contacts)} contacts")
+    return sent
 
 
 
 # ======= Routes =======
+@app.route("/service-worker.js")
+def service_worker():
+    """Served from the root so the worker's scope covers every page"""
+    response = send_from_directory(app.static_folder, "service-worker.js", max_age=0)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: admins, or a scraper sending METRICS_TOKEN as a bearer token"""
+    if not session.get("admin_loggedin"):
+        token = app.config.get("METRICS_TOKEN")
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not token or not hmac.compare_digest(supplied, token):
+            return jsonify({"error": "Unauthorized"}), 401
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/cron/sos-escalation")
+def cron_sos_escalation():
+    """Send the SOS escalation steps that are due; for schedulers on hosts without a long-lived worker"""
+    token = app.config.get("CRON_SECRET")
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not token or not hmac.compare_digest(supplied, token):
+        return jsonify({"error": "Unauthorized"}), 401
+    actions = sos_escalator.run_due()
+    return jsonify({"escalated": len(actions), "actions": actions})
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -250,7 +485,13 @@ def login():
             (User.username == username_or_email) | (User.email == username_or_email)
         ).first()
         
-        if user and user.check_password(password):
+        if user:
+            with timed("bcrypt"):
+                password_ok = user.check_password(password)
+        else:
+            password_ok = False
+
+        if password_ok:
             session.clear()
             session["loggedin"] = True
             session["username"] = user.username
@@ -291,17 +532,29 @@ def register():
             error = "Email already in use."
             return render_template("register.html", error=error)
         
-        code = generate_verification_code()
-        send_verification_code(email, code)
+        # Remote deliverability check last: it can take a round trip to mailboxlayer
+        email_ok, email_message = mailboxlayer_check(email)
+        if not email_ok:
+            return render_template("register.html", error=email_message)
         
-        session["pending_user"] = {
-            "flow": "manual",
-            "username": username,
-            "email": email,
-            "password": password,
-            "code": code,
-            "created_at": datetime.now().isoformat(),
-        }
+        # Refuse throttled clients before paying for a bcrypt round
+        error = verification_store.start_error(email, ip=client_ip())
+        if error:
+            return render_template("register.html", error=error)
+        
+        with timed("bcrypt"):
+            password_hash = hash_password(password)
+        code, error = verification_store.start(email, username, password_hash, ip=client_ip())
+        if error:
+            return render_template("register.html", error=error)
+        if not send_verification_code(email, code):
+            verification_store.discard(email)
+            return render_template("register.html", error="We couldn't send the verification email right now. Please try again in a few minutes.")
+        
+        # Only the address goes in the cookie; everything else stays server-side
+        session["pending_email"] = email
+        if DEV_MODE:
+            session["dev_code"] = code
         
         return redirect(url_for("verify_email"))
     
@@ -310,24 +563,29 @@ def register():
 @app.route("/verify-email", methods=["GET", "POST"])
 def verify_email():
     error = None
-    pending = session.get("pending_user")
+    pending_email = session.get("pending_email")
     
-    if not pending:
+    if not pending_email:
         return redirect(url_for("register"))
     
     show_code = DEV_MODE
     
     if request.method == "POST":
         entered_code = request.form["code"].strip()
+        pending, error = verification_store.verify(pending_email, entered_code)
         
-        if entered_code == pending["code"]:
+        if pending:
+            if User.query.filter((User.username == pending.username) | (User.email == pending.email)).first():
+                session.pop("pending_email", None)
+                return render_template("register.html", error="Username or email was taken meanwhile. Please register again.")
+            
             # Create user in database
             user = User(
-                username=pending["username"],
-                email=pending["email"],
-                verified=True
+                username=pending.username,
+                email=pending.email,
+                verified=True,
+                password_hash=pending.password_hash
             )
-            user.set_password(pending["password"])
             
             db.session.add(user)
             db.session.commit()
@@ -338,10 +596,26 @@ def verify_email():
             session.modified = True
             
             return redirect(url_for("onboarding"))
+    
+    return render_template("verify_email.html", error=error, show_code=show_code, code=(session.get("dev_code") if show_code else None))
+
+@app.route("/verify-email/resend", methods=["POST"])
+def resend_verification_code():
+    pending_email = session.get("pending_email")
+    if not pending_email:
+        return redirect(url_for("register"))
+    
+    code, error = verification_store.resend(pending_email, ip=client_ip())
+    notice = None
+    if code:
+        if send_verification_code(pending_email, code):
+            notice = "A new code has been sent."
         else:
-            error = "Verification code incorrect."
+            error = "We couldn't send a new code right now. Please try again in a few minutes."
+        if DEV_MODE:
+            session["dev_code"] = code
     
-    return render_template("verify_email.html", error=error, show_code=show_code, code=(pending["code"] if show_code else None))
+    return render_template("verify_email.html", error=error, notice=notice, show_code=DEV_MODE, code=(session.get("dev_code") if DEV_MODE else None))
 
 @app.route("/account")
 def account():
@@ -403,6 +677,7 @@ def update_account():
             user.profile[k] = v
         
         db.session.commit()
+        bump_data_version("profiles")
         return jsonify({"message": "Account updated"}), 200
     
     except Exception as e:
@@ -426,7 +701,9 @@ def add_trusted_contact():
             "id": len(user.trusted_contacts) + 1,
             "name": data.get("name"),
             "email": data.get("email"),
-            "phone": data.get("phone")
+            "phone": data.get("phone"),
+            # Secondary contacts are emailed only when an SOS goes unacknowledged
+            "secondary": bool(data.get("secondary"))
         }
         
         user.trusted_contacts.append(new_contact)
@@ -493,6 +770,7 @@ def profile():
                     user.profile = {}
                 user.profile[k] = core[k]
         db.session.commit()
+        bump_data_version("profiles")
         return jsonify({"message": "Profile updated"}), 200
     
     return render_template("profile.html", user=user.to_dict(), username=username)
@@ -545,6 +823,7 @@ def onboarding():
         user.trusted_contacts.append(trusted_contact)
         
         db.session.commit()  
+        bump_data_version("profiles")
         return redirect(url_for("index"))  
         
     return render_template("onboarding.html", username=username)
@@ -579,12 +858,14 @@ def edit_profile():
                     profile[key] = value
         user.profile = profile
         db.session.commit()
+        bump_data_version("profiles")
         return redirect(url_for("account"))
     return render_template("edit_profile.html", user=user)
 
 
 
 @app.route("/send_sos", methods=["POST"])
+@idempotent
 def send_sos():
     """Send immediate location-based SOS alert"""
     
@@ -621,17 +902,40 @@ def send_sos():
             lat=lat_f,
             lng=lng_f,
             accuracy=accuracy or 0,
-            status='active'
+            status='active',
+            next_escalation_at=sos_escalator.first_due()
         )
+        queued_at = queued_at_timestamp()
+        if queued_at:
+            sos_alert.created_at = queued_at
         db.session.add(sos_alert)
         db.session.commit()
-
-        send_sos_email_with_location(user, lat_f, lng_f)
+        bump_data_version("sos_alerts")
+        sos_escalator.track(sos_alert.id, sos_alert.next_escalation_at, 0)
+
+        tracking_link = url_for("follow_sos_location", alert_id=sos_alert.id,
+                                token=sos_track_token(sos_alert.id), _external=True)
+        ack_link = url_for("acknowledge_sos_alert", alert_id=sos_alert.id,
+                           token=sos_ack_token(sos_alert.id), _external=True)
+        nearest_station = responders.nearest_one(lat_f, lng_f, kind="police")
+        # Secondary contacts are only brought in if nobody acknowledges (services/sos_escalation.py)
+        sent = send_sos_email_with_location(user, lat_f, lng_f, tracking_link, nearest_station,
+                                            contacts=primary_contacts(user), ack_link=ack_link)
+
+        if not sent:
+            # The alert is stored and escalation keeps mailing, but nobody has been reached yet
+            return jsonify({
+                "message": "SOS recorded, but no alert email could be sent yet. Call for help directly if you can.",
+                "status": "warning",
+                "alert_id": sos_alert.id,
+                "emails_sent": 0
+            }), 200
 
         return jsonify({
             "message": "Location SOS sent. Recording audio...",
             "status": "success",
-            "alert_id": sos_alert.id
+            "alert_id": sos_alert.id,
+            "emails_sent": sent
         }), 200
 
     except Exception as e:
@@ -666,7 +970,8 @@ def send_sos_audio():
         print(f"[DEBUG] SOS audio from {username}")
         print(f"[DEBUG] Audio size: {len(audio_blob) / 1024 / 1024:.2f} MB")
 
-        send_sos_email_with_audio(user, audio_blob)
+        if not send_sos_email_with_audio(user, audio_blob):
+            return jsonify({"error": "The recording could not be emailed to your contacts"}), 502
 
         return jsonify({
             "message": "Audio SOS sent",
@@ -687,75 +992,142 @@ def sos():
 
 
 @app.route("/api/sos-alerts")
+@query_budget(2)
+@http_cache.cached("sos_alerts")
 def get_sos_alerts():
     sos_alerts = SOSAlert.query.all()
     return jsonify([alert.to_dict() for alert in sos_alerts])
 
 
+@app.route("/api/sos-alerts/<int:alert_id>/location", methods=["POST"])
+def update_sos_location(alert_id):
+    """Accept periodic position updates while an SOS alert is active"""
+    if not session.get("loggedin"):
+        return jsonify({"error": "Please login first"}), 401
+
+    state = sos_tracker.alert_state(alert_id)
+    if not state or state[0] != session.get("username"):
+        return jsonify({"error": "Alert not found"}), 404
+    if state[1] != 'active':
+        return jsonify({"error": "Alert is no longer active"}), 409
+
+    data = request.get_json(silent=True) or {}
+    if isinstance(data, list):
+        points = data
+    elif isinstance(data, dict):
+        points = data.get("points") if isinstance(data.get("points"), list) else [data]
+    else:
+        return jsonify({"error": "Expected a location object or a list of points"}), 400
+    accepted = sos_tracker.record(alert_id, points)
+    if not accepted:
+        return jsonify({"error": "Invalid location coordinates"}), 400
+    if app.config["SOS_ESCALATION_ON_TRACK"]:
+        # No long-lived timer thread (serverless): the open SOS page keeps escalation moving
+        sos_escalator.escalate_if_due(alert_id)
+
+    return jsonify({"status": "ok", "accepted": accepted}), 200
+
+
+def can_view_sos_location(alert_id, state):
+    if session.get("admin_loggedin"):
+        return True
+    if session.get("loggedin") and session.get("username") == state[0]:
+        return True
+    token = request.args.get("token", "")
+    return bool(token) and hmac.compare_digest(token, sos_track_token(alert_id))
+
+
+@app.route("/api/sos-alerts/<int:alert_id>/location")
+def get_sos_location(alert_id):
+    """Throttled view of the latest position and recent trail of an alert"""
+    state = sos_tracker.alert_state(alert_id)
+    if not state or not can_view_sos_location(alert_id, state):
+        return jsonify({"error": "Alert not found"}), 404
+
+    since = request.args.get("since", type=int)
+    return jsonify(sos_tracker.snapshot(alert_id, since=since)), 200
+
+
+@app.route("/sos/ack/<int:alert_id>", methods=["GET", "POST"])
+def acknowledge_sos_alert(alert_id):
+    """Link in the SOS emails: a contact confirms they are responding, which stops the reminders"""
+    alert = db.session.get(SOSAlert, alert_id)
+    token = request.values.get("token", "")
+    if session.get("admin_loggedin"):
+        by = "admin"
+    elif session.get("loggedin") and alert and session.get("username") == alert.username:
+        by = alert.username
+    elif token and hmac.compare_digest(token, sos_ack_token(alert_id)):
+        by = request.form.get("name", "").strip() or "a trusted contact"
+    else:
+        alert = None
+    if alert is None:
+        if request.is_json:
+            return jsonify({"error": "Alert not found"}), 404
+        return "Acknowledgement link is invalid or has expired.", 404
+
+    notice = None
+    if request.method == "POST":
+        acknowledged = sos_escalator.acknowledge(alert, by)
+        if request.is_json:
+            return jsonify({"acknowledged": acknowledged, "alert": alert.to_dict()}), 200
+        if acknowledged:
+            notice = "Thank you. The other contacts will see that you are responding."
+
+    tracking_link = url_for("follow_sos_location", alert_id=alert.id, token=sos_track_token(alert.id))
+    return render_template("sos_ack.html", alert=alert, token=token, notice=notice,
+                           tracking_link=tracking_link)
+
+
+@app.route("/sos/track/<int:alert_id>")
+def follow_sos_location(alert_id):
+    """Link sent to trusted contacts: opens the alert's latest position on Google Maps"""
+    state = sos_tracker.alert_state(alert_id)
+    if not state or not can_view_sos_location(alert_id, state):
+        return "Tracking link is invalid or has expired.", 404
+
+    latest = sos_tracker.snapshot(alert_id)["latest"]
+    if not latest:
+        return "Location not available yet.", 404
+    return redirect(f"https://www.google.com/maps?q={latest['lat']},{latest['lng']}")
+
+
 
 
 
 @app.route("/map")
+@query_budget(2)
+@http_cache.cached("profiles", per_user=True)
 def show_map():
     # Default to Dhaka if not logged-in or no city
-    center_lat = 23.8103
-    center_lng = 90.4125
+    center_lat, center_lng = DEFAULT_CENTER
 
     if session.get('loggedin'):
         user = User.query.filter_by(username=session.get('username')).first()
         profile = user.profile if user and user.profile else {}
         city = profile.get('city')
 
-        CITY_COORDS = {
-            "Dhaka North": (23.8341, 90.3841), 
-            "Dhaka South": (23.7104, 90.4074), 
-            "Chattogram": (22.3569, 91.7832),
-            "Khulna": (22.8200, 89.5500),
-            "Rajshahi": (24.3745, 88.6042),
-            "Sylhet": (24.8949, 91.8687),
-            "Barisal": (22.7010, 90.3535),
-            "Rangpur": (25.7558, 89.2440),
-            "Comilla": (23.4607, 91.1800),
-            "Narayanganj": (23.6200, 90.5000),
-            "Gazipur": (23.9999, 90.4203),
-            "Mymensingh": (24.7539, 90.4031),
-        }
-
         if city and city in CITY_COORDS:
             center_lat, center_lng = CITY_COORDS[city]
         elif profile.get('center_lat') and profile.get('center_lng'):
             center_lat = profile['center_lat']
             center_lng = profile['center_lng']
 
-    reports = Report.query.all() 
-    return render_template("map.html", reports=reports, center_lat=center_lat, center_lng=center_lng)
+    # Markers are fetched by the page from /api/reports
+    return render_template("map.html", center_lat=center_lat, center_lng=center_lng)
 
 
 @app.route("/resources")
+@http_cache.cached("profiles", per_user=True)
 def resources():
     # Default to Dhaka center
-    center_lat = 23.8103
-    center_lng = 90.4125
+    center_lat, center_lng = DEFAULT_CENTER
 
     if session.get("loggedin"):
         user = User.query.filter_by(username=session.get("username")).first()
         profile = user.profile if user and user.profile else {}
         city = profile.get('city')
 
-        CITY_COORDS = {
-            "Dhaka North": (23.8341, 90.3841),
-            "Dhaka South": (23.7104, 90.4074),
-            "Chattogram": (22.3569, 91.7832),
-            "Khulna": (22.8200, 89.5500),
-            "Rajshahi": (24.3745, 88.6042),
-            "Sylhet": (24.8949, 91.8687),
-            "Barisal": (22.7010, 90.3535),
-            "Rangpur": (25.7558, 89.2440),
-            "Comilla": (23.4607, 91.1800),
-            "Narayanganj": (23.6200, 90.5000),
-            "Gazipur": (23.9999, 90.4203),
-            "Mymensingh": (24.7539, 90.4031),
-        }
         if city and city in CITY_COORDS:
             center_lat, center_lng = CITY_COORDS[city]
 
@@ -764,35 +1136,177 @@ def resources():
 
 
 
+@app.route("/api/resources/nearest")
+def nearest_resources():
+    """k nearest police stations / hospitals / shelters: ?lat=&lng=&k=5&kind=police&radius_km=20"""
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({"error": "Valid lat and lng required"}), 400
+    kind = request.args.get("kind") or None
+    if kind is not None and kind not in RESOURCE_KINDS:
+        return jsonify({"error": f"kind must be one of: {', '.join(RESOURCE_KINDS)}"}), 400
+    k = request.args.get("k", 5, type=int)
+    radius_km = request.args.get("radius_km", type=float)
+
+    results = responders.nearest(lat, lng, k=k, kind=kind, max_km=radius_km)
+    response = jsonify({"results": results})
+    response.headers["Cache-Control"] = "public, max-age=60"
+    return response
+
+
+
+
+@app.route("/route")
+def route_planner_page():
+    center_lat, center_lng = DEFAULT_CENTER
+    return render_template("route.html", center_lat=center_lat, center_lng=center_lng,
+                           enabled=route_planner.enabled)
+
+
+def parse_point(value):
+    try:
+        lat, lng = (float(v) for v in (value or "").split(","))
+    except ValueError:
+        return None
+    return (lat, lng) if -90 <= lat <= 90 and -180 <= lng <= 180 else None
+
+
+@app.route("/api/route")
+def plan_route():
+    """Walking route avoiding reported areas: ?from=lat,lng&to=lat,lng&safety=1 (0 = shortest)"""
+    if not route_planner.enabled:
+        return jsonify({"error": "Route planning is not configured"}), 503
+    start, end = parse_point(request.args.get("from")), parse_point(request.args.get("to"))
+    if start is None or end is None:
+        return jsonify({"error": "from and to must be 'lat,lng'"}), 400
+    safety = request.args.get("safety", 1.0, type=float)
+
+    try:
+        result = route_planner.route(start, end, safety=min(max(safety, 0.0), 5.0))
+    except RoutingError as e:
+        return jsonify({"error": str(e)}), 404
+    try:
+        result["area_risk"] = risk_grid.route(result["path"])
+    except RiskError:
+        pass
+    return jsonify(result)
+
+
+@app.route("/api/risk/point")
+def risk_at_point():
+    """Current decayed risk score around a point: ?lat=&lng=&radius_m=250"""
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    if lat is None or lng is None:
+        return jsonify({"error": "Valid lat and lng required"}), 400
+    radius_m = min(max(request.args.get("radius_m", 250.0, type=float), 0.0), 5000.0)
+    try:
+        return jsonify({"score": round(risk_grid.point(lat, lng, radius_m), 4)})
+    except RiskError as e:
+        return jsonify({"error": str(e)}), 503
+
+
+@app.route("/api/risk/area")
+@http_cache.cached("reports")
+def risk_in_area():
+    """Highest-risk cells in ?bbox=min_lng,min_lat,max_lng,max_lat (at most ?limit=500), columnar"""
+    try:
+        bbox = parse_bbox(request.args.get("bbox"))
+        if bbox is None:
+            return jsonify({"error": "bbox required"}), 400
+        cells = risk_grid.area(bbox, limit=min(max(request.args.get("limit", 500, type=int), 1), 5000))
+    except (ExportError, RiskError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "count": len(cells),
+        "cell_lat": risk_grid.cell_lat,
+        "cell_lng": risk_grid.cell_lng,
+        "columns": {
+            "lat": [round(c[0], 6) for c in cells],
+            "lng": [round(c[1], 6) for c in cells],
+            "score": [round(c[2], 4) for c in cells],
+        },
+    })
+
+
+@app.route("/api/risk/route", methods=["POST"])
+def risk_along_route():
+    """Score a path: {"path": [[lat, lng], ...], "radius_m": 0}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        path = [(float(p[0]), float(p[1])) for p in data.get("path") or []]
+    except (TypeError, ValueError, IndexError):
+        return jsonify({"error": "path must be a list of [lat, lng]"}), 400
+    if not path or len(path) > 10000:
+        return jsonify({"error": "path must have 1 to 10000 points"}), 400
+    try:
+        radius_m = min(max(float(data.get("radius_m") or 0), 0.0), 1000.0)
+        return jsonify(risk_grid.route(path, radius_m))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+
+
+
 @app.route("/submit_report", methods=["POST"])
+@idempotent
 def submit_report():
     if not session.get("loggedin"):
         return jsonify({"error": "Please login first"}), 401
     
     try:
         report_data = request.get_json()
+        try:
+            lat = float(report_data.get("lat"))
+            lng = float(report_data.get("lng"))
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid location coordinates"}), 400
         
-        report = Report(
+        # Near-duplicates of a recent report become a confirmation of it
+        report, merged = report_deduplicator.submit(
             username=session.get("username"),
-            lat=report_data.get("lat"),
-            lng=report_data.get("lng"),
+            lat=lat,
+            lng=lng,
             category=report_data.get("category"),
-            description=report_data.get("description", "")
+            description=report_data.get("description", ""),
+            timestamp=queued_at_timestamp() or bd_now(),
         )
-        
-        db.session.add(report)
-        db.session.commit()
-        
-        return jsonify({"message": "Report submitted successfully", "status": "ok", "report_id": report.id}), 200
+        bump_data_version("reports")
+        if not merged:
+            route_planner.add_report(report)
+            risk_grid.add_report(report)
+        
+        message = ("This hazard was already reported nearby; your report was added as a confirmation"
+                   if merged else "Report submitted successfully")
+        return jsonify({"message": message, "status": "ok", "report_id": report.id,
+                        "merged": merged, "confirmations": report.confirmations}), 200
     
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+# Same fields as Report.to_dict() / SOSAlert.to_dict(), read as plain tuples
+REPORT_COLUMNS = [Report.id, Report.username, Report.lat, Report.lng,
+                  Report.category, Report.description, Report.timestamp, Report.confirmations]
+SOS_ALERT_COLUMNS = [SOSAlert.id, SOSAlert.user_id, SOSAlert.username, SOSAlert.lat, SOSAlert.lng,
+                     SOSAlert.accuracy, SOSAlert.status, SOSAlert.created_at,
+                     SOSAlert.escalation_level, SOSAlert.acknowledged_at]
+
+
 @app.route("/api/reports")
+@query_budget(2)
+@http_cache.cached("reports")
 def get_reports_api():
-    reports = Report.query.all()
-    return jsonify([r.to_dict() for r in reports])
+    """All reports; ?format=columnar&fields=lat,lng,category or ?format=binary for compact map data"""
+    try:
+        return rows_response(
+            select(*REPORT_COLUMNS).order_by(Report.id), [c.key for c in REPORT_COLUMNS],
+            fmt=request.args.get("format", "json"), fields=request.args.get("fields"),
+            dictionary=("category", "username"), point_category="category",
+        )
+    except SerializationError as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route("/logout")
 def logout():
@@ -879,12 +1393,19 @@ def require_admin_api():
     return None
 
 @app.route("/api/admin/sos-alerts")
+@query_budget(1)
 def get_admin_sos_alerts():
     check = require_admin_api()
     if check: return check
     
-    alerts = SOSAlert.query.order_by(SOSAlert.created_at.desc()).all()
-    return jsonify([alert.to_dict() for alert in alerts])
+    try:
+        return rows_response(
+            select(*SOS_ALERT_COLUMNS).order_by(SOSAlert.created_at.desc()), [c.key for c in SOS_ALERT_COLUMNS],
+            fmt=request.args.get("format", "json"), fields=request.args.get("fields"),
+            dictionary=("status", "username"), point_category="status",
+        )
+    except SerializationError as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route("/api/admin/sos-alerts/<int:alert_id>/resolve", methods=["POST"])
 def resolve_sos_alert(alert_id):
@@ -894,24 +1415,79 @@ def resolve_sos_alert(alert_id):
     alert = SOSAlert.query.get(alert_id)
     if alert:
         alert.status = 'resolved'
+        alert.next_escalation_at = None
         db.session.commit()
+        bump_data_version("sos_alerts")
+        sos_tracker.forget_alert(alert_id)
+        sos_escalator.cancel(alert_id)
         return jsonify({"message": "Alert resolved"}), 200
     return jsonify({"error": "Alert not found"}), 404
 
 @app.route("/api/admin/users")
+@query_budget(1)
 def get_admin_users():
+    """One page of users: ?q= (username/email prefix) &verified= &city= &joined_from= &joined_to=
+    &sort=created_at|username|email &order=desc|asc &limit= &cursor= (next_cursor of the previous page)"""
+    check = require_admin_api()
+    if check: return check
+    
+    args = request.args
+    try:
+        limit = int(args.get("limit", 50))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    try:
+        return jsonify(page_of_users(
+            db.session,
+            q=args.get("q"),
+            verified=parse_verified(args.get("verified")),
+            city=args.get("city"),
+            joined_from=args.get("joined_from"),
+            joined_to=args.get("joined_to"),
+            sort=args.get("sort", "created_at"),
+            order=args.get("order", "desc"),
+            cursor=args.get("cursor"),
+            limit=limit,
+        )), 200
+    except UserQueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/api/admin/users/<username>/logout", methods=["POST"])
+def force_logout_user(username):
+    """Revoke every active session of a user (e.g. a compromised account)"""
     check = require_admin_api()
     if check: return check
     
-    users = User.query.all()
-    return jsonify([{
-        "id": u.id,
-        "username": u.username,
-        "email": u.email,
-        "verified": u.verified,
-        "trusted_contacts_count": len(u.trusted_contacts) if u.trusted_contacts else 0,
-        "created_at": u.created_at.isoformat() if hasattr(u, 'created_at') else None
-    } for u in users])
+    if session_store is None:
+        return jsonify({"error": "Server-side sessions are disabled"}), 400
+    
+    revoked = session_store.revoke_user(username)
+    return jsonify({"message": f"Logged out {revoked} session(s) for '{username}'", "revoked": revoked}), 200
+
+@app.route("/api/admin/reports/search")
+@query_budget(2)
+def search_admin_reports():
+    """Reports whose description matches ?q=, best first; &category= &start= &end= &bbox= &page= &per_page="""
+    check = require_admin_api()
+    if check: return check
+    
+    try:
+        page = int(request.args.get("page", 1))
+        per_page = int(request.args.get("per_page", 20))
+    except ValueError:
+        return jsonify({"error": "page and per_page must be integers"}), 400
+    try:
+        return jsonify(report_search.search(
+            request.args.get("q"),
+            category=request.args.get("category"),
+            start=request.args.get("start"),
+            end=request.args.get("end"),
+            bbox=parse_bbox(request.args.get("bbox")),
+            page=page,
+            per_page=per_page,
+        )), 200
+    except (SearchError, ExportError) as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route("/api/admin/reports/<int:report_id>", methods=["DELETE"])
 def delete_admin_report(report_id):
@@ -920,11 +1496,109 @@ def delete_admin_report(report_id):
     
     report = Report.query.get(report_id)
     if report:
+        # reports is partitioned, so report_submissions has no foreign key to SET NULL for us
+        ReportSubmission.query.filter_by(report_id=report.id).update({"report_id": None})
         db.session.delete(report)
         db.session.commit()
+        bump_data_version("reports", "reports_removed")
         return jsonify({"message": "Report deleted"}), 200
     return jsonify({"error": "Report not found"}), 404
 
+@app.route("/api/admin/resources")
+@query_budget(1)
+def get_admin_resources():
+    check = require_admin_api()
+    if check: return check
+    
+    resources = SafetyResource.query.filter_by(active=True).order_by(SafetyResource.kind, SafetyResource.name).all()
+    return jsonify([r.to_dict() for r in resources])
+
+@app.route("/api/admin/resources", methods=["POST"])
+def add_admin_resource():
+    check = require_admin_api()
+    if check: return check
+    
+    try:
+        values = parse_resource(request.get_json(silent=True))
+    except ResponderError as e:
+        return jsonify({"error": str(e)}), 400
+    resource = SafetyResource(**values, active=True, updated_at=now_ms())
+    db.session.add(resource)
+    db.session.commit()
+    bump_data_version("resources")
+    responders.apply(resource)
+    return jsonify(resource.to_dict()), 201
+
+@app.route("/api/admin/resources/<int:resource_id>", methods=["PUT", "DELETE"])
+def update_admin_resource(resource_id):
+    check = require_admin_api()
+    if check: return check
+    
+    resource = SafetyResource.query.get(resource_id)
+    if not resource or not resource.active:
+        return jsonify({"error": "Resource not found"}), 404
+    if request.method == "DELETE":
+        # Kept as inactive so other workers see the removal in their incremental refresh
+        resource.active = False
+    else:
+        try:
+            values = parse_resource(request.get_json(silent=True), partial=True)
+        except ResponderError as e:
+            return jsonify({"error": str(e)}), 400
+        for field, value in values.items():
+            setattr(resource, field, value)
+    resource.updated_at = now_ms()
+    db.session.commit()
+    bump_data_version("resources")
+    responders.apply(resource)
+    if request.method == "DELETE":
+        return jsonify({"message": "Resource deleted"}), 200
+    return jsonify(resource.to_dict()), 200
+
+@app.route("/api/admin/export/<dataset>")
+def export_admin_data(dataset):
+    """Stream reports or SOS alerts as CSV, NDJSON or Parquet"""
+    check = require_admin_api()
+    if check: return check
+
+    fmt = request.args.get("format", "csv")
+    try:
+        chunks = stream_export(
+            dataset,
+            fmt,
+            start=request.args.get("start"),
+            end=request.args.get("end"),
+            bbox=parse_bbox(request.args.get("bbox")),
+        )
+    except ExportError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={dataset}.{extension}"}
+    )
+
+@app.route("/api/admin/profiler", methods=["GET", "POST"])
+def admin_profiler():
+    """Show or toggle the sampling profiler"""
+    check = require_admin_api()
+    if check: return check
+
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        try:
+            instrumentation.set_profiler(data.get("enabled", False), data.get("sample_rate"))
+        except (TypeError, ValueError):
+            return jsonify({"error": "sample_rate must be a number between 0 and 1"}), 400
+
+    return jsonify({
+        "enabled": instrumentation.profiler_enabled,
+        "sample_rate": instrumentation.profiler_sample_rate,
+        "output_dir": instrumentation.profiler_dir
+    }), 200
+
 # Add these routes to your app.py file
 
 @app.route("/admin/settings")
@@ -1176,38 +1850,57 @@ def get_trends():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/admin/hotspots")
+@query_budget(2)
+def get_admin_hotspots():
+    """Precomputed hotspots (detect_hotspots.py), largest first: ?trend=rising&limit=100"""
+    check = require_admin_api()
+    if check: return check
+    
+    query = Hotspot.query
+    trend = request.args.get("trend")
+    if trend:
+        query = query.filter_by(trend=trend)
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 1000)
+    hotspots = query.order_by((Hotspot.report_count + Hotspot.sos_count).desc()).limit(limit).all()
+    last_run = HotspotRun.query.order_by(HotspotRun.id.desc()).first()
+    return jsonify({
+        "hotspots": [h.to_dict() for h in hotspots],
+        "last_run": last_run.to_dict() if last_run else None
+    })
+
 @app.route("/api/admin/analytics/heatmap-data")
 def get_heatmap_data():
     """Get location data for heatmap"""
     check = require_admin_api()
     if check: return check
     
+    fmt = request.args.get("format", "json")
+    names = ["lat", "lng", "intensity", "type"]
+
+    def points():
+        # Reports have intensity 1, SOS alerts 3 (more critical)
+        for rows in iter_partitions(select(Report.lat, Report.lng)):
+            yield [(float(lat), float(lng), 1, "report") for lat, lng in rows]
+        for rows in iter_partitions(select(SOSAlert.lat, SOSAlert.lng)):
+            yield [(float(lat), float(lng), 3, "sos") for lat, lng in rows]
+
     try:
-        # Get all reports with coordinates
-        reports = Report.query.with_entities(Report.lat, Report.lng, Report.category).all()
-        sos_alerts = SOSAlert.query.with_entities(SOSAlert.lat, SOSAlert.lng).all()
-        
-        heatmap_points = []
-        
-        # Add reports (intensity 1)
-        for lat, lng, category in reports:
-            heatmap_points.append({
-                "lat": float(lat),
-                "lng": float(lng),
-                "intensity": 1,
-                "type": "report"
-            })
-        
-        # Add SOS alerts (intensity 3 - more critical)
-        for lat, lng in sos_alerts:
-            heatmap_points.append({
-                "lat": float(lat),
-                "lng": float(lng),
-                "intensity": 3,
-                "type": "sos"
-            })
-        
-        return jsonify({"points": heatmap_points}), 200
+        if fmt == "binary":
+            # Category is the point type; clients map report -> 1, sos -> 3
+            return points_response([(lat, lng, kind) for lat, lng, _, kind in rows] for rows in points())
+        if fmt == "columnar":
+            data = columnar(names, points(), fields="lat,lng,type", dictionary=("type",))
+            data["intensity"] = {"report": 1, "sos": 3}
+            return Response(dumps(data), mimetype="application/json")
+        if fmt != "json":
+            return jsonify({"error": f"Unknown format '{fmt}'"}), 400
+
+        def chunks():
+            yield b'{"points":'
+            yield from json_array_chunks(names, points())
+            yield b"}"
+        return stream_json(chunks())
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
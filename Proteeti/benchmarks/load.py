@@ -0,0 +1,225 @@
+"""Load driver for the SOS, map and admin hot paths.
+
+Runs each scenario against a live server with N concurrent clients (one
+logged-in requests.Session per client) and prints p50/p95/p99 latency,
+throughput and error counts. Results can be saved as JSON and compared with
+a previous run to catch regressions.
+
+Typical run (from the Proteeti directory):
+    python -m benchmarks.smtp_sink --port 2525 &
+    SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_STARTTLS=0 GMAIL_SENDER=bench@bench.local \
+        GMAIL_APP_PASSWORD=x RATE_LIMIT_ENABLED=0 gunicorn -w 4 app:app &
+    python -m benchmarks.seed --reports 1000000 --sos 100000
+    python -m benchmarks.load http://127.0.0.1:8000 --concurrency 32 --requests 2000 \
+        --save results.json --baseline previous.json
+
+Accounts come from benchmarks/seed.py. Every client shares one IP, so the
+rate limiter is switched off unless it is the thing being measured.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from config.cities import CITY_COORDS
+from benchmarks.seed import BENCH_ADMIN, BENCH_ADMIN_PASSWORD, BENCH_PASSWORD
+
+
+AUDIO_BLOB = os.urandom(256 * 1024)  # ~2 minutes of low-bitrate webm is a few hundred KB
+
+
+def _point():
+    lat, lng = random.choice(list(CITY_COORDS.values()))
+    return lat + random.gauss(0, 0.03), lng + random.gauss(0, 0.03)
+
+
+def send_sos(s, base):
+    lat, lng = _point()
+    return s.post(f"{base}/send_sos", json={"latitude": lat, "longitude": lng, "accuracy": 10})
+
+
+def send_sos_audio(s, base):
+    return s.post(f"{base}/send_sos_audio", files={"audio": ("emergency_audio.webm", AUDIO_BLOB, "audio/webm")})
+
+
+def submit_report(s, base):
+    lat, lng = _point()
+    return s.post(f"{base}/submit_report", json={
+        "lat": lat, "lng": lng, "category": "Unsafe Lighting", "description": "benchmark"
+    })
+
+
+def api_reports(s, base):
+    return s.get(f"{base}/api/reports")
+
+
+def login(s, base):
+    user = f"bench_user_{random.randrange(s.bench_users)}"
+    return s.post(f"{base}/login", data={"username_or_email": user, "password": BENCH_PASSWORD},
+                  allow_redirects=False)
+
+
+def admin_overview(s, base):
+    return s.get(f"{base}/api/admin/analytics/overview")
+
+
+def admin_trends(s, base):
+    return s.get(f"{base}/api/admin/analytics/trends")
+
+
+def admin_heatmap(s, base):
+    return s.get(f"{base}/api/admin/analytics/heatmap-data")
+
+
+# name -> (request function, session kind)
+SCENARIOS = {
+    "send_sos": (send_sos, "user"),
+    "send_sos_audio": (send_sos_audio, "user"),
+    "submit_report": (submit_report, "user"),
+    "api_reports": (api_reports, "anonymous"),
+    "login": (login, "anonymous"),
+    "admin_overview": (admin_overview, "admin"),
+    "admin_trends": (admin_trends, "admin"),
+    "admin_heatmap": (admin_heatmap, "admin"),
+}
+
+
+def make_session(base, kind, index, bench_users):
+    s = requests.Session()
+    s.bench_users = bench_users
+    if kind == "user":
+        r = s.post(f"{base}/login", data={
+            "username_or_email": f"bench_user_{index % bench_users}", "password": BENCH_PASSWORD
+        }, allow_redirects=False)
+        if r.status_code != 302:
+            raise RuntimeError(f"bench user login failed ({r.status_code}); run benchmarks.seed first")
+    elif kind == "admin":
+        r = s.post(f"{base}/admin/login", data={
+            "admin_username": BENCH_ADMIN, "admin_password": BENCH_ADMIN_PASSWORD
+        }, allow_redirects=False)
+        if r.status_code != 302:
+            raise RuntimeError(f"bench admin login failed ({r.status_code}); run benchmarks.seed first")
+    return s
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(base, name, concurrency, total, warmup, bench_users):
+    fn, kind = SCENARIOS[name]
+    sessions = [make_session(base, kind, i, bench_users) for i in range(concurrency)]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total + warmup))
+
+    def worker(s):
+        nonlocal errors
+        local, local_errors = [], 0
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                break
+            started = time.perf_counter()
+            try:
+                r = fn(s, base)
+                ok = r.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if n < warmup:
+                continue
+            local.append(elapsed)
+            if not ok:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, sessions))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return scenarios whose p95 got worse than baseline by more than tolerance (fraction)."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or not before.get("p95_ms"):
+            continue
+        change = current["p95_ms"] / before["p95_ms"] - 1
+        if change > tolerance:
+            regressions.append((name, before["p95_ms"], current["p95_ms"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Proteeti hot paths")
+    parser.add_argument("base_url", help="e.g. http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--bench-users", type=int, default=1000, help="must match benchmarks.seed --users")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    base = args.base_url.rstrip("/")
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)}")
+        return 2
+
+    results = {}
+    print(f"{'scenario':<16}{'reqs':>7}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name in names:
+        result = run_scenario(base, name, args.concurrency, args.requests, args.warmup, args.bench_users)
+        results[name] = result
+        print(f"{name:<16}{result['requests']:>7}{result['errors']:>8}{result['throughput_rps']:>9.1f}"
+              f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}", flush=True)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"concurrency": args.concurrency, "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: p95 {before:.1f} ms -> {after:.1f} ms (+{change * 100:.0f}%)")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Seed synthetic users, reports and SOS alerts for benchmarking.
+
+Points are scattered around the CITY_COORDS centers (Gaussian, about 5 km)
+with timestamps spread over the last --days days, and written in batches
+through bulk_import.write_rows (COPY on Postgres, executemany elsewhere), so
+millions of rows load in minutes.
+
+Also creates the accounts the load driver logs in with: bench_user_<n>
+(password "bench-password", with a trusted contact at sink@bench.local) and
+the admin bench_admin / "bench-admin-password".
+
+Usage (from the Proteeti directory):
+    python -m benchmarks.seed --reports 2000000 --sos 200000
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.seed --reports 100000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from config.cities import CITY_COORDS
+from models.user import db, User, Report, SOSAlert, Admin, hash_password
+from bulk_import import batched, write_rows
+
+
+CATEGORIES = ["Harassment", "Unsafe Lighting", "Suspicious Activity", "Other"]
+CATEGORY_WEIGHTS = [0.35, 0.3, 0.25, 0.1]
+BENCH_PASSWORD = "bench-password"
+BENCH_ADMIN = "bench_admin"
+BENCH_ADMIN_PASSWORD = "bench-admin-password"
+SINK_CONTACT = {"id": 1, "name": "Bench Sink", "email": "sink@bench.local", "phone": "00000000000"}
+
+# ~5 km standard deviation around each center
+SPREAD_DEG = 0.045
+
+
+def random_point(rng, centers):
+    lat, lng = rng.choice(centers)
+    return lat + rng.gauss(0, SPREAD_DEG), lng + rng.gauss(0, SPREAD_DEG)
+
+
+def random_timestamp(rng, now, days):
+    moment = now - timedelta(seconds=rng.random() * days * 86400)
+    return moment.strftime("%Y-%m-%d %H:%M")
+
+
+def seed_users(count, rng):
+    """Create bench_user_0..count-1 (skipping existing ones); returns [(id, username)]."""
+    password_hash = hash_password(BENCH_PASSWORD)  # one bcrypt call shared by every bench user
+    names = [f"bench_user_{i}" for i in range(count)]
+    existing = set(db.session.execute(select(User.username).where(User.username.like("bench_user_%"))).scalars())
+
+    rows = [{
+        "username": name,
+        "email": f"{name}@bench.local",
+        "password_hash": password_hash,
+        "verified": True,
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "profile": {"city": rng.choice(list(CITY_COORDS))},
+        "trusted_contacts": [SINK_CONTACT],
+        "notification_prefs": {},
+    } for name in names if name not in existing]
+
+    for batch in batched(rows, 5000):
+        with db.engine.begin() as conn:
+            write_rows(conn, User.__table__, batch, use_copy=True)
+
+    if not Admin.query.filter_by(username=BENCH_ADMIN).first():
+        admin = Admin(username=BENCH_ADMIN)
+        admin.set_password(BENCH_ADMIN_PASSWORD)
+        db.session.add(admin)
+        db.session.commit()
+
+    users = db.session.execute(
+        select(User.id, User.username).where(User.username.in_(names))
+    ).all()
+    db.session.rollback()
+    return [(u.id, u.username) for u in users]
+
+
+def seed_reports(count, users, days, batch_size, rng):
+    now = datetime.now(timezone.utc) + timedelta(hours=6)
+    centers = list(CITY_COORDS.values())
+    started = time.monotonic()
+    for offset in range(0, count, batch_size):
+        rows = []
+        for _ in range(min(batch_size, count - offset)):
+            lat, lng = random_point(rng, centers)
+            rows.append({
+                "username": rng.choice(users)[1],
+                "lat": lat,
+                "lng": lng,
+                "category": rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+                "description": "",
+                "timestamp": random_timestamp(rng, now, days),
+            })
+        with db.engine.begin() as conn:
+            write_rows(conn, Report.__table__, rows, use_copy=True)
+        done = offset + len(rows)
+        print(f"[reports] {done}/{count} ({done / max(time.monotonic() - started, 1e-6):.0f} rows/s)", flush=True)
+
+
+def seed_sos(count, users, days, batch_size, rng, active_ratio=0.05):
+    now = datetime.now(timezone.utc) + timedelta(hours=6)
+    centers = list(CITY_COORDS.values())
+    started = time.monotonic()
+    for offset in range(0, count, batch_size):
+        rows = []
+        for _ in range(min(batch_size, count - offset)):
+            user_id, username = rng.choice(users)
+            lat, lng = random_point(rng, centers)
+            rows.append({
+                "user_id": user_id,
+                "username": username,
+                "lat": lat,
+                "lng": lng,
+                "accuracy": round(rng.uniform(3, 60), 1),
+                "status": "active" if rng.random() < active_ratio else "resolved",
+                "created_at": random_timestamp(rng, now, days),
+            })
+        with db.engine.begin() as conn:
+            write_rows(conn, SOSAlert.__table__, rows, use_copy=True)
+        done = offset + len(rows)
+        print(f"[sos] {done}/{count} ({done / max(time.monotonic() - started, 1e-6):.0f} rows/s)", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed synthetic data for benchmarks")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--reports", type=int, default=100000)
+    parser.add_argument("--sos", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=365, help="spread timestamps over this many days")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42, help="random seed, for reproducible data sets")
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db.create_all()
+        users = seed_users(args.users, rng)
+        print(f"[users] {len(users)} bench users ready")
+        seed_reports(args.reports, users, args.days, args.batch_size, rng)
+        seed_sos(args.sos, users, args.days, args.batch_size, rng)
+
+        totals = db.session.execute(select(
+            select(func.count()).select_from(Report).scalar_subquery(),
+            select(func.count()).select_from(SOSAlert).scalar_subquery(),
+        )).one()
+        print(f"\n✅ Seeded. Database now has {totals[0]} reports and {totals[1]} SOS alerts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Local SMTP sink for benchmarks.
+
+Accepts every message (AUTH is accepted without checking) and throws it away,
+counting deliveries, so SOS and verification mail can be exercised without
+touching Gmail. Point the app at it with:
+
+    SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_STARTTLS=0 \
+    GMAIL_SENDER=bench@bench.local GMAIL_APP_PASSWORD=x gunicorn app:app
+
+Usage:
+    python -m benchmarks.smtp_sink --port 2525 [--delay-ms 50]
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        self.reply("220 bench-sink ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip().upper()
+
+            if command.startswith(("EHLO", "HELO")):
+                self.wfile.write(b"250-bench-sink\r\n250-AUTH PLAIN LOGIN\r\n250 SIZE 52428800\r\n")
+            elif command.startswith("AUTH"):
+                self.reply("235 2.7.0 Authentication successful")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk == b".\r\n":
+                        break
+                    size += len(chunk)
+                if self.server.delay:
+                    time.sleep(self.server.delay)
+                self.server.record(size)
+                self.reply("250 OK queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, delay=0.0):
+        super().__init__(address, SinkHandler)
+        self.delay = delay
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, size):
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Discard-all SMTP server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--delay-ms", type=float, default=0, help="simulated provider latency per message")
+    args = parser.parse_args(argv)
+
+    server = SinkServer((args.host, args.port), delay=args.delay_ms / 1000)
+    print(f"SMTP sink listening on {args.host}:{args.port}")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        while True:
+            time.sleep(10)
+            print(f"[sink] {server.messages} messages, {server.bytes / 1024 / 1024:.1f} MB", flush=True)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Build responsive image variants for the static asset pipeline.
+
+For every PNG/JPEG under static/img this writes, into static/dist/img:
+    <name>.w<width>.webp   WebP at each configured width (and the original width)
+    <name>.w<width>.<ext>  the original format downscaled, for browsers without WebP
+and records them in static/dist/manifest.json, which services/assets.py reads
+at startup to build ``srcset`` attributes. Widths larger than the source are
+skipped. Files are only rebuilt when the source changed.
+
+Requires Pillow (pip install Pillow). Run before deploying and commit
+static/dist along with the images, since the hosts serve the repo as is:
+    python build_assets.py
+    python build_assets.py --widths 96,192,480 --quality 78
+"""
+import argparse
+import json
+import os
+import sys
+
+from services.assets import VARIANTS_DIR, VARIANTS_MANIFEST, file_hash
+
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+SOURCE_DIRS = ("img",)
+IMAGE_TYPES = {".png": ("PNG", "image/png"), ".jpg": ("JPEG", "image/jpeg"), ".jpeg": ("JPEG", "image/jpeg")}
+
+
+def iter_images(static_dir):
+    for source_dir in SOURCE_DIRS:
+        for root, _, files in os.walk(os.path.join(static_dir, source_dir)):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_TYPES:
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, static_dir).replace(os.sep, "/"), path
+
+
+def save_variant(image, path, fmt, quality):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    options = {"quality": quality, "method": 6} if fmt == "WEBP" else (
+        {"quality": quality, "optimize": True, "progressive": True} if fmt == "JPEG" else {"optimize": True}
+    )
+    image.save(path, fmt, **options)
+
+
+def build(static_dir, widths, quality, force=False):
+    from PIL import Image
+
+    manifest_path = os.path.join(static_dir, VARIANTS_MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    manifest, saved = {}, 0
+    for filename, path in iter_images(static_dir):
+        digest = file_hash(path)
+        entries = previous.get(filename, [])
+        if not force and entries and all(e.get("source") == digest for e in entries) and all(
+            os.path.exists(os.path.join(static_dir, e["file"])) for e in entries
+        ):
+            manifest[filename] = entries
+            continue
+
+        fmt, mimetype = IMAGE_TYPES[os.path.splitext(filename)[1].lower()]
+        root = os.path.splitext(filename)[0]
+        entries = []
+        with Image.open(path) as image:
+            image.load()
+            original_width = image.width
+            for width in sorted({w for w in widths if w < original_width} | {original_width}):
+                if width == original_width:
+                    resized = image
+                else:
+                    height = max(1, round(image.height * width / original_width))
+                    resized = image.resize((width, height), Image.LANCZOS)
+                targets = [("WEBP", "image/webp", "webp")]
+                if width != original_width:
+                    targets.append((fmt, mimetype, os.path.splitext(filename)[1].lstrip(".").lower()))
+                for target_fmt, target_type, ext in targets:
+                    variant = f"{VARIANTS_DIR}/{root}.w{width}.{ext}"
+                    save_variant(resized, os.path.join(static_dir, variant), target_fmt, quality)
+                    entries.append({"file": variant, "width": width, "type": target_type, "source": digest})
+
+        before = os.path.getsize(path)
+        smallest = min(os.path.getsize(os.path.join(static_dir, e["file"])) for e in entries)
+        saved += before - smallest
+        print(f"{filename}: {len(entries)} variants, {before // 1024} KB -> smallest {smallest // 1024} KB")
+        manifest[filename] = entries
+
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest, saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build WebP and resized image variants")
+    parser.add_argument("--widths", default="96,192,480,960", help="comma separated target widths in px")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--force", action="store_true", help="rebuild even if sources are unchanged")
+    args = parser.parse_args(argv)
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("build_assets.py requires Pillow (pip install Pillow)")
+        return 1
+
+    widths = [int(w) for w in args.widths.split(",") if w.strip()]
+    manifest, saved = build(STATIC_DIR, widths, args.quality, force=args.force)
+    print(f"{len(manifest)} images in {VARIANTS_MANIFEST}; rebuilt ones shrank by {saved // 1024} KB at their smallest")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
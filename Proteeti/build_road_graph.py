@@ -0,0 +1,42 @@
+"""Convert an OpenStreetMap extract into the compact road graph the route planner loads.
+
+Parsing OSM XML at every start is slow for a whole city; the compact file is
+just the node coordinates and segment arrays and loads in about a second.
+
+Usage:
+    python build_road_graph.py dhaka.osm.gz -o data/dhaka.graph
+then set ROUTING_GRAPH_FILE=data/dhaka.graph. Extracts can be cut from
+Geofabrik's Bangladesh file (osmium extract / osmconvert) or exported from
+openstreetmap.org for small areas.
+"""
+import argparse
+import os
+import sys
+import time
+
+from services.routing import RoadGraph
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a compact walking graph from an OSM XML extract")
+    parser.add_argument("source", help=".osm or .osm.gz file")
+    parser.add_argument("-o", "--output", required=True, help="graph file to write")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        graph = RoadGraph.from_osm(args.source)
+    except (OSError, ValueError) as e:
+        print(f"Could not read {args.source}: {e}")
+        return 1
+    if not graph.segment_count:
+        print(f"No walkable streets found in {args.source}")
+        return 1
+    graph.save(args.output)
+    print(f"{graph.node_count} nodes, {graph.segment_count} segments -> {args.output} "
+          f"({os.path.getsize(args.output) // 1024} KB) in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
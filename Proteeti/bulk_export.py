@@ -0,0 +1,59 @@
+"""Streaming export of reports and SOS alerts to CSV, NDJSON or Parquet.
+
+Usage:
+    python bulk_export.py reports --format csv -o reports.csv
+    python bulk_export.py sos_alerts --format parquet -o sos.parquet \
+        --start "2025-11-01 00:00" --end "2025-12-01 00:00" --bbox 90.3,23.7,90.5,23.9
+"""
+import argparse
+import sys
+
+from models.user import db
+from services.export import DATASETS, FORMATS, ExportError, parse_bbox, stream_export
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export reports or SOS alerts without loading whole tables")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout, not for parquet)")
+    parser.add_argument("--start", help="inclusive lower bound, 'YYYY-MM-DD HH:MM'")
+    parser.add_argument("--end", help="exclusive upper bound, 'YYYY-MM-DD HH:MM'")
+    parser.add_argument("--bbox", help="min_lng,min_lat,max_lng,max_lat")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet" and args.output == "-":
+        print("Parquet output needs a file: use -o")
+        return 1
+
+    from app import app
+
+    with app.app_context():
+        try:
+            chunks = stream_export(args.dataset, args.format, args.start, args.end,
+                                   parse_bbox(args.bbox), args.batch_size)
+        except ExportError as e:
+            print(f"Export failed: {e}")
+            return 1
+
+        binary = args.format == "parquet"
+        if args.output == "-":
+            out = sys.stdout
+        else:
+            out = open(args.output, "wb" if binary else "w", newline=None if binary else "")
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        db.session.remove()
+
+    if args.output != "-":
+        print(f"✅ Exported {args.dataset} to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
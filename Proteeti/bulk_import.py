@@ -0,0 +1,359 @@
+"""Bulk import of users and reports from JSON / NDJSON exports.
+
+Replaces the row-by-row logic of migrate_json_to_db.py. Input is streamed, so
+files larger than memory are fine. Each batch does one set-based existence
+query, hashes passwords in a process pool and writes rows with COPY (Postgres)
+or a single executemany insert. Progress is checkpointed next to the input
+file so an interrupted import picks up where it stopped.
+
+Usage:
+    python bulk_import.py users data/users.json
+    python bulk_import.py reports exports/reports.ndjson --batch-size 5000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import select, or_
+
+from models.user import db, User, Report, hash_password, bd_now
+from services.http_cache import bump_data_version
+
+
+CHUNK_SIZE = 1 << 20
+
+
+# ======= Streaming readers =======
+def _iter_ndjson(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _iter_json(path):
+    """Yield elements of a top-level JSON array, or (key, value) pairs of a
+    top-level object, without loading the whole document."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(CHUNK_SIZE).lstrip()
+        if not buf:
+            return
+        opener = buf[0]
+        if opener not in "[{":
+            raise ValueError(f"{path}: expected a JSON array or object")
+        closer = "]" if opener == "[" else "}"
+        pos = 1
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            more = f.read(CHUNK_SIZE)
+            if not more:
+                eof = True
+            buf = buf[pos:] + more
+            pos = 0
+
+        def skip(chars):
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in chars:
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # A number at the end of the buffer may be truncated
+                    if end == len(buf) and not eof:
+                        raise ValueError
+                    pos = end
+                    return value
+                except ValueError:
+                    if eof:
+                        raise
+                    fill()
+
+        while True:
+            skip(" \t\r\n,")
+            if pos >= len(buf) or buf[pos] == closer:
+                return
+            if opener == "[":
+                yield decode()
+            else:
+                key = decode()
+                skip(" \t\r\n:")
+                yield key, decode()
+
+
+def iter_records(path):
+    """Stream records from .json/.ndjson/.jsonl files as dicts.
+
+    A top-level object (the users.json layout) is read as username -> record.
+    """
+    if path.endswith((".ndjson", ".jsonl")):
+        yield from _iter_ndjson(path)
+        return
+    for item in _iter_json(path):
+        if isinstance(item, tuple):
+            key, value = item
+            value = dict(value)
+            value.setdefault("username", key)
+            yield value
+        else:
+            yield item
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def normalize_timestamp(value):
+    """Convert ISO timestamps from the JSON exports to the 'YYYY-MM-DD HH:MM' column format."""
+    if not value:
+        return bd_now()
+    try:
+        return datetime.fromisoformat(str(value)).strftime("%Y-%m-%d %H:%M")
+    except ValueError:
+        return str(value)[:16]
+
+
+# ======= Checkpoints =======
+def checkpoint_path(path, kind):
+    return f"{path}.{kind}.import-state.json"
+
+
+def load_checkpoint(path, kind):
+    try:
+        with open(checkpoint_path(path, kind), "r") as f:
+            return json.load(f).get("records_done", 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def save_checkpoint(path, kind, records_done):
+    tmp = checkpoint_path(path, kind) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"records_done": records_done, "updated_at": datetime.now().isoformat()}, f)
+    os.replace(tmp, checkpoint_path(path, kind))
+
+
+# ======= Writers =======
+def copy_rows(conn, table, columns, rows):
+    """Load rows with COPY ... FROM STDIN. Returns False if the driver has no COPY support."""
+    cursor = conn.connection.cursor()
+    sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+
+    def cell(value):
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        if value is None:
+            return None
+        return value
+
+    try:
+        if hasattr(cursor, "copy_expert"):          # psycopg2
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for row in rows:
+                writer.writerow(["" if cell(row[c]) is None else cell(row[c]) for c in columns])
+            buf.seek(0)
+            cursor.copy_expert(sql, buf)
+        elif hasattr(cursor, "copy"):               # psycopg 3
+            with cursor.copy(sql.replace("FORMAT csv", "FORMAT text")) as copy:
+                for row in rows:
+                    copy.write_row([cell(row[c]) for c in columns])
+        else:
+            return False
+    finally:
+        cursor.close()
+    return True
+
+
+def write_rows(conn, table, rows, use_copy):
+    if not rows:
+        return
+    columns = list(rows[0].keys())
+    if use_copy and conn.dialect.name == "postgresql" and copy_rows(conn, table, columns, rows):
+        return
+    conn.execute(table.insert(), rows)
+
+
+class Progress:
+    def __init__(self, kind, start=0):
+        self.kind = kind
+        self.read = start
+        self.inserted = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        print(f"[{self.kind}] {self.read} read, {self.inserted} inserted, "
+              f"{self.skipped} skipped ({self.inserted / elapsed:.0f} rows/s)", flush=True)
+
+
+# ======= Importers =======
+def import_users(path, batch_size=1000, workers=None, use_copy=True, resume=True):
+    done = load_checkpoint(path, "users") if resume else 0
+    progress = Progress("users", done)
+    if done:
+        print(f"[users] resuming after {done} records")
+
+    records = iter_records(path)
+    for _ in range(done):
+        next(records, None)
+
+    engine = db.engine
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in batched(records, batch_size):
+            progress.read += len(batch)
+
+            # Drop incomplete rows and duplicates inside the batch itself
+            candidates = {}
+            emails = set()
+            for rec in batch:
+                username, email = rec.get("username"), rec.get("email")
+                if not username or not email or username in candidates or email in emails:
+                    progress.skipped += 1
+                    continue
+                candidates[username] = rec
+                emails.add(email)
+
+            existing = db.session.execute(
+                select(User.username, User.email).where(
+                    or_(User.username.in_(list(candidates)), User.email.in_(list(emails)))
+                )
+            ).all()
+            db.session.rollback()
+            taken_names = {r.username for r in existing}
+            taken_emails = {r.email for r in existing}
+            fresh = [rec for name, rec in candidates.items()
+                     if name not in taken_names and rec["email"] not in taken_emails]
+            progress.skipped += len(candidates) - len(fresh)
+
+            plain = [rec["password"] for rec in fresh if rec.get("password")]
+            hashes = iter(pool.map(hash_password, plain, chunksize=max(1, len(plain) // 32)))
+
+            rows = [{
+                "username": rec["username"],
+                "email": rec["email"],
+                "password_hash": next(hashes) if rec.get("password") else rec.get("password_hash"),
+                "verified": bool(rec.get("verified", True)),
+                "created_at": normalize_timestamp(rec.get("created_at")),
+                "profile": rec.get("profile") or {},
+                # Core inserts skip the ORM hook that keeps users.city in step with the profile
+                "city": (rec.get("profile") or {}).get("city") or None,
+                "trusted_contacts": rec.get("trusted_contacts") or [],
+                "notification_prefs": rec.get("notification_prefs") or {},
+            } for rec in fresh]
+
+            with engine.begin() as conn:
+                write_rows(conn, User.__table__, rows, use_copy)
+            progress.inserted += len(rows)
+            save_checkpoint(path, "users", progress.read)
+            progress.report()
+
+    return progress
+
+
+def import_reports(path, batch_size=5000, use_copy=True, resume=True):
+    done = load_checkpoint(path, "reports") if resume else 0
+    progress = Progress("reports", done)
+    if done:
+        print(f"[reports] resuming after {done} records")
+
+    records = iter_records(path)
+    for _ in range(done):
+        next(records, None)
+
+    engine = db.engine
+    for batch in batched(records, batch_size):
+        progress.read += len(batch)
+
+        # Reports reference users.username; resolve the whole batch in one query
+        names = {rec.get("username") for rec in batch if rec.get("username")}
+        known = set(db.session.execute(
+            select(User.username).where(User.username.in_(list(names)))
+        ).scalars())
+        db.session.rollback()
+
+        rows = []
+        for rec in batch:
+            try:
+                lat, lng = float(rec["lat"]), float(rec["lng"])
+            except (KeyError, TypeError, ValueError):
+                progress.skipped += 1
+                continue
+            if rec.get("username") not in known or not rec.get("category"):
+                progress.skipped += 1
+                continue
+            rows.append({
+                "username": rec["username"],
+                "lat": lat,
+                "lng": lng,
+                "category": rec["category"],
+                "description": rec.get("description") or "",
+                "timestamp": normalize_timestamp(rec.get("timestamp")),
+            })
+
+        with engine.begin() as conn:
+            write_rows(conn, Report.__table__, rows, use_copy)
+            bump_data_version("reports", conn=conn)
+        progress.inserted += len(rows)
+        save_checkpoint(path, "reports", progress.read)
+        progress.report()
+
+    return progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import users or reports from JSON/NDJSON")
+    parser.add_argument("kind", choices=["users", "reports"])
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="bcrypt worker processes (default: CPU count)")
+    parser.add_argument("--no-copy", action="store_true", help="use executemany inserts even on Postgres")
+    parser.add_argument("--restart", action="store_true", help="ignore any saved checkpoint")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"File not found: {args.path}")
+        return 1
+
+    from app import app
+
+    with app.app_context():
+        db.create_all()
+        if args.kind == "users":
+            progress = import_users(args.path, batch_size=args.batch_size or 1000, workers=args.workers,
+                                    use_copy=not args.no_copy, resume=not args.restart)
+        else:
+            progress = import_reports(args.path, batch_size=args.batch_size or 5000,
+                                      use_copy=not args.no_copy, resume=not args.restart)
+
+    progress.report()
+    print(f"\n✅ {args.kind} import complete!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+# Map centers for the cities users can pick during onboarding
+CITY_COORDS = {
+    "Dhaka North": (23.8341, 90.3841),
+    "Dhaka South": (23.7104, 90.4074),
+    "Chattogram": (22.3569, 91.7832),
+    "Khulna": (22.8200, 89.5500),
+    "Rajshahi": (24.3745, 88.6042),
+    "Sylhet": (24.8949, 91.8687),
+    "Barisal": (22.7010, 90.3535),
+    "Rangpur": (25.7558, 89.2440),
+    "Comilla": (23.4607, 91.1800),
+    "Narayanganj": (23.6200, 90.5000),
+    "Gazipur": (23.9999, 90.4203),
+    "Mymensingh": (24.7539, 90.4031),
+}
+
+# Default to Dhaka if not logged-in or no city
+DEFAULT_CENTER = (23.8103, 90.4125)
@@ -30,5 +30,145 @@ class Config:
             "keepalives_count": 5,
         },
     }
+    if SQLALCHEMY_DATABASE_URI.startswith("sqlite"):
+        # Local SQLite (benchmarks, tests) takes none of the Postgres pool/keepalive options
+        SQLALCHEMY_ENGINE_OPTIONS = {}
     
     SECRET_KEY = os.getenv("SECRET_KEY", "proteeti_secret_key_2025")
+
+    # Live SOS location tracking
+    SOS_TRACK_FLUSH_SIZE = int(os.getenv("SOS_TRACK_FLUSH_SIZE", "200"))
+    SOS_TRACK_PENDING_MAX = int(os.getenv("SOS_TRACK_PENDING_MAX", "50000"))  # buffered points kept while the DB is down
+    # 0 writes every update before the request returns (the default on Vercel, which freezes idle functions)
+    SOS_TRACK_FLUSH_INTERVAL = float(os.getenv("SOS_TRACK_FLUSH_INTERVAL", "0" if os.getenv("VERCEL") else "2"))
+    SOS_TRACK_VIEW_INTERVAL = float(os.getenv("SOS_TRACK_VIEW_INTERVAL", "5"))
+    SOS_TRACK_VIEW_POINTS = int(os.getenv("SOS_TRACK_VIEW_POINTS", "120"))
+    SOS_TRACK_CACHE_SIZE = int(os.getenv("SOS_TRACK_CACHE_SIZE", "10000"))  # alerts whose state / snapshot is cached
+
+    # Instrumentation (/metrics: admin session or this bearer token) and sampling profiler
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "False").lower() in ("1", "true", "yes")
+    PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0.01"))
+    PROFILER_DIR = os.getenv("PROFILER_DIR", "instance/profiles")
+
+    # SQL auditing (N+1 / slow query detection, per-route query budgets)
+    QUERY_AUDIT = os.getenv("QUERY_AUDIT", os.getenv("DEV_MODE", "False")).lower() in ("1", "true", "yes")
+    QUERY_AUDIT_STRICT = os.getenv("QUERY_AUDIT_STRICT", "False").lower() in ("1", "true", "yes")
+    QUERY_AUDIT_N_PLUS_ONE = int(os.getenv("QUERY_AUDIT_N_PLUS_ONE", "5"))
+    QUERY_AUDIT_SLOW_MS = int(os.getenv("QUERY_AUDIT_SLOW_MS", "200"))
+    QUERY_BUDGETS = {}
+
+    # Email verification: code lifetime, guesses and send limits
+    VERIFICATION_STORE = os.getenv("VERIFICATION_STORE", "database")  # or "memory"
+    VERIFICATION_TTL = int(os.getenv("VERIFICATION_TTL", "600"))
+    VERIFICATION_MAX_ATTEMPTS = int(os.getenv("VERIFICATION_MAX_ATTEMPTS", "5"))
+    VERIFICATION_EMAIL_SENDS = int(os.getenv("VERIFICATION_EMAIL_SENDS", "3"))
+    VERIFICATION_IP_SENDS = int(os.getenv("VERIFICATION_IP_SENDS", "10"))
+    VERIFICATION_SEND_WINDOW = int(os.getenv("VERIFICATION_SEND_WINDOW", "3600"))
+    VERIFICATION_RESEND_INTERVAL = int(os.getenv("VERIFICATION_RESEND_INTERVAL", "60"))
+
+    # Sessions: "database", "redis", "memory" or "cookie" (Flask's signed cookie)
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "database")
+    SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+    SESSION_HOT_CACHE_TTL = float(os.getenv("SESSION_HOT_CACHE_TTL", "2"))
+
+    # Rate limiting (token buckets): endpoint -> "scope:count/seconds, ...", scope is ip or user.
+    # Only POST/PUT/PATCH/DELETE spend tokens; an empty policy disables limiting for that endpoint.
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() in ("1", "true", "yes")
+    RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "memory")  # or "redis"
+    RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/1")
+    RATE_LIMITS = {
+        "login": os.getenv("RATE_LIMIT_LOGIN", "ip:10/60"),
+        "register": os.getenv("RATE_LIMIT_REGISTER", "ip:5/600"),
+        "submit_report": os.getenv("RATE_LIMIT_SUBMIT_REPORT", "ip:60/60, user:10/60"),
+        "rate": os.getenv("RATE_LIMIT_RATE", "ip:30/60, user:5/60"),
+        # SOS gets a separate, generous budget so a real emergency is never throttled
+        "send_sos": os.getenv("RATE_LIMIT_SEND_SOS", "ip:300/60, user:30/60"),
+    }
+    # Proxies in front of the app that append to X-Forwarded-For (Vercel, the Heroku router: 1).
+    # The client address is the entry that many hops from the right; 0 ignores the header.
+    TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "1" if os.getenv("VERCEL") or os.getenv("DYNO") else "0"))
+
+    # HTTP caching: ETags from data_versions, LRU of serialized bodies per worker
+    HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "True").lower() in ("1", "true", "yes")
+    HTTP_CACHE_SIZE = int(os.getenv("HTTP_CACHE_SIZE", "256"))
+    HTTP_CACHE_VERSION_TTL = float(os.getenv("HTTP_CACHE_VERSION_TTL", "1"))
+    HTTP_CACHE_MAX_BODY = int(os.getenv("HTTP_CACHE_MAX_BODY", str(8 * 1024 * 1024)))
+
+    # Response compression (brotli when the package is installed, else gzip)
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "True").lower() in ("1", "true", "yes")
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+    COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+    COMPRESS_CACHE_SIZE = int(os.getenv("COMPRESS_CACHE_SIZE", "128"))
+
+    # How long replayed offline requests (Idempotency-Key) are remembered
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
+    # Static assets: content-hashed URLs from url_for('static', ...), cached as immutable
+    ASSET_FINGERPRINTING = os.getenv("ASSET_FINGERPRINTING", "True").lower() in ("1", "true", "yes")
+
+    # Nearest police station / hospital / shelter index (services/responders.py)
+    RESOURCES_SEED_FILE = os.getenv("RESOURCES_SEED_FILE")  # default data/resources.json, used when the table is empty
+    RESOURCES_NEAREST_MAX = int(os.getenv("RESOURCES_NEAREST_MAX", "50"))
+    RESOURCES_REBUILD_THRESHOLD = int(os.getenv("RESOURCES_REBUILD_THRESHOLD", "64"))
+
+    # Safe route planner (services/routing.py); disabled until a road graph is configured
+    ROUTING_GRAPH_FILE = os.getenv("ROUTING_GRAPH_FILE")  # .osm / .osm.gz or a build_road_graph.py file
+    ROUTING_HALF_LIFE_DAYS = float(os.getenv("ROUTING_HALF_LIFE_DAYS", "14"))
+    ROUTING_HAZARD_RADIUS_M = float(os.getenv("ROUTING_HAZARD_RADIUS_M", "120"))
+    ROUTING_HAZARD_PENALTY = float(os.getenv("ROUTING_HAZARD_PENALTY", "4"))
+    ROUTING_HAZARD_WINDOW_DAYS = int(os.getenv("ROUTING_HAZARD_WINDOW_DAYS", "180"))
+
+    # Time-decayed risk grid for map shading and route scoring (services/risk.py).
+    # With numpy the grid is a dense float32 array: ~21 MB per worker for the
+    # default bbox at 250 m cells, growing with the bbox area / RISK_CELL_M^2.
+    RISK_BBOX = tuple(float(v) for v in os.getenv("RISK_BBOX", "88.0,20.5,92.7,26.7").split(","))  # min_lng,min_lat,max_lng,max_lat
+    RISK_CELL_M = float(os.getenv("RISK_CELL_M", "250"))
+    RISK_HALF_LIFE_DAYS = float(os.getenv("RISK_HALF_LIFE_DAYS", "30"))
+    RISK_WINDOW_DAYS = int(os.getenv("RISK_WINDOW_DAYS", "365"))
+
+    # Hotspot clustering job (detect_hotspots.py / services/hotspots.py)
+    HOTSPOT_EPS_M = float(os.getenv("HOTSPOT_EPS_M", "150"))
+    HOTSPOT_MIN_POINTS = int(os.getenv("HOTSPOT_MIN_POINTS", "5"))
+    HOTSPOT_WINDOW_DAYS = int(os.getenv("HOTSPOT_WINDOW_DAYS", "180"))
+    HOTSPOT_TREND_DAYS = int(os.getenv("HOTSPOT_TREND_DAYS", "14"))
+    HOTSPOT_FULL_EVERY_HOURS = int(os.getenv("HOTSPOT_FULL_EVERY_HOURS", "24"))
+
+    # Near-duplicate report merging at submit time (services/dedup.py)
+    REPORT_DEDUP_ENABLED = os.getenv("REPORT_DEDUP_ENABLED", "True").lower() in ("1", "true", "yes")
+    REPORT_DEDUP_RADIUS_M = float(os.getenv("REPORT_DEDUP_RADIUS_M", "50"))
+    REPORT_DEDUP_WINDOW_MIN = int(os.getenv("REPORT_DEDUP_WINDOW_MIN", "30"))
+
+    # Full-text search over report descriptions (services/search.py)
+    SEARCH_TS_CONFIG = os.getenv("SEARCH_TS_CONFIG", "english")
+    SEARCH_MAX_PER_PAGE = int(os.getenv("SEARCH_MAX_PER_PAGE", "100"))
+
+    # Monthly partitions of reports / sos_alerts and archival (services/partitions.py, manage_partitions.py)
+    PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+    ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "12"))
+    ARCHIVE_TO = os.getenv("ARCHIVE_TO", "table")  # "table" or "parquet"
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+    # Escalation of unacknowledged SOS alerts (services/sos_escalation.py)
+    SOS_ESCALATION_ENABLED = os.getenv("SOS_ESCALATION_ENABLED", "True").lower() in ("1", "true", "yes")
+    SOS_ESCALATION_STEPS = os.getenv("SOS_ESCALATION_STEPS", "renotify:5,secondary:10,admins:15")  # action:minutes after the previous step
+    SOS_ESCALATION_REPEAT_MIN = float(os.getenv("SOS_ESCALATION_REPEAT_MIN", "15"))
+    SOS_ESCALATION_MAX_HOURS = float(os.getenv("SOS_ESCALATION_MAX_HOURS", "12"))
+    SOS_ESCALATION_WORKERS = int(os.getenv("SOS_ESCALATION_WORKERS", "4"))
+    SOS_ESCALATION_RESCAN_SEC = float(os.getenv("SOS_ESCALATION_RESCAN_SEC", "60"))  # re-read due alerts, catching timers lost with a worker
+    # Run an alert's due step from its location updates; on by default on Vercel, where no timer thread survives
+    SOS_ESCALATION_ON_TRACK = os.getenv("SOS_ESCALATION_ON_TRACK", "True" if os.getenv("VERCEL") else "False").lower() in ("1", "true", "yes")
+    # Bearer token for /api/cron/* (Vercel Cron sends it). Call /api/cron/sos-escalation every minute:
+    # Vercel Cron can only do that on a paid plan, so on Hobby use an external pinger
+    CRON_SECRET = os.getenv("CRON_SECRET")
+    SOS_ADMIN_EMAILS = [e.strip() for e in os.getenv("SOS_ADMIN_EMAILS", "").split(",") if e.strip()]
+    PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:5000")  # host for links in emails sent outside a request
+
+    # Outbound mail lanes (services/outbound.py): parallel sends per call, rate count/seconds, retries.
+    # Mail is sent inside the request; SOS mail ignores its lane rate and never waits for quota.
+    MAIL_RATE = os.getenv("MAIL_RATE", "60/60")  # provider quota shared by all lanes, per worker process
+    MAIL_SOS_RESERVE = int(os.getenv("MAIL_SOS_RESERVE", "10"))  # part of MAIL_RATE only SOS mail may spend
+    MAIL_LANES = {
+        "sos": os.getenv("MAIL_LANE_SOS", "workers:4, retries:2"),
+        "transactional": os.getenv("MAIL_LANE_TRANSACTIONAL", "workers:2, rate:30/60, retries:1"),
+    }
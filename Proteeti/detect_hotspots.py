@@ -0,0 +1,29 @@
+"""Find report / SOS hotspots and store them for the admin dashboard.
+
+Meant for cron; each run only re-clusters the area around points added since
+the previous run, with a full pass at least once a day:
+    */15 * * * *  cd /srv/proteeti && python detect_hotspots.py
+    python detect_hotspots.py --full
+"""
+import argparse
+import sys
+
+from services.hotspots import HotspotDetector
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster reports and SOS alerts into hotspots")
+    parser.add_argument("--full", action="store_true", help="re-cluster everything instead of only new points")
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    with app.app_context():
+        run = HotspotDetector.from_config(app.config).run(full=args.full)
+    print(f"{'Full' if run.full else 'Incremental'} run: {run.new_points} new points, "
+          f"{run.hotspots_written} hotspots written in {run.duration_ms} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
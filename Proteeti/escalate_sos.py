@@ -0,0 +1,30 @@
+"""Send the SOS escalation steps that are due.
+
+The app's timer thread does this on a long-lived server. Where processes do
+not outlive their requests (serverless), run this from cron instead:
+    * * * * *  cd /srv/proteeti && python escalate_sos.py
+
+On Vercel, call /api/cron/sos-escalation every minute with CRON_SECRET as a
+bearer token instead. Vercel Cron runs per-minute schedules on paid plans
+only; on Hobby use an external pinger.
+"""
+import argparse
+import sys
+
+from services.sos_escalation import sos_escalator
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Escalate unacknowledged SOS alerts that are due")
+    parser.parse_args(argv)
+
+    from app import app
+
+    with app.app_context():
+        actions = sos_escalator.run_due()
+    print(f"{len(actions)} escalation steps sent" + (f": {', '.join(actions)}" if actions else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
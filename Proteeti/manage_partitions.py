@@ -0,0 +1,39 @@
+"""Create upcoming monthly partitions and archive old months of reports / SOS alerts.
+
+Meant for cron; see services/partitions.py for how partitions and archives are laid out:
+    0 3 * * *  cd /srv/proteeti && python manage_partitions.py
+    0 4 1 * *  cd /srv/proteeti && python manage_partitions.py --archive
+    python manage_partitions.py --archive --to parquet --older-than-months 24
+"""
+import argparse
+import sys
+
+from services.partitions import PartitionError, partition_manager
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain monthly partitions of reports and SOS alerts")
+    parser.add_argument("--archive", action="store_true",
+                        help="also move months older than ARCHIVE_AFTER_MONTHS out of the live tables")
+    parser.add_argument("--to", choices=["table", "parquet"], help="archive target (default: ARCHIVE_TO)")
+    parser.add_argument("--older-than-months", type=int, help="override ARCHIVE_AFTER_MONTHS")
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    with app.app_context():
+        created = partition_manager.ensure_partitions()
+        print(f"Partitions created: {', '.join(created) or 'none needed'}")
+        if args.archive:
+            try:
+                summary = partition_manager.archive(to=args.to, older_than_months=args.older_than_months)
+            except PartitionError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 1
+            for table, moved in summary.items():
+                print(f"{table}: archived {moved['rows']} rows ({', '.join(sorted(set(moved['months']))) or 'none'})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
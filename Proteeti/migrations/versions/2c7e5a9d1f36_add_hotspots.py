@@ -0,0 +1,64 @@
+"""Add hotspots and hotspot_runs for the clustering job
+
+Revision ID: 2c7e5a9d1f36
+Revises: 9b3d6f1a2c58
+Create Date: 2026-10-19 18:26:51.407733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c7e5a9d1f36'
+down_revision = '9b3d6f1a2c58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('hotspots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('centroid_lat', sa.Float(), nullable=False),
+    sa.Column('centroid_lng', sa.Float(), nullable=False),
+    sa.Column('radius_m', sa.Float(), nullable=False),
+    sa.Column('report_count', sa.Integer(), nullable=False),
+    sa.Column('sos_count', sa.Integer(), nullable=False),
+    sa.Column('recent_count', sa.Integer(), nullable=False),
+    sa.Column('previous_count', sa.Integer(), nullable=False),
+    sa.Column('trend', sa.String(length=10), nullable=False),
+    sa.Column('top_category', sa.String(length=50), nullable=True),
+    sa.Column('first_seen', sa.String(length=16), nullable=True),
+    sa.Column('last_seen', sa.String(length=16), nullable=True),
+    sa.Column('cells', sa.JSON(), nullable=True),
+    sa.Column('updated_at', sa.String(length=16), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('hotspots', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_hotspots_trend'), ['trend'], unique=False)
+
+    op.create_table('hotspot_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.String(length=16), nullable=True),
+    sa.Column('full', sa.Boolean(), nullable=False),
+    sa.Column('last_report_id', sa.Integer(), nullable=False),
+    sa.Column('last_sos_id', sa.Integer(), nullable=False),
+    sa.Column('new_points', sa.Integer(), nullable=False),
+    sa.Column('points_clustered', sa.Integer(), nullable=False),
+    sa.Column('hotspots_written', sa.Integer(), nullable=False),
+    sa.Column('duration_ms', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('hotspot_runs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_hotspot_runs_started_at'), ['started_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('hotspot_runs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_hotspot_runs_started_at'))
+
+    op.drop_table('hotspot_runs')
+    with op.batch_alter_table('hotspots', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_hotspots_trend'))
+
+    op.drop_table('hotspots')
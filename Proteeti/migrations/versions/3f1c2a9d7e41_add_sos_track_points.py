@@ -0,0 +1,32 @@
+"""Add sos_track_points for live SOS location tracking
+
+Revision ID: 3f1c2a9d7e41
+Revises: b8ae916f008d
+Create Date: 2026-10-19 10:12:03.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7e41'
+down_revision = 'b8ae916f008d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sos_track_points',
+    sa.Column('alert_id', sa.Integer(), nullable=False),
+    sa.Column('recorded_at', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('lat', sa.Float(precision=24), nullable=False),
+    sa.Column('lng', sa.Float(precision=24), nullable=False),
+    sa.Column('accuracy', sa.Float(precision=24), nullable=True),
+    sa.ForeignKeyConstraint(['alert_id'], ['sos_alerts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('alert_id', 'recorded_at')
+    )
+
+
+def downgrade():
+    op.drop_table('sos_track_points')
@@ -0,0 +1,36 @@
+"""Add data_versions for HTTP response caching
+
+Revision ID: 5d2b8e1f4c07
+Revises: c91d4f27a6b8
+Create Date: 2026-10-19 14:02:37.118204
+
+"""
+import time
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2b8e1f4c07'
+down_revision = 'c91d4f27a6b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    data_versions = op.create_table('data_versions',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    now = int(time.time())
+    op.bulk_insert(data_versions, [
+        {'name': name, 'version': 0, 'updated_at': now}
+        for name in ('reports', 'sos_alerts', 'profiles')
+    ])
+
+
+def downgrade():
+    op.drop_table('data_versions')
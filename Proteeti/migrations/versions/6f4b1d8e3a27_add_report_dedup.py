@@ -0,0 +1,54 @@
+"""Merge near-duplicate reports: confirmation count and report_submissions
+
+Revision ID: 6f4b1d8e3a27
+Revises: 2c7e5a9d1f36
+Create Date: 2026-10-19 19:12:37.590214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f4b1d8e3a27'
+down_revision = '2c7e5a9d1f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('confirmations', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('last_confirmed_at', sa.String(length=16), nullable=True))
+        batch_op.create_index('ix_reports_category_timestamp', ['category', 'timestamp'], unique=False)
+
+    op.create_table('report_submissions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('report_id', sa.Integer(), nullable=True),
+    sa.Column('username', sa.String(length=80), nullable=False),
+    sa.Column('lat', sa.Float(), nullable=False),
+    sa.Column('lng', sa.Float(), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('merged', sa.Boolean(), nullable=False),
+    sa.Column('submitted_at', sa.String(length=16), nullable=True),
+    sa.ForeignKeyConstraint(['report_id'], ['reports.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('report_submissions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_report_submissions_report_id'), ['report_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_report_submissions_submitted_at'), ['submitted_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_report_submissions_username'), ['username'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report_submissions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_report_submissions_username'))
+        batch_op.drop_index(batch_op.f('ix_report_submissions_submitted_at'))
+        batch_op.drop_index(batch_op.f('ix_report_submissions_report_id'))
+
+    op.drop_table('report_submissions')
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.drop_index('ix_reports_category_timestamp')
+        batch_op.drop_column('last_confirmed_at')
+        batch_op.drop_column('confirmations')
@@ -0,0 +1,46 @@
+"""Add pending_verifications for server-side email verification
+
+Revision ID: 7a4e0c5b92d3
+Revises: 3f1c2a9d7e41
+Create Date: 2026-10-19 11:02:47.190533
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4e0c5b92d3'
+down_revision = '3f1c2a9d7e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('pending_verifications',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('username', sa.String(length=80), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=False),
+    sa.Column('code_hash', sa.String(length=64), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('send_count', sa.Integer(), nullable=False),
+    sa.Column('window_started_at', sa.BigInteger(), nullable=False),
+    sa.Column('last_sent_at', sa.BigInteger(), nullable=False),
+    sa.Column('expires_at', sa.BigInteger(), nullable=False),
+    sa.Column('ip', sa.String(length=45), nullable=True),
+    sa.Column('created_at', sa.String(length=16), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    with op.batch_alter_table('pending_verifications', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_pending_verifications_expires_at'), ['expires_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_pending_verifications_ip'), ['ip'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pending_verifications', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pending_verifications_ip'))
+        batch_op.drop_index(batch_op.f('ix_pending_verifications_expires_at'))
+
+    op.drop_table('pending_verifications')
@@ -0,0 +1,56 @@
+"""Full-text search index on report descriptions
+
+Revision ID: 8d2e6b4f9c71
+Revises: 6f4b1d8e3a27
+Create Date: 2026-10-19 20:04:51.318826
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e6b4f9c71'
+down_revision = '6f4b1d8e3a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Generated column: maintained by Postgres on every insert/update of description
+        op.execute(
+            "ALTER TABLE reports ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS "
+            "(to_tsvector('english'::regconfig, coalesce(description, ''))) STORED"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_reports_search_vector ON reports USING GIN (search_vector)")
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5("
+            "description, content='reports', content_rowid='id', tokenize='porter unicode61')"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS reports_fts_ai AFTER INSERT ON reports BEGIN "
+            "INSERT INTO reports_fts(rowid, description) VALUES (new.id, new.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS reports_fts_ad AFTER DELETE ON reports BEGIN "
+            "INSERT INTO reports_fts(reports_fts, rowid, description) VALUES ('delete', old.id, old.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS reports_fts_au AFTER UPDATE OF description ON reports BEGIN "
+            "INSERT INTO reports_fts(reports_fts, rowid, description) VALUES ('delete', old.id, old.description); "
+            "INSERT INTO reports_fts(rowid, description) VALUES (new.id, new.description); END"
+        )
+        op.execute("INSERT INTO reports_fts(reports_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_reports_search_vector")
+        op.execute("ALTER TABLE reports DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        for trigger in ('reports_fts_ai', 'reports_fts_ad', 'reports_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS reports_fts")
@@ -0,0 +1,42 @@
+"""Add safety_resources for the nearest-responder index
+
+Revision ID: 9b3d6f1a2c58
+Revises: e4a7c2d9b153
+Create Date: 2026-10-19 17:02:44.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3d6f1a2c58'
+down_revision = 'e4a7c2d9b153'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('safety_resources',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('lat', sa.Float(), nullable=False),
+    sa.Column('lng', sa.Float(), nullable=False),
+    sa.Column('phone', sa.String(length=40), nullable=True),
+    sa.Column('website', sa.String(length=255), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=False),
+    sa.Column('updated_at', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('safety_resources', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_safety_resources_kind'), ['kind'], unique=False)
+        batch_op.create_index(batch_op.f('ix_safety_resources_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('safety_resources', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_safety_resources_updated_at'))
+        batch_op.drop_index(batch_op.f('ix_safety_resources_kind'))
+
+    op.drop_table('safety_resources')
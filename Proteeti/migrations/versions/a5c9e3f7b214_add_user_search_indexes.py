@@ -0,0 +1,42 @@
+"""Admin user search: users.city and prefix / filter indexes
+
+Revision ID: a5c9e3f7b214
+Revises: 8d2e6b4f9c71
+Create Date: 2026-10-19 21:02:14.905377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5c9e3f7b214'
+down_revision = '8d2e6b4f9c71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('city', sa.String(length=100), nullable=True))
+        batch_op.create_index(batch_op.f('ix_users_city'), ['city'], unique=False)
+        batch_op.create_index('ix_users_verified_created_at', ['verified', 'created_at'], unique=False)
+
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)')], unique=False)
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=False)
+
+    # Existing profiles: copy the city out of the JSON
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("UPDATE users SET city = NULLIF(profile->>'city', '') WHERE profile IS NOT NULL")
+    else:
+        op.execute("UPDATE users SET city = NULLIF(json_extract(profile, '$.city'), '') WHERE profile IS NOT NULL")
+
+
+def downgrade():
+    op.drop_index('ix_users_email_lower', table_name='users')
+    op.drop_index('ix_users_username_lower', table_name='users')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_verified_created_at')
+        batch_op.drop_index(batch_op.f('ix_users_city'))
+        batch_op.drop_column('city')
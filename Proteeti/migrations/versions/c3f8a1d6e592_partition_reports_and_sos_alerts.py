@@ -0,0 +1,166 @@
+"""Partition reports and sos_alerts by month; archive tables
+
+Revision ID: c3f8a1d6e592
+Revises: a5c9e3f7b214
+Create Date: 2026-10-19 22:15:40.127593
+
+On PostgreSQL each table is rebuilt as a table range-partitioned on its time
+column, with one partition per month from its oldest row to three months
+ahead and a DEFAULT partition for everything else (services/partitions.py
+adds later months). The primary key becomes (id, <time column>), as a
+partitioned table requires, so the foreign keys from report_submissions and
+sos_track_points are dropped; the models declare none, and the application
+does what ON DELETE SET NULL / CASCADE did (services/partitions.py and the
+admin report delete). The tables' own foreign keys
+(reports.username -> users.username, sos_alerts.user_id -> users.id) are
+re-created on the rebuilt tables, on the partitioned parents on upgrade and
+on the plain tables on downgrade. <table>_archive is created partitioned
+the same way, so archived months can be attached to it without copying rows.
+
+SQLite has no partitioning: only the archive tables are created there.
+"""
+import re
+from datetime import date, datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8a1d6e592'
+down_revision = 'a5c9e3f7b214'
+branch_labels = None
+depends_on = None
+
+
+TABLES = (('reports', 'timestamp'), ('sos_alerts', 'created_at'))
+MONTHS_AHEAD = 3
+
+
+def add_months(month, n):
+    years, index = divmod(month.month - 1 + n, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def bound(month):
+    return month.strftime('%Y-%m-01 00:00')
+
+
+def secondary_indexes(conn, table):
+    return conn.execute(sa.text(
+        "SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = CAST(:table AS regclass) AND NOT indisprimary"
+    ), {'table': table}).scalars().all()
+
+
+def outgoing_foreign_keys(conn, table):
+    return conn.execute(sa.text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'"
+    ), {'table': table}).all()
+
+
+def plain_columns(conn, table):
+    names = conn.execute(sa.text(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = :table "
+        "AND table_schema = current_schema() AND is_generated = 'NEVER' ORDER BY ordinal_position"
+    ), {'table': table}).scalars().all()
+    return ', '.join(f'"{name}"' for name in names)
+
+
+def rebuild(conn, table, column, partitioned):
+    """Copy `table` into a new table of the same name, partitioned or plain."""
+    old = f'{table}_old'
+    op.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    indexes = secondary_indexes(conn, old)
+    foreign_keys = outgoing_foreign_keys(conn, old)
+    sequence = conn.execute(sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': old}).scalar()
+
+    if partitioned:
+        op.execute(f'UPDATE {old} SET "{column}" = \'1970-01-01 00:00\' WHERE "{column}" IS NULL')
+        op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING GENERATED) '
+                   f'PARTITION BY RANGE ("{column}")')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN "{column}" SET NOT NULL')
+        op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, "{column}")')
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        today = (datetime.now(timezone.utc) + timedelta(hours=6)).date().replace(day=1)
+        oldest = conn.execute(sa.text(
+            f'SELECT min("{column}") FROM {old} WHERE "{column}" >= \'2000-01-01 00:00\''
+        )).scalar()
+        try:
+            month = date(int(oldest[:4]), int(oldest[5:7]), 1)
+        except (TypeError, ValueError):
+            month = today
+        while month <= add_months(today, MONTHS_AHEAD):
+            op.execute(f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} "
+                       f"FOR VALUES FROM ('{bound(month)}') TO ('{bound(add_months(month, 1))}')")
+            month = add_months(month, 1)
+    else:
+        op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING GENERATED)')
+        op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id)')
+
+    columns = plain_columns(conn, old)
+    op.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}')
+    if sequence:
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+    # CASCADE drops the foreign keys pointing at the old table, not the tables holding them
+    op.execute(f'DROP TABLE {old} CASCADE')
+    for definition in indexes:
+        op.execute(re.sub(rf' ON (\S+\.)?{old} ', f' ON {table} ', definition))
+    # LIKE does not copy foreign keys, and the old table's went with it
+    for name, definition in foreign_keys:
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'postgresql':
+        for table, column in TABLES:
+            rebuild(conn, table, column, partitioned=True)
+            op.execute(f'CREATE TABLE {table}_archive (LIKE {table} INCLUDING GENERATED) '
+                       f'PARTITION BY RANGE ("{column}")')
+            op.execute(f'CREATE TABLE {table}_archive_default PARTITION OF {table}_archive DEFAULT')
+            op.execute(f'CREATE INDEX ix_{table}_archive_{column} ON {table}_archive ("{column}")')
+        return
+
+    op.create_table('reports_archive',
+    sa.Column('id', sa.Integer(), nullable=True),
+    sa.Column('username', sa.String(length=80), nullable=True),
+    sa.Column('lat', sa.Float(), nullable=True),
+    sa.Column('lng', sa.Float(), nullable=True),
+    sa.Column('category', sa.String(length=50), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('timestamp', sa.String(length=16), nullable=True),
+    sa.Column('confirmations', sa.Integer(), nullable=True),
+    sa.Column('last_confirmed_at', sa.String(length=16), nullable=True)
+    )
+    op.create_index('ix_reports_archive_timestamp', 'reports_archive', ['timestamp'], unique=False)
+    op.create_table('sos_alerts_archive',
+    sa.Column('id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('username', sa.String(length=80), nullable=True),
+    sa.Column('lat', sa.Float(), nullable=True),
+    sa.Column('lng', sa.Float(), nullable=True),
+    sa.Column('accuracy', sa.Float(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('created_at', sa.String(length=16), nullable=True)
+    )
+    op.create_index('ix_sos_alerts_archive_created_at', 'sos_alerts_archive', ['created_at'], unique=False)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'postgresql':
+        # Archived months are not moved back; they are dropped with the archive tables
+        for table, column in TABLES:
+            op.execute(f'DROP TABLE {table}_archive CASCADE')
+            rebuild(conn, table, column, partitioned=False)
+        op.create_foreign_key('report_submissions_report_id_fkey', 'report_submissions', 'reports',
+                              ['report_id'], ['id'], ondelete='SET NULL')
+        op.create_foreign_key('sos_track_points_alert_id_fkey', 'sos_track_points', 'sos_alerts',
+                              ['alert_id'], ['id'], ondelete='CASCADE')
+        return
+
+    op.drop_index('ix_sos_alerts_archive_created_at', table_name='sos_alerts_archive')
+    op.drop_table('sos_alerts_archive')
+    op.drop_index('ix_reports_archive_timestamp', table_name='reports_archive')
+    op.drop_table('reports_archive')
@@ -0,0 +1,38 @@
+"""Add server_sessions for the server-side session backend
+
+Revision ID: c91d4f27a6b8
+Revises: 7a4e0c5b92d3
+Create Date: 2026-10-19 12:20:11.502318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c91d4f27a6b8'
+down_revision = '7a4e0c5b92d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('server_sessions',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('username', sa.String(length=80), nullable=True),
+    sa.Column('expires_at', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('server_sessions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_server_sessions_expires_at'), ['expires_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_server_sessions_username'), ['username'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('server_sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_server_sessions_username'))
+        batch_op.drop_index(batch_op.f('ix_server_sessions_expires_at'))
+
+    op.drop_table('server_sessions')
@@ -0,0 +1,47 @@
+"""SOS escalation state on sos_alerts
+
+Revision ID: d7a2f5c8e419
+Revises: c3f8a1d6e592
+Create Date: 2026-10-19 23:08:26.551904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a2f5c8e419'
+down_revision = 'c3f8a1d6e592'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sos_alerts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('escalation_level', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('next_escalation_at', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('acknowledged_at', sa.String(length=16), nullable=True))
+        batch_op.add_column(sa.Column('acknowledged_by', sa.String(length=120), nullable=True))
+        batch_op.create_index(batch_op.f('ix_sos_alerts_next_escalation_at'), ['next_escalation_at'], unique=False)
+
+    # Archived months are attached to the archive table as they are, so its columns must follow
+    with op.batch_alter_table('sos_alerts_archive', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('escalation_level', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('next_escalation_at', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('acknowledged_at', sa.String(length=16), nullable=True))
+        batch_op.add_column(sa.Column('acknowledged_by', sa.String(length=120), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('sos_alerts_archive', schema=None) as batch_op:
+        batch_op.drop_column('acknowledged_by')
+        batch_op.drop_column('acknowledged_at')
+        batch_op.drop_column('next_escalation_at')
+        batch_op.drop_column('escalation_level')
+
+    with op.batch_alter_table('sos_alerts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sos_alerts_next_escalation_at'))
+        batch_op.drop_column('acknowledged_by')
+        batch_op.drop_column('acknowledged_at')
+        batch_op.drop_column('next_escalation_at')
+        batch_op.drop_column('escalation_level')
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import json
@@ -9,6 +10,19 @@ db = SQLAlchemy()
 def bd_now():
     return (datetime.now(timezone.utc) + timedelta(hours=6)).strftime("%Y-%m-%d %H:%M")
 
+# Client-supplied epoch milliseconds (e.g. an SOS queued offline) in the same format
+def bd_from_epoch_ms(ms):
+    return (datetime.fromtimestamp(ms / 1000, timezone.utc) + timedelta(hours=6)).strftime("%Y-%m-%d %H:%M")
+
+# Inverse of the above: a stored "YYYY-MM-DD HH:MM" timestamp as epoch seconds
+def bd_to_epoch(text):
+    parsed = datetime.strptime(text, "%Y-%m-%d %H:%M") - timedelta(hours=6)
+    return parsed.replace(tzinfo=timezone.utc).timestamp()
+
+# Module-level so bulk jobs can hash in a process pool
+def hash_password(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -21,12 +35,17 @@ class User(db.Model):
     trusted_contacts = db.Column(db.JSON, default=list)
     notification_prefs = db.Column(db.JSON, default=dict)
     google_id = db.Column(db.String(255), unique=True, nullable=True)
+    # Copy of profile["city"] so the admin user list can filter on an index (see sync_user_city)
+    city = db.Column(db.String(100), nullable=True, index=True)
+    # Admin user search: case-insensitive prefix ranges, and the verified filter in signup order
+    __table_args__ = (
+        db.Index('ix_users_username_lower', db.func.lower(username)),
+        db.Index('ix_users_email_lower', db.func.lower(email)),
+        db.Index('ix_users_verified_created_at', 'verified', 'created_at'),
+    )
     def set_password(self, password):
         if password:
-            self.password_hash = bcrypt.hashpw(
-                password.encode('utf-8'),
-                bcrypt.gensalt()
-            ).decode('utf-8')
+            self.password_hash = hash_password(password)
     def check_password(self, password):
         if not self.password_hash:
             return False
@@ -45,6 +64,11 @@ class User(db.Model):
             'notification_prefs': self.notification_prefs or {}
         }
 
+@event.listens_for(User, 'before_insert')
+@event.listens_for(User, 'before_update')
+def sync_user_city(mapper, connection, user):
+    user.city = (user.profile or {}).get('city') or None
+
 class Report(db.Model):
     __tablename__ = 'reports'
     id = db.Column(db.Integer, primary_key=True)
@@ -54,7 +78,12 @@ class Report(db.Model):
     category = db.Column(db.String(50), nullable=False)
     description = db.Column(db.Text)
     timestamp = db.Column(db.String(16), default=bd_now, index=True)
+    # Distinct users who reported this hazard; near-duplicates are merged in (see ReportSubmission)
+    confirmations = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    last_confirmed_at = db.Column(db.String(16), nullable=True)
     user = db.relationship('User', backref='reports')
+    # Candidate lookup for near-duplicate merging: same category, recent timestamp
+    __table_args__ = (db.Index('ix_reports_category_timestamp', 'category', 'timestamp'),)
     def to_dict(self):
         return {
             'id': self.id,
@@ -63,9 +92,27 @@ class Report(db.Model):
             'lng': self.lng,
             'category': self.category,
             'description': self.description,
-            'timestamp': self.timestamp
+            'timestamp': self.timestamp,
+            'confirmations': self.confirmations
         }
 
+class ReportSubmission(db.Model):
+    """Every report as submitted, kept for audit. Near-duplicates of a recent
+    report are not added to `reports`; they point at it through `report_id`
+    with `merged` set."""
+    __tablename__ = 'report_submissions'
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: a partitioned `reports` has no unique id to point at. Removing a
+    # report sets this to NULL in code (delete_admin_report, services/partitions.py)
+    report_id = db.Column(db.Integer, nullable=True, index=True)
+    username = db.Column(db.String(80), nullable=False, index=True)
+    lat = db.Column(db.Float, nullable=False)
+    lng = db.Column(db.Float, nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    description = db.Column(db.Text)
+    merged = db.Column(db.Boolean, nullable=False, default=False)
+    submitted_at = db.Column(db.String(16), default=bd_now, index=True)
+
 class SOSAlert(db.Model):
     __tablename__ = 'sos_alerts'
     id = db.Column(db.Integer, primary_key=True)
@@ -76,6 +123,11 @@ class SOSAlert(db.Model):
     accuracy = db.Column(db.Float, nullable=True)
     status = db.Column(db.String(20), default='active')
     created_at = db.Column(db.String(16), default=bd_now, index=True)
+    # Escalation while nobody acknowledges the alert (services/sos_escalation.py)
+    escalation_level = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_escalation_at = db.Column(db.BigInteger, nullable=True, index=True)  # epoch milliseconds (UTC)
+    acknowledged_at = db.Column(db.String(16), nullable=True)
+    acknowledged_by = db.Column(db.String(120), nullable=True)
     user = db.relationship('User', backref='sos_alerts')
     def to_dict(self):
         return {
@@ -86,7 +138,179 @@ class SOSAlert(db.Model):
             'lng': self.lng,
             'accuracy': self.accuracy,
             'status': self.status,
-            'created_at': self.created_at
+            'created_at': self.created_at,
+            'escalation_level': self.escalation_level,
+            'acknowledged_at': self.acknowledged_at
+        }
+
+class SOSTrackPoint(db.Model):
+    """Append-only live location trail for an active SOS alert.
+
+    Rows are keyed by (alert_id, recorded_at) so each alert's track is stored
+    contiguously in time order, and coordinates use 4-byte REAL columns to keep
+    the table compact. Inserts go through services/sos_tracking.py in batches.
+    """
+    __tablename__ = 'sos_track_points'
+    # No foreign key: a partitioned `sos_alerts` has no unique id to point at. Archiving
+    # an alert deletes its points in code (services/partitions.py)
+    alert_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    recorded_at = db.Column(db.BigInteger, primary_key=True, autoincrement=False)  # epoch milliseconds (UTC)
+    lat = db.Column(db.Float(precision=24), nullable=False)
+    lng = db.Column(db.Float(precision=24), nullable=False)
+    accuracy = db.Column(db.Float(precision=24), nullable=True)
+    def to_dict(self):
+        return {
+            'alert_id': self.alert_id,
+            'recorded_at': self.recorded_at,
+            'lat': self.lat,
+            'lng': self.lng,
+            'accuracy': self.accuracy
+        }
+
+def archive_table(model, time_column):
+    """Plain copy of `model`'s columns (no keys, defaults or foreign keys) that
+    services/partitions.py moves old months into. On PostgreSQL the migration
+    creates it partitioned by month like the live table."""
+    source = model.__table__
+    return db.Table(
+        f'{source.name}_archive', db.metadata,
+        *[db.Column(c.name, c.type) for c in source.columns],
+        db.Index(f'ix_{source.name}_archive_{time_column}', time_column),
+    )
+
+reports_archive = archive_table(Report, 'timestamp')
+sos_alerts_archive = archive_table(SOSAlert, 'created_at')
+
+class PendingVerification(db.Model):
+    """Registration waiting for its email code. Holds only hashes: the bcrypt
+    password hash that becomes the user's, and an HMAC of the code."""
+    __tablename__ = 'pending_verifications'
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    username = db.Column(db.String(80), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+    code_hash = db.Column(db.String(64), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    send_count = db.Column(db.Integer, nullable=False, default=1)
+    window_started_at = db.Column(db.BigInteger, nullable=False)  # epoch seconds
+    last_sent_at = db.Column(db.BigInteger, nullable=False)
+    expires_at = db.Column(db.BigInteger, nullable=False, index=True)
+    ip = db.Column(db.String(45), nullable=True, index=True)
+    created_at = db.Column(db.String(16), default=bd_now)
+
+class ServerSession(db.Model):
+    """Server-side session data; the cookie only carries the random session id,
+    and this table stores its SHA-256 so a database leak does not expose cookies."""
+    __tablename__ = 'server_sessions'
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    username = db.Column(db.String(80), nullable=True, index=True)
+    expires_at = db.Column(db.BigInteger, nullable=False, index=True)  # epoch seconds
+    updated_at = db.Column(db.BigInteger, nullable=False)
+
+class DataVersion(db.Model):
+    """Change counter per dataset ("reports", "sos_alerts", "profiles", "resources"), bumped
+    on every write so cached responses can be validated without re-querying."""
+    __tablename__ = 'data_versions'
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.BigInteger, nullable=False)  # epoch seconds
+
+class IdempotencyKey(db.Model):
+    """Stored outcome of a POST sent with an Idempotency-Key header, so a request
+    replayed by the offline queue is answered instead of applied twice. `id` is a
+    SHA-256 of user, endpoint and key; a NULL status means still in progress."""
+    __tablename__ = 'idempotency_keys'
+    id = db.Column(db.String(64), primary_key=True)
+    status_code = db.Column(db.Integer, nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.BigInteger, nullable=False, index=True)  # epoch seconds
+
+class SafetyResource(db.Model):
+    """A police station, hospital or shelter shown on the resources page and
+    served by the nearest-responder index. Deletes only clear `active`, and
+    `updated_at` moves on every change, so other workers can pick up edits
+    incrementally."""
+    __tablename__ = 'safety_resources'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(16), nullable=False, index=True)  # police / hospital / shelter
+    name = db.Column(db.String(200), nullable=False)
+    lat = db.Column(db.Float, nullable=False)
+    lng = db.Column(db.Float, nullable=False)
+    phone = db.Column(db.String(40), nullable=True)
+    website = db.Column(db.String(255), nullable=True)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    updated_at = db.Column(db.BigInteger, nullable=False, index=True)  # epoch milliseconds
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'name': self.name,
+            'lat': self.lat,
+            'lng': self.lng,
+            'phone': self.phone,
+            'website': self.website,
+            'active': self.active
+        }
+
+class Hotspot(db.Model):
+    """A cluster of reports and SOS alerts found by detect_hotspots.py. `cells`
+    lists the grid cells its points fall in, so an incremental run can replace
+    just the hotspots near new points."""
+    __tablename__ = 'hotspots'
+    id = db.Column(db.Integer, primary_key=True)
+    centroid_lat = db.Column(db.Float, nullable=False)
+    centroid_lng = db.Column(db.Float, nullable=False)
+    radius_m = db.Column(db.Float, nullable=False)
+    report_count = db.Column(db.Integer, nullable=False, default=0)
+    sos_count = db.Column(db.Integer, nullable=False, default=0)
+    recent_count = db.Column(db.Integer, nullable=False, default=0)    # points in the last trend period
+    previous_count = db.Column(db.Integer, nullable=False, default=0)  # points in the period before that
+    trend = db.Column(db.String(10), nullable=False, default='stable', index=True)  # rising / falling / stable
+    top_category = db.Column(db.String(50), nullable=True)
+    first_seen = db.Column(db.String(16), nullable=True)
+    last_seen = db.Column(db.String(16), nullable=True)
+    cells = db.Column(db.JSON, default=list)
+    updated_at = db.Column(db.String(16), default=bd_now)
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'lat': self.centroid_lat,
+            'lng': self.centroid_lng,
+            'radius_m': self.radius_m,
+            'report_count': self.report_count,
+            'sos_count': self.sos_count,
+            'recent_count': self.recent_count,
+            'previous_count': self.previous_count,
+            'trend': self.trend,
+            'top_category': self.top_category,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'updated_at': self.updated_at
+        }
+
+class HotspotRun(db.Model):
+    """One run of the hotspot job; the latest row is the cursor for the next
+    incremental run."""
+    __tablename__ = 'hotspot_runs'
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.String(16), default=bd_now, index=True)
+    full = db.Column(db.Boolean, nullable=False, default=False)
+    last_report_id = db.Column(db.Integer, nullable=False, default=0)
+    last_sos_id = db.Column(db.Integer, nullable=False, default=0)
+    new_points = db.Column(db.Integer, nullable=False, default=0)
+    points_clustered = db.Column(db.Integer, nullable=False, default=0)
+    hotspots_written = db.Column(db.Integer, nullable=False, default=0)
+    duration_ms = db.Column(db.Integer, nullable=False, default=0)
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'started_at': self.started_at,
+            'full': self.full,
+            'new_points': self.new_points,
+            'points_clustered': self.points_clustered,
+            'hotspots_written': self.hotspots_written,
+            'duration_ms': self.duration_ms
         }
 
 class Admin(db.Model):
@@ -0,0 +1,123 @@
+"""Fingerprinted static assets.
+
+At startup every file under ``static/`` is hashed and given a content-hashed
+name (``css/style.css`` -> ``css/style.3f2a1b9c04.css``). A ``url_defaults``
+hook rewrites ``url_for('static', filename=...)`` to the hashed name, so the
+templates need no changes, and the static view serves hashed names with
+``Cache-Control: public, max-age=31536000, immutable``. A changed file gets
+a new name, so browsers never revalidate and never see a stale copy. Plain
+names keep working (service-worker.js must stay at a stable URL).
+
+Responsive image variants (WebP and downscaled widths) are produced by
+``python build_assets.py`` into ``static/dist`` together with
+``static/dist/manifest.json``; when present, the ``picture()`` template
+helper emits a ``<picture>`` with a WebP ``srcset``. Without a build it
+renders a plain fingerprinted ``<img>``.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import send_from_directory, url_for
+from markupsafe import Markup, escape
+
+
+HASH_LENGTH = 10
+IMMUTABLE = "public, max-age=31536000, immutable"
+UNVERSIONED = {"service-worker.js"}
+VARIANTS_DIR = "dist"
+VARIANTS_MANIFEST = "dist/manifest.json"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(filename, digest):
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{digest}{ext}"
+
+
+class AssetRegistry:
+    def __init__(self, app=None):
+        self.enabled = True
+        self.static_folder = None
+        self.hashed = {}     # "css/style.css" -> "css/style.<hash>.css"
+        self.sources = {}    # hashed name -> real relative path
+        self.variants = {}   # "img/x.png" -> [{"file", "width", "type"}], from build_assets.py
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("ASSET_FINGERPRINTING", True)
+        self.static_folder = app.static_folder
+        if self.enabled:
+            self.scan()
+            app.url_defaults(self._fingerprint)
+            app.view_functions["static"] = self.send_static
+        app.jinja_env.globals.update(picture=self.picture, asset_srcset=self.srcset)
+        app.extensions["assets"] = self
+
+    def scan(self):
+        hashed, sources = {}, {}
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_folder).replace(os.sep, "/")
+                if filename in UNVERSIONED or filename == VARIANTS_MANIFEST:
+                    continue
+                fingerprinted = hashed_name(filename, file_hash(path))
+                hashed[filename] = fingerprinted
+                sources[fingerprinted] = filename
+        self.hashed, self.sources = hashed, sources
+
+        manifest = os.path.join(self.static_folder, VARIANTS_MANIFEST)
+        try:
+            with open(manifest) as f:
+                self.variants = json.load(f)
+        except (OSError, ValueError):
+            self.variants = {}
+
+    def _fingerprint(self, endpoint, values):
+        if endpoint == "static":
+            filename = values.get("filename")
+            if filename in self.hashed:
+                values["filename"] = self.hashed[filename]
+
+    def send_static(self, filename):
+        source = self.sources.get(filename)
+        if source is None:
+            return send_from_directory(self.static_folder, filename)
+        response = send_from_directory(self.static_folder, source, max_age=31536000)
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+    # ----- template helpers -----
+    def srcset(self, filename, mimetype="image/webp"):
+        """'url 320w, url 640w' for the built variants of `filename` ('' if none)."""
+        return ", ".join(
+            f"{url_for('static', filename=v['file'])} {v['width']}w"
+            for v in self.variants.get(filename, []) if v["type"] == mimetype
+        )
+
+    def picture(self, filename, alt="", sizes="100vw", loading="lazy", **attrs):
+        """<picture> with a WebP srcset when variants exist, else a plain <img>."""
+        attributes = "".join(f' {escape(k.rstrip("_"))}="{escape(v)}"' for k, v in attrs.items())
+        resized = self.srcset(filename, mimetypes.guess_type(filename)[0])
+        if resized:
+            attributes += f' srcset="{escape(resized)}" sizes="{escape(sizes)}"'
+        img = (f'<img src="{escape(url_for("static", filename=filename))}" alt="{escape(alt)}"'
+               f' loading="{escape(loading)}" decoding="async"{attributes}>')
+        webp = self.srcset(filename)
+        if not webp:
+            return Markup(img)
+        return Markup(f'<picture><source type="image/webp" srcset="{escape(webp)}" sizes="{escape(sizes)}">'
+                      f'{img}</picture>')
+
+
+assets = AssetRegistry()
@@ -0,0 +1,171 @@
+"""Negotiated response compression.
+
+Text-like responses (HTML, JSON, CSS/JS, CSV, NDJSON and the binary point
+format) above ``COMPRESS_MIN_SIZE`` bytes are compressed with brotli when
+the client accepts it and the brotli package is installed, and with gzip
+otherwise. Streamed responses are compressed chunk by chunk as they go out;
+the size threshold is applied to them by buffering their first chunks until
+``COMPRESS_MIN_SIZE`` bytes have arrived or the stream has ended.
+
+Responses that carry an ETag (the cached read endpoints) are the hot ones:
+their compressed bodies are kept in a small LRU keyed by ETag and encoding,
+so a repeat map load is neither serialized nor compressed again. Each
+encoding gets its own ETag (``"<etag>-br"``, ``"<etag>-gzip"``) as HTTP
+requires for strong validators; services/http_cache.py accepts all of them
+in ``If-None-Match``, and a 304 echoes back the suffixed ETag the client
+sent, with the same ``Vary: Accept-Encoding`` as the full response.
+"""
+import gzip
+import zlib
+
+from flask import request
+
+from services.cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+    "application/vnd.proteeti.points", "image/svg+xml",
+}
+
+ETAG_SUFFIXES = ("-br", "-gzip")
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def negotiate():
+    """Pick 'br', 'gzip' or None from the request's Accept-Encoding."""
+    if brotli is not None and _accepts("br"):
+        return "br"
+    if _accepts("gzip"):
+        return "gzip"
+    return None
+
+
+def compress(data, encoding, level):
+    if encoding == "br":
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=min(level, 9), mtime=0)
+
+
+def _compress_stream(chunks, encoding, level):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=min(level, 11))
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            out = compressor.process(chunk) + compressor.flush()
+            if out:
+                yield out
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(min(level, 9), zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield compressor.flush()
+
+
+def _peek(chunks, size):
+    """Read chunks until `size` bytes have arrived. Returns (head, rest), with
+    rest None when the stream ended first."""
+    chunks = iter(chunks)
+    head, length = [], 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        head.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            return head, chunks
+    return head, None
+
+
+def _prepend(head, rest):
+    yield from head
+    yield from rest    # closing this generator closes the underlying stream
+
+
+class Compression:
+    def __init__(self, app=None):
+        self.enabled = True
+        self.min_size = 1024
+        self.level = 6
+        self.cache = TTLCache(maxsize=128)   # (etag, encoding) -> compressed body
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("COMPRESS_ENABLED", True)
+        self.min_size = app.config.get("COMPRESS_MIN_SIZE", 1024)
+        self.level = app.config.get("COMPRESS_LEVEL", 6)
+        self.cache = TTLCache(maxsize=app.config.get("COMPRESS_CACHE_SIZE", 128))
+        app.after_request(self._after_request)
+        app.extensions["compression"] = self
+
+    def _compressible(self, response):
+        if response.status_code != 200 or "Content-Encoding" in response.headers:
+            return False
+        mimetype = response.mimetype or ""
+        return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES
+
+    def _not_modified(self, response):
+        """Keep a 304 consistent with the compressed 200 it revalidates."""
+        etag, weak = response.get_etag()
+        if not etag:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate()
+        if encoding and request.if_none_match.contains(f"{etag}-{encoding}"):
+            response.set_etag(f"{etag}-{encoding}", weak=weak)
+        return response
+
+    def _after_request(self, response):
+        if self.enabled and response.status_code == 304:
+            return self._not_modified(response)
+        if not self.enabled or request.method == "HEAD" or not self._compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate()
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        if response.is_streamed:
+            head, rest = _peek(response.response, self.min_size)
+            if rest is None:
+                # The whole stream was shorter than the threshold
+                response.response = head
+                return response
+            response.response = _compress_stream(_prepend(head, rest), encoding, self.level)
+            response.direct_passthrough = False
+            response.headers.pop("Content-Length", None)
+        else:
+            key = (etag, encoding) if etag and not weak else None
+            body = self.cache.get(key) if key else None
+            if body is None:
+                data = response.get_data()
+                if len(data) < self.min_size:
+                    return response
+                body = compress(data, encoding, self.level)
+                if key:
+                    self.cache.set(key, body)
+            response.set_data(body)
+
+        response.headers["Content-Encoding"] = encoding
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak=weak)
+        return response
+
+
+compression = Compression()
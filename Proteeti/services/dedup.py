@@ -0,0 +1,97 @@
+"""Merging near-duplicate hazard reports at submit time.
+
+A submission within ``REPORT_DEDUP_RADIUS_M`` metres and
+``REPORT_DEDUP_WINDOW_MIN`` minutes of an existing report of the same
+category is the same hazard: instead of a new ``reports`` row, the existing
+one (the canonical report) gains a confirmation when the submitter has not
+reported it before. Every submission is still written to
+``report_submissions`` for audit, pointing at its canonical report.
+
+Candidates come from the (category, timestamp) index on reports: an
+equality on category and a range on the timestamp leave a handful of recent
+rows, which are then narrowed by a bounding box and measured exactly.
+"""
+import math
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, select, update
+
+from models.user import db, Report, ReportSubmission
+
+
+METRES_PER_DEGREE = 111320.0
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def distance_m(lat1, lng1, lat2, lng2):
+    dy = (lat2 - lat1) * METRES_PER_DEGREE
+    dx = (lng2 - lng1) * METRES_PER_DEGREE * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(dx, dy)
+
+
+class ReportDeduplicator:
+    def __init__(self, radius_m=50, window_min=30, enabled=True):
+        self.radius_m = radius_m
+        self.window_min = window_min
+        self.enabled = enabled
+
+    def init_app(self, app):
+        self.enabled = app.config.get("REPORT_DEDUP_ENABLED", self.enabled)
+        self.radius_m = app.config.get("REPORT_DEDUP_RADIUS_M", self.radius_m)
+        self.window_min = app.config.get("REPORT_DEDUP_WINDOW_MIN", self.window_min)
+        app.extensions["report_dedup"] = self
+
+    def find_canonical(self, lat, lng, category, timestamp):
+        """The closest report of `category` within the radius and time window, or None."""
+        if not self.enabled:
+            return None
+        at = datetime.strptime(timestamp, TIME_FORMAT)
+        window = timedelta(minutes=self.window_min)
+        dlat = self.radius_m / METRES_PER_DEGREE
+        dlng = dlat / max(math.cos(math.radians(lat)), 0.01)
+        candidates = db.session.execute(
+            select(Report).where(
+                Report.category == category,
+                Report.timestamp.between((at - window).strftime(TIME_FORMAT), (at + window).strftime(TIME_FORMAT)),
+                Report.lat.between(lat - dlat, lat + dlat),
+                Report.lng.between(lng - dlng, lng + dlng),
+            )
+        ).scalars().all()
+        best, best_d = None, self.radius_m
+        for report in candidates:
+            d = distance_m(lat, lng, report.lat, report.lng)
+            if d <= best_d:
+                best, best_d = report, d
+        return best
+
+    def submit(self, username, lat, lng, category, description, timestamp):
+        """Record a submission; returns (report, merged). Commits."""
+        canonical = self.find_canonical(lat, lng, category, timestamp)
+        if canonical is None:
+            report = Report(username=username, lat=lat, lng=lng, category=category,
+                            description=description, timestamp=timestamp)
+            db.session.add(report)
+            db.session.flush()
+            db.session.add(ReportSubmission(report_id=report.id, username=username, lat=lat, lng=lng,
+                                            category=category, description=description, merged=False,
+                                            submitted_at=timestamp))
+            db.session.commit()
+            return report, False
+
+        # Only a different reporter confirms the hazard; repeats by the same user are just recorded
+        seen = canonical.username == username or db.session.execute(select(exists().where(
+            ReportSubmission.report_id == canonical.id, ReportSubmission.username == username
+        ))).scalar()
+        db.session.add(ReportSubmission(report_id=canonical.id, username=username, lat=lat, lng=lng,
+                                        category=category, description=description, merged=True,
+                                        submitted_at=timestamp))
+        if not seen:
+            db.session.execute(update(Report).where(Report.id == canonical.id).values(
+                confirmations=Report.confirmations + 1, last_confirmed_at=timestamp
+            ))
+        db.session.commit()
+        db.session.refresh(canonical)
+        return canonical, True
+
+
+report_deduplicator = ReportDeduplicator()
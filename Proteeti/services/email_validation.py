@@ -0,0 +1,165 @@
+"""Email deliverability checks with domain-level caching.
+
+The mailboxlayer API is slow (up to the full timeout) and was called with a
+fresh connection each time. This module keeps one pooled HTTP session,
+caches verdicts per domain (MX present, disposable) and per address with a
+TTL and LRU eviction, and runs the local syntax / disposable / MX checks in
+parallel with the remote call. A domain we have already seen as deliverable
+does not go back to the API: the verification code mail proves the mailbox
+itself.
+
+Registration calls ``check()``. With ``MAILBOXLAYER_KEY`` set, a domain not
+seen before costs one API round trip (at most ``timeout`` seconds), unless the
+local MX lookup has already rejected it. Without a key only the local checks
+run. MX lookups need dnspython (in requirements.txt). If it is missing they
+are skipped and only syntax and the disposable list are checked.
+"""
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.cache import TTLCache
+
+
+EMAIL_RE = re.compile(r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$")
+
+# Common throwaway providers, rejected without asking the API
+DISPOSABLE_DOMAINS = {
+    "10minutemail.com", "discard.email", "dispostable.com", "fakeinbox.com",
+    "getnada.com", "guerrillamail.com", "guerrillamail.net", "maildrop.cc",
+    "mailinator.com", "mailnesia.com", "mintemail.com", "mohmal.com",
+    "sharklasers.com", "temp-mail.org", "tempmail.com", "tempmailo.com",
+    "throwawaymail.com", "trashmail.com", "yopmail.com",
+}
+
+MAILBOXLAYER_URL = "http://apilayer.net/api/check"
+
+try:
+    import dns.resolver
+    import dns.exception
+except ImportError:  # dnspython is optional
+    dns = None
+
+
+class EmailValidator:
+    def __init__(self, api_key=None, timeout=8, domain_ttl=24 * 3600, address_ttl=3600, maxsize=10000):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.domains = TTLCache(maxsize=maxsize, ttl=domain_ttl)     # domain -> {"mx_found", "disposable"}
+        self.addresses = TTLCache(maxsize=maxsize, ttl=address_ttl)  # email -> (ok, message)
+        self.pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="email-check")
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # ----- local checks -----
+    @staticmethod
+    def syntax_ok(email):
+        return EMAIL_RE.fullmatch(email) is not None
+
+    @staticmethod
+    def lookup_mx(domain):
+        """True/False when DNS gives a definite answer, None when unknown."""
+        if dns is None:
+            return None
+        try:
+            dns.resolver.resolve(domain, "MX", lifetime=3)
+            return True
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return False
+        except dns.exception.DNSException:
+            return None
+
+    # ----- remote check -----
+    def remote_check(self, email):
+        """Ask mailboxlayer. Returns the JSON verdict, or None if the service is unavailable."""
+        try:
+            data = self.session.get(MAILBOXLAYER_URL, params={
+                "access_key": self.api_key, "email": email, "smtp": 1, "format": 1
+            }, timeout=self.timeout).json()
+        except (requests.RequestException, ValueError):
+            return None
+        if not data.get("success", True) and "error" in data:
+            return None
+        return data
+
+    def _remember_domain(self, domain, mx_found=None, disposable=None):
+        verdict = dict(self.domains.get(domain) or {})
+        if mx_found is not None:
+            verdict["mx_found"] = mx_found
+        if disposable is not None:
+            verdict["disposable"] = disposable
+        self.domains.set(domain, verdict)
+
+    @staticmethod
+    def _domain_verdict(verdict):
+        if verdict.get("disposable"):
+            return False, "Disposable/temporary email addresses are not allowed."
+        if verdict.get("mx_found") is False:
+            return False, "Email domain has no MX records."
+        if verdict.get("mx_found"):
+            return True, "Email is valid."
+        return None
+
+    def check(self, email):
+        """Return (ok, message), matching the old mailboxlayer_check contract."""
+        email = email.strip()
+        if not self.syntax_ok(email):
+            return False, "Email format is invalid."
+        domain = email.rsplit("@", 1)[1].lower()
+
+        if domain in DISPOSABLE_DOMAINS:
+            return False, "Disposable/temporary email addresses are not allowed."
+
+        cached = self.addresses.get(email.lower())
+        if cached is not None:
+            return cached
+
+        known = self.domains.get(domain)
+        if known:
+            verdict = self._domain_verdict(known)
+            if verdict is not None:
+                return verdict
+
+        if not self.api_key:
+            mx_found = self.lookup_mx(domain)
+            if mx_found is not None:
+                self._remember_domain(domain, mx_found=mx_found)
+            if mx_found is False:
+                return False, "Email domain has no MX records."
+            return True, "Email validation skipped"
+
+        # Local MX lookup races the API call; a definite "no MX" answers early
+        remote = self.pool.submit(self.remote_check, email)
+        local = self.pool.submit(self.lookup_mx, domain)
+        done, _ = wait([remote, local], timeout=self.timeout + 1, return_when=FIRST_COMPLETED)
+        if local in done and local.result() is False:
+            self._remember_domain(domain, mx_found=False)
+            remote.cancel()
+            return False, "Email domain has no MX records."
+
+        try:
+            data = remote.result(timeout=self.timeout + 1)
+        except Exception:
+            data = None
+        if data is None:
+            return True, "Email validation service unavailable, skipping"
+
+        self._remember_domain(domain, mx_found=bool(data.get("mx_found")), disposable=bool(data.get("disposable")))
+
+        if not data.get("format_valid", False):
+            result = (False, "Email format is invalid.")
+        elif not data.get("mx_found", False):
+            result = (False, "Email domain has no MX records.")
+        elif not data.get("smtp_check", False):
+            result = (False, "Email address does not exist or cannot receive mail.")
+        elif data.get("disposable", False):
+            result = (False, "Disposable/temporary email addresses are not allowed.")
+        else:
+            result = (True, "Email is valid.")
+        self.addresses.set(email.lower(), result)
+        return result
@@ -0,0 +1,175 @@
+"""Streaming export of reports and SOS alerts.
+
+Rows are read with ``yield_per`` (a server-side cursor on Postgres) as plain
+column tuples and encoded one batch at a time, so memory use does not grow
+with table size. Used by bulk_export.py and by the admin export endpoint.
+
+CSV and NDJSON need nothing extra; Parquet requires pyarrow to be installed.
+"""
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from models.user import db, Report, SOSAlert
+
+
+DATASETS = {
+    "reports": (Report, Report.timestamp, [
+        Report.id, Report.username, Report.lat, Report.lng,
+        Report.category, Report.description, Report.timestamp,
+    ]),
+    "sos_alerts": (SOSAlert, SOSAlert.created_at, [
+        SOSAlert.id, SOSAlert.user_id, SOSAlert.username, SOSAlert.lat, SOSAlert.lng,
+        SOSAlert.accuracy, SOSAlert.status, SOSAlert.created_at,
+    ]),
+}
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_bbox(value):
+    """'min_lng,min_lat,max_lng,max_lat' -> tuple of floats, or None."""
+    if not value:
+        return None
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in value.split(","))
+    except ValueError:
+        raise ExportError("bbox must be min_lng,min_lat,max_lng,max_lat")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def build_query(dataset, start=None, end=None, bbox=None):
+    if dataset not in DATASETS:
+        raise ExportError(f"Unknown dataset '{dataset}'")
+    model, time_col, columns = DATASETS[dataset]
+
+    # Time columns hold 'YYYY-MM-DD HH:MM' strings, which compare correctly as text
+    query = select(*columns).order_by(model.id)
+    if start:
+        query = query.where(time_col >= start)
+    if end:
+        query = query.where(time_col < end)
+    if bbox:
+        min_lng, min_lat, max_lng, max_lat = bbox
+        query = query.where(
+            model.lat.between(min_lat, max_lat),
+            model.lng.between(min_lng, max_lng),
+        )
+    return query, [c.key for c in columns]
+
+
+def iter_batches(dataset, start=None, end=None, bbox=None, batch_size=5000):
+    """(column_names, rows) batches read through a streaming cursor.
+
+    The statement runs now, in the view, so it is counted with the request.
+    """
+    query, names = build_query(dataset, start, end, bbox)
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    return _batches(result, names)
+
+
+def _batches(result, names):
+    try:
+        for rows in result.partitions():
+            yield names, rows
+    finally:
+        result.close()
+
+
+def _csv_chunks(batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    header_written = False
+    for names, rows in batches:
+        if not header_written:
+            writer.writerow(names)
+            header_written = True
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+
+def _ndjson_chunks(batches):
+    for names, rows in batches:
+        yield "".join(json.dumps(dict(zip(names, row))) + "\n" for row in rows)
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever pyarrow wrote so far."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _parquet_chunks(batches):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    sink = _ChunkSink()
+    writer = None
+    try:
+        for names, rows in batches:
+            table = pa.Table.from_pydict({name: [row[i] for row in rows] for i, name in enumerate(names)})
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema, compression="snappy")
+            writer.write_table(table)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.drain()
+
+
+def stream_export(dataset, fmt="csv", start=None, end=None, bbox=None, batch_size=5000):
+    """Return a generator of encoded chunks (str for CSV/NDJSON, bytes for Parquet)."""
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format '{fmt}'")
+    build_query(dataset, start, end, bbox)  # validate before the first chunk is sent
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    batches = iter_batches(dataset, start, end, bbox, batch_size)
+    if fmt == "csv":
+        return _csv_chunks(batches)
+    if fmt == "ndjson":
+        return _ndjson_chunks(batches)
+    return _parquet_chunks(batches)
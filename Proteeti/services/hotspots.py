@@ -0,0 +1,242 @@
+"""Hotspot detection: density clustering of reports and SOS alerts.
+
+Run only by ``python detect_hotspots.py`` from cron, never inside a web
+request; the admin endpoint only reads the precomputed ``hotspots`` table and
+the latest ``hotspot_runs`` row.
+
+Clustering is DBSCAN over the points of the last ``HOTSPOT_WINDOW_DAYS``: a
+point with at least ``HOTSPOT_MIN_POINTS`` points (itself included) within
+``HOTSPOT_EPS_M`` metres is a core point, and core points within reach of
+each other form a hotspot together with their neighbours. Neighbours are
+found through a grid of ``eps``-sized cells, so each lookup scans 3 x 3
+cells instead of every point.
+
+Runs are incremental. The latest ``hotspot_runs`` row holds the highest
+report and SOS ids already processed; the next run loads only newer points,
+marks the cells around them dirty and re-clusters just that region. The
+region first grows to cover every stored hotspot it touches, and again
+whenever a cluster reaches its edge, so a hotspot is always rebuilt whole.
+Hotspots elsewhere are left alone. Because trends depend on the clock and
+points age out of the window, a full run happens at least every
+``HOTSPOT_FULL_EVERY_HOURS`` (it also picks up deleted rows and ids committed
+out of order).
+"""
+import logging
+import math
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, literal, select
+
+from config.cities import DEFAULT_CENTER
+from models.user import db, Hotspot, HotspotRun, Report, SOSAlert, bd_now
+
+
+log = logging.getLogger(__name__)
+
+
+METRES_PER_DEGREE = 111320.0
+
+
+def bd_ago(days=0, hours=0):
+    """'YYYY-MM-DD HH:MM' (Bangladesh time) for a moment in the past, comparable with stored timestamps."""
+    moment = datetime.now(timezone.utc) + timedelta(hours=6) - timedelta(days=days, hours=hours)
+    return moment.strftime("%Y-%m-%d %H:%M")
+
+
+class HotspotDetector:
+    def __init__(self, eps_m=150, min_points=5, window_days=180, trend_days=14, full_every_hours=24):
+        self.eps_m = eps_m
+        self.min_points = min_points
+        self.window_days = window_days
+        self.trend_days = trend_days
+        self.full_every_hours = full_every_hours
+        # Cells are eps x eps metres at the coverage area's latitude
+        self.cell_lat = eps_m / METRES_PER_DEGREE
+        self.cell_lng = eps_m / (METRES_PER_DEGREE * math.cos(math.radians(DEFAULT_CENTER[0])))
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            eps_m=config.get("HOTSPOT_EPS_M", 150),
+            min_points=config.get("HOTSPOT_MIN_POINTS", 5),
+            window_days=config.get("HOTSPOT_WINDOW_DAYS", 180),
+            trend_days=config.get("HOTSPOT_TREND_DAYS", 14),
+            full_every_hours=config.get("HOTSPOT_FULL_EVERY_HOURS", 24),
+        )
+
+    def cell(self, lat, lng):
+        return (math.floor(lat / self.cell_lat), math.floor(lng / self.cell_lng))
+
+    @staticmethod
+    def around(cells):
+        return {(i + di, j + dj) for i, j in cells for di in (-1, 0, 1) for dj in (-1, 0, 1)}
+
+    @staticmethod
+    def distance_m(lat1, lng1, lat2, lng2):
+        dy = (lat2 - lat1) * METRES_PER_DEGREE
+        dx = (lng2 - lng1) * METRES_PER_DEGREE * math.cos(math.radians((lat1 + lat2) / 2))
+        return math.hypot(dx, dy)
+
+    # ----- loading -----
+    def load_points(self, max_ids, min_ids=(0, 0), bbox=None):
+        """[(kind, lat, lng, category, timestamp)] of reports and SOS alerts in the window."""
+        cutoff = bd_ago(days=self.window_days)
+        sources = (
+            (Report, Report.timestamp, Report.category, "report"),
+            (SOSAlert, SOSAlert.created_at, literal("SOS"), "sos"),
+        )
+        points = []
+        for (model, time_col, category, kind), min_id, max_id in zip(sources, min_ids, max_ids):
+            query = select(model.lat, model.lng, category, time_col).where(
+                model.id > min_id, model.id <= max_id, time_col >= cutoff)
+            if bbox is not None:
+                min_lat, min_lng, max_lat, max_lng = bbox
+                query = query.where(model.lat.between(min_lat, max_lat), model.lng.between(min_lng, max_lng))
+            points.extend((kind,) + tuple(row) for row in db.session.execute(query))
+        return points
+
+    def points_in_cells(self, max_ids, cells):
+        i0, i1 = min(i for i, _ in cells), max(i for i, _ in cells)
+        j0, j1 = min(j for _, j in cells), max(j for _, j in cells)
+        bbox = (i0 * self.cell_lat, j0 * self.cell_lng, (i1 + 1) * self.cell_lat, (j1 + 1) * self.cell_lng)
+        return [p for p in self.load_points(max_ids, bbox=bbox) if self.cell(p[1], p[2]) in cells]
+
+    # ----- clustering -----
+    def dbscan(self, points):
+        """Lists of point indexes, one per cluster; noise is dropped."""
+        grid = defaultdict(list)
+        for index, point in enumerate(points):
+            grid[self.cell(point[1], point[2])].append(index)
+
+        def neighbours(index):
+            lat, lng = points[index][1], points[index][2]
+            ci, cj = self.cell(lat, lng)
+            found = []
+            for di in (-1, 0, 1):
+                for dj in (-1, 0, 1):
+                    for other in grid.get((ci + di, cj + dj), ()):
+                        if self.distance_m(lat, lng, points[other][1], points[other][2]) <= self.eps_m:
+                            found.append(other)
+            return found
+
+        labels = [None] * len(points)   # None unvisited, -1 noise, else cluster number
+        clusters = []
+        for index in range(len(points)):
+            if labels[index] is not None:
+                continue
+            seeds = neighbours(index)
+            if len(seeds) < self.min_points:
+                labels[index] = -1
+                continue
+            cluster = len(clusters)
+            members = [index]
+            labels[index] = cluster
+            queue = list(seeds)
+            while queue:
+                other = queue.pop()
+                if labels[other] == -1:
+                    labels[other] = cluster          # border point
+                    members.append(other)
+                if labels[other] is not None:
+                    continue
+                labels[other] = cluster
+                members.append(other)
+                reach = neighbours(other)
+                if len(reach) >= self.min_points:
+                    queue.extend(reach)
+            clusters.append(members)
+        return clusters
+
+    def summarize(self, points, members):
+        lat = sum(points[i][1] for i in members) / len(members)
+        lng = sum(points[i][2] for i in members) / len(members)
+        recent_since = bd_ago(days=self.trend_days)
+        previous_since = bd_ago(days=2 * self.trend_days)
+        recent = sum(1 for i in members if (points[i][4] or "") >= recent_since)
+        previous = sum(1 for i in members if previous_since <= (points[i][4] or "") < recent_since)
+        if recent > previous * 1.25 and recent - previous >= 2:
+            trend = "rising"
+        elif recent < previous * 0.8 and previous - recent >= 2:
+            trend = "falling"
+        else:
+            trend = "stable"
+        categories = Counter(points[i][3] for i in members if points[i][0] == "report")
+        timestamps = sorted(points[i][4] for i in members if points[i][4])
+        return Hotspot(
+            centroid_lat=lat,
+            centroid_lng=lng,
+            radius_m=round(max(self.distance_m(lat, lng, points[i][1], points[i][2]) for i in members), 1),
+            report_count=sum(1 for i in members if points[i][0] == "report"),
+            sos_count=sum(1 for i in members if points[i][0] == "sos"),
+            recent_count=recent,
+            previous_count=previous,
+            trend=trend,
+            top_category=categories.most_common(1)[0][0] if categories else None,
+            first_seen=timestamps[0] if timestamps else None,
+            last_seen=timestamps[-1] if timestamps else None,
+            cells=sorted({self.cell(points[i][1], points[i][2]) for i in members}),
+        )
+
+    # ----- runs -----
+    def run(self, full=False):
+        """Update the hotspots table; returns the HotspotRun row."""
+        started = time.perf_counter()
+        last = db.session.execute(select(HotspotRun).order_by(HotspotRun.id.desc()).limit(1)).scalar()
+        last_full = db.session.execute(
+            select(func.max(HotspotRun.started_at)).where(HotspotRun.full.is_(True))).scalar()
+        full = full or last is None or not last_full or last_full < bd_ago(hours=self.full_every_hours)
+
+        # Everything up to these ids is covered by this run, even if more arrive meanwhile
+        max_ids = (db.session.execute(select(func.max(Report.id))).scalar() or 0,
+                   db.session.execute(select(func.max(SOSAlert.id))).scalar() or 0)
+        run = HotspotRun(full=full, last_report_id=max_ids[0], last_sos_id=max_ids[1], started_at=bd_now())
+
+        if full:
+            points = self.load_points(max_ids)
+            run.new_points = run.points_clustered = len(points)
+            db.session.execute(delete(Hotspot))
+            written = [self.summarize(points, members) for members in self.dbscan(points)]
+        else:
+            new = self.load_points(max_ids, min_ids=(last.last_report_id, last.last_sos_id))
+            run.new_points = len(new)
+            written = []
+            if new:
+                stored = db.session.execute(select(Hotspot.id, Hotspot.cells)).all()
+                stored_cells = [(row.id, {tuple(c) for c in row.cells or ()}) for row in stored]
+                region = self.around({self.cell(p[1], p[2]) for p in new})
+                replaced = set()
+                while True:
+                    # Take in every stored hotspot the region touches, with its surroundings
+                    grown = True
+                    while grown:
+                        grown = False
+                        for hotspot_id, cells in stored_cells:
+                            if hotspot_id not in replaced and cells & region:
+                                replaced.add(hotspot_id)
+                                region |= self.around(cells)
+                                grown = True
+                    points = self.points_in_cells(max_ids, region)
+                    clusters = self.dbscan(points)
+                    # A cluster reaching the region's edge may continue outside it
+                    edge = set()
+                    for members in clusters:
+                        edge |= self.around({self.cell(points[i][1], points[i][2]) for i in members}) - region
+                    if not edge:
+                        break
+                    region |= edge
+                run.points_clustered = len(points)
+                if replaced:
+                    db.session.execute(delete(Hotspot).where(Hotspot.id.in_(replaced)),
+                                       execution_options={"synchronize_session": "fetch"})
+                written = [self.summarize(points, members) for members in clusters]
+
+        db.session.add_all(written)
+        run.hotspots_written = len(written)
+        run.duration_ms = int((time.perf_counter() - started) * 1000)
+        db.session.add(run)
+        db.session.commit()
+        log.info(f"Hotspot run ({'full' if full else 'incremental'}): {run.new_points} new points, "
+                 f"{run.points_clustered} clustered, {run.hotspots_written} hotspots written in {run.duration_ms} ms")
+        return run
@@ -0,0 +1,172 @@
+"""Conditional GETs and response caching for the public read endpoints.
+
+Every write that changes what a cached endpoint returns bumps a counter in
+the data_versions table (``bump_data_version``). A cached view's ETag is
+derived from the versions it depends on, so validating a request costs one
+small read of that table, and even that read is skipped while the versions
+sit in a short per-worker cache (``HTTP_CACHE_VERSION_TTL``, default 1 s). A
+matching ``If-None-Match`` gets a 304 without running the view.
+``If-Modified-Since`` is not honoured: it has one-second resolution, so two
+writes in the same second would leave a stale copy looking fresh. Other
+requests are answered from an LRU of serialized bodies keyed by the same
+versions, so stale entries are never served and simply age out. Streamed
+bodies are passed through and cached once complete (up to
+``HTTP_CACHE_MAX_BODY`` bytes).
+
+Views that depend on the logged-in user (the map and resources pages centre
+on the user's city) are cached per username, marked private and vary on the
+cookie.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request, session
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from werkzeug.wrappers import Response
+
+from models.user import db, DataVersion
+from services.cache import TTLCache
+from services.compression import ETAG_SUFFIXES
+
+
+DATASETS = ("reports", "sos_alerts", "profiles", "resources")
+
+
+def bump_data_version(*names, conn=None):
+    """Record a change to the named datasets. Call after the write has committed."""
+    now = int(time.time())
+
+    def _bump(conn):
+        dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(conn.dialect.name)
+        for name in names:
+            if dialect is not None:
+                # One statement, so two workers creating the row at once cannot collide
+                conn.execute(dialect.insert(DataVersion).values(name=name, version=1, updated_at=now)
+                             .on_conflict_do_update(index_elements=[DataVersion.name],
+                                                    set_={"version": DataVersion.version + 1, "updated_at": now}))
+                continue
+            bump = update(DataVersion).where(DataVersion.name == name).values(
+                version=DataVersion.version + 1, updated_at=now)
+            if not conn.execute(bump).rowcount:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(DataVersion).values(name=name, version=1, updated_at=now))
+                except IntegrityError:
+                    conn.execute(bump)   # another worker inserted it first
+
+    if conn is not None:
+        _bump(conn)
+    else:
+        with db.engine.begin() as conn:
+            _bump(conn)
+    for name in names:
+        http_cache.versions.pop(name)
+
+
+class HTTPCache:
+    def __init__(self, app=None):
+        self.enabled = True
+        self.versions = TTLCache(maxsize=64, ttl=1.0)      # name -> (version, updated_at)
+        self.responses = TTLCache(maxsize=256)             # key -> (body, mimetype)
+        self.max_body = 8 * 1024 * 1024
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("HTTP_CACHE_ENABLED", True)
+        self.versions = TTLCache(maxsize=64, ttl=app.config.get("HTTP_CACHE_VERSION_TTL", 1.0))
+        self.responses = TTLCache(maxsize=app.config.get("HTTP_CACHE_SIZE", 256))
+        self.max_body = app.config.get("HTTP_CACHE_MAX_BODY", 8 * 1024 * 1024)
+        app.extensions["http_cache"] = self
+        with app.app_context():
+            try:
+                self.current_versions(DATASETS)
+            except SQLAlchemyError:
+                pass   # data_versions not migrated yet; rows are created on first use
+
+    def current_versions(self, names):
+        """[(version, updated_at)] for `names`, reading the table only for names not cached locally."""
+        found = {name: self.versions.get(name) for name in names}
+        missing = [name for name, value in found.items() if value is None]
+        if missing:
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    select(DataVersion.name, DataVersion.version, DataVersion.updated_at)
+                    .where(DataVersion.name.in_(missing))
+                ).all()
+            loaded = {row.name: (row.version, row.updated_at) for row in rows}
+            for name in missing:
+                if name not in loaded:
+                    # Tables made by create_all() have no seed rows; start the counter now
+                    bump_data_version(name)
+                    loaded[name] = (1, int(time.time()))
+                found[name] = loaded[name]
+                self.versions.set(name, found[name])
+        return [found[name] for name in names]
+
+    def cached(self, *names, per_user=False):
+        """Serve the view through the cache; `names` are the datasets its output depends on."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+
+                versions = self.current_versions(names)
+                variant = session.get("username") if per_user else None
+                key = (request.endpoint, variant, request.query_string, tuple(v for v, _ in versions))
+                etag = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:24]
+                last_modified = datetime.fromtimestamp(max((u for _, u in versions), default=0), timezone.utc)
+
+                # Compressed representations carry "<etag>-br" / "<etag>-gzip"
+                not_modified = any(request.if_none_match.contains(etag + suffix)
+                                   for suffix in ("",) + ETAG_SUFFIXES)
+
+                if not_modified:
+                    response = Response(status=304)
+                else:
+                    entry = self.responses.get(key)
+                    if entry is not None:
+                        response = Response(entry[0], mimetype=entry[1])
+                    else:
+                        response = make_response(view(*args, **kwargs))
+                        if response.status_code != 200:
+                            return response
+                        if response.is_streamed:
+                            response.response = self._record(key, response.response, response.mimetype)
+                        else:
+                            self.responses.set(key, (response.get_data(), response.mimetype))
+
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                if per_user:
+                    response.headers["Cache-Control"] = "private, no-cache"
+                    response.vary.add("Cookie")
+                else:
+                    response.headers["Cache-Control"] = "no-cache"
+                return response
+            return wrapper
+        return decorator
+
+    def _record(self, key, chunks, mimetype):
+        """Pass a streamed body through, caching it once it has been sent in full."""
+        parts, size = [], 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if parts is not None:
+                size += len(chunk)
+                if size > self.max_body:
+                    parts = None
+                else:
+                    parts.append(chunk)
+            yield chunk
+        if parts is not None:
+            self.responses.set(key, (b"".join(parts), mimetype))
+
+
+http_cache = HTTPCache()
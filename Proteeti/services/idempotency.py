@@ -0,0 +1,103 @@
+"""Idempotent replay for POSTs that the offline queue may send more than once.
+
+The service worker tags every queued ``/send_sos`` and ``/submit_report``
+with an ``Idempotency-Key`` header and may replay it several times (the
+first attempt can reach the server even though the phone never saw the
+response). The first request with a key claims it and runs normally; its
+status and body are stored, and later requests with the same key get that
+stored response back (marked ``Idempotent-Replayed: true``) instead of a
+second alert or report. A request arriving while the first is still running
+gets a 409 and is retried by the queue.
+
+Keys are scoped by user and endpoint and kept for ``IDEMPOTENCY_TTL``
+seconds. Requests without the header are not affected.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from flask import make_response, request, session
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.wrappers import Response
+
+from models.user import db, IdempotencyKey
+
+
+HEADER = "Idempotency-Key"
+
+
+class IdempotencyStore:
+    def __init__(self, ttl=86400, pending_timeout=60, purge_interval=600):
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout  # a claim older than this is treated as abandoned
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+
+    def init_app(self, app):
+        self.ttl = app.config.get("IDEMPOTENCY_TTL", self.ttl)
+        app.extensions["idempotency"] = self
+
+    def claim(self, key):
+        """Returns None when the key is ours to run, otherwise the stored row."""
+        now = int(time.time())
+        with db.engine.begin() as conn:
+            if now - self._last_purge > self.purge_interval:
+                self._last_purge = now
+                conn.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < now - self.ttl))
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(IdempotencyKey).values(id=key, created_at=now))
+                return None
+            except IntegrityError:
+                pass
+            row = conn.execute(select(IdempotencyKey).where(IdempotencyKey.id == key)).first()
+            if row is not None and row.status_code is None and now - row.created_at > self.pending_timeout:
+                conn.execute(update(IdempotencyKey).where(IdempotencyKey.id == key).values(created_at=now))
+                return None
+            return row
+
+    def complete(self, key, status_code, body):
+        with db.engine.begin() as conn:
+            conn.execute(update(IdempotencyKey).where(IdempotencyKey.id == key).values(
+                status_code=status_code, body=body
+            ))
+
+    def release(self, key):
+        with db.engine.begin() as conn:
+            conn.execute(delete(IdempotencyKey).where(IdempotencyKey.id == key))
+
+
+idempotency_store = IdempotencyStore()
+
+
+def idempotent(view):
+    """Honour an Idempotency-Key header on a JSON POST view."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        client_key = request.headers.get(HEADER, "").strip()
+        if not client_key or len(client_key) > 128:
+            return view(*args, **kwargs)
+
+        owner = session.get("username") or request.remote_addr or ""
+        key = hashlib.sha256(f"{owner}:{request.endpoint}:{client_key}".encode("utf-8")).hexdigest()
+        stored = idempotency_store.claim(key)
+        if stored is not None:
+            if stored.status_code is None:
+                return Response('{"error": "This request is already being processed"}', status=409,
+                                mimetype="application/json")
+            return Response(stored.body, status=stored.status_code, mimetype="application/json",
+                            headers={"Idempotent-Replayed": "true"})
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            idempotency_store.release(key)
+            raise
+        if response.status_code >= 500 or response.status_code in (401, 429):
+            # Not a final answer; let the retry run the view again
+            idempotency_store.release(key)
+        else:
+            idempotency_store.complete(key, response.status_code, response.get_data(as_text=True))
+        return response
+    return wrapper
@@ -0,0 +1,262 @@
+"""Request, database and outbound-call instrumentation.
+
+Collects per-route latency histograms, per-request SQL query counts and
+durations (through SQLAlchemy engine events) and timings for slow external
+work such as SMTP and bcrypt, and renders them in the Prometheus text format
+for the ``/metrics`` endpoint. Each request also gets a ``Server-Timing``
+header so a slow response can be attributed to the database or to app code
+straight from the browser dev tools.
+
+Metrics are kept per process; with several gunicorn workers each one reports
+its own numbers.
+
+An optional sampling profiler runs cProfile on a fraction of requests and
+writes the stats to ``PROFILER_DIR`` for offline inspection.
+"""
+import cProfile
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(names, key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "proteeti_request_duration_seconds", "HTTP request latency by route",
+    labels=("method", "route", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "proteeti_request_db_queries", "SQL statements executed per request",
+    labels=("route",), buckets=(1, 2, 5, 10, 20, 50, 100, 250),
+)
+REQUEST_DB_TIME = Histogram(
+    "proteeti_request_db_seconds", "Time spent in SQL per request",
+    labels=("route",),
+)
+DB_QUERY_LATENCY = Histogram(
+    "proteeti_db_query_duration_seconds", "Latency of individual SQL statements",
+    labels=("operation",),
+)
+EXTERNAL_LATENCY = Histogram(
+    "proteeti_external_duration_seconds", "Latency of outbound and CPU-heavy operations",
+    labels=("operation",), buckets=DEFAULT_BUCKETS + (20.0, 30.0),
+)
+EXTERNAL_ERRORS = Counter(
+    "proteeti_external_errors_total", "Failed outbound and CPU-heavy operations",
+    labels=("operation",),
+)
+RATE_LIMITED = Counter(
+    "proteeti_rate_limited_total", "Requests rejected by the rate limiter",
+    labels=("endpoint", "scope"),
+)
+MAIL_MESSAGES = Counter(
+    "proteeti_mail_messages_total", "Outbound emails by lane and outcome (sent, retried, failed, rejected)",
+    labels=("lane", "outcome"),
+)
+
+REGISTRY = [
+    REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, DB_QUERY_LATENCY, EXTERNAL_LATENCY, EXTERNAL_ERRORS,
+    RATE_LIMITED, MAIL_MESSAGES,
+]
+
+
+@contextmanager
+def timed(operation):
+    """Time a block (e.g. 'smtp_connect', 'smtp_send', 'bcrypt') into the external histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_ERRORS.inc(operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        EXTERNAL_LATENCY.observe(elapsed, operation)
+        if has_request_context():
+            timings = g.setdefault("external_timings", {})
+            timings[operation] = timings.get(operation, 0.0) + elapsed
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ======= SQL instrumentation =======
+# Statement logs of active assert_max_queries() blocks (services/query_audit.py)
+STATEMENT_RECORDERS = []
+
+
+# The one pair of listeners timing every statement. Per request it counts into
+# g.db_queries / g.db_time and, while the query auditor is on, g.query_log.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    operation = statement.lstrip().split(" ", 1)[0].upper() or "OTHER"
+    DB_QUERY_LATENCY.observe(elapsed, operation)
+    for log in STATEMENT_RECORDERS:
+        log.append((statement, elapsed))
+    if has_request_context():
+        g.db_queries = g.get("db_queries", 0) + 1
+        g.db_time = g.get("db_time", 0.0) + elapsed
+        log = g.get("query_log")
+        if log is not None:
+            log.append((statement, elapsed))
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+# ======= Flask integration =======
+class Instrumentation:
+    def __init__(self, app=None):
+        self.profiler_enabled = False
+        self.profiler_sample_rate = 0.0
+        self.profiler_dir = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.profiler_enabled = app.config.get("PROFILER_ENABLED", False)
+        self.profiler_sample_rate = app.config.get("PROFILER_SAMPLE_RATE", 0.01)
+        self.profiler_dir = app.config.get("PROFILER_DIR", os.path.join(app.instance_path, "profiles"))
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions["instrumentation"] = self
+
+    def set_profiler(self, enabled, sample_rate=None):
+        self.profiler_enabled = bool(enabled)
+        if sample_rate is not None:
+            self.profiler_sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+
+    def _route(self):
+        rule = request.url_rule
+        return rule.rule if rule is not None else "<unmatched>"
+
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+        if self.profiler_enabled and random.random() < self.profiler_sample_rate:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def _after_request(self, response):
+        started = g.get("request_started")
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = self._route()
+        REQUEST_LATENCY.observe(elapsed, request.method, route, response.status_code)
+        REQUEST_QUERIES.observe(g.get("db_queries", 0), route)
+        REQUEST_DB_TIME.observe(g.get("db_time", 0.0), route)
+
+        parts = [
+            f'db;dur={g.get("db_time", 0.0) * 1000:.1f};desc="{g.get("db_queries", 0)} queries"',
+        ]
+        for operation, spent in g.get("external_timings", {}).items():
+            parts.append(f"{operation};dur={spent * 1000:.1f}")
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+        return response
+
+    def _teardown_request(self, exc):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return
+        profiler.disable()
+        try:
+            os.makedirs(self.profiler_dir, exist_ok=True)
+            name = self._route().strip("/").replace("/", "_").replace("<", "").replace(">", "") or "index"
+            profiler.dump_stats(os.path.join(self.profiler_dir, f"{name}-{int(time.time() * 1000)}.prof"))
+        except OSError:
+            pass
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,167 @@
+"""Prioritized outbound mail.
+
+Email goes out through two lanes, highest priority first:
+
+    sos            SOS alerts, audio, escalation reminders and admin flags
+    transactional  verification codes and other mail a user is waiting for
+
+Nothing is queued. ``deliver()`` sends in the request (or escalation thread)
+that produced the mail and returns how many messages were delivered, so the
+caller can say whether anyone was reached, and a frozen or recycled
+serverless function has nothing in memory to lose. Each call gets its own
+short-lived pool of up to the lane's ``workers`` threads, so one alert
+whose contacts keep failing only delays its own request, never another
+user's.
+
+Each lane has a policy such as ``"workers:2, rate:30/60, retries:1"``: at
+most 2 messages of one call sent in parallel, a token bucket of 30 messages
+refilled at 30 per 60 seconds, and one retry of a failed send after 1 s
+(then 2, 4... s).
+
+All lanes share ``MAIL_RATE``, the provider's quota (Gmail allows only so
+many messages a minute per account). SOS mail never waits for it: it takes
+its tokens even when that leaves the bucket in debt. Other lanes need a token
+from their own bucket and must leave ``MAIL_SOS_RESERVE`` tokens in the
+shared one, so an SOS burst normally finds the quota free. When they cannot,
+``deliver()`` raises ``MailRateLimited`` and sends nothing. The buckets are
+per process, so with several gunicorn workers size ``MAIL_RATE`` per worker.
+"""
+import logging
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services.metrics import MAIL_MESSAGES
+
+
+LANES = ("sos", "transactional")   # highest priority first
+CRITICAL = "sos"
+POLICY_KEYS = ("workers", "rate", "retries")
+
+log = logging.getLogger(__name__)
+
+
+class MailRateLimited(ValueError):
+    pass
+
+
+class Bucket:
+    """`capacity` tokens, refilled at `capacity` per `period` seconds."""
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+def parse_rate(spec):
+    """'30/60' -> (30, 60.0)"""
+    try:
+        count, period = spec.split("/", 1)
+        count, period = int(count), float(period)
+    except ValueError:
+        raise ValueError(f"Invalid mail rate {spec!r}, expected count/seconds")
+    if count < 1 or period <= 0:
+        raise ValueError(f"Invalid mail rate {spec!r}")
+    return count, period
+
+
+def parse_lane(spec):
+    """Parse ``"workers:2, rate:30/60, retries:1"`` into a dict."""
+    policy = {"workers": 1, "rate": None, "retries": 0}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        key, _, value = part.partition(":")
+        key = key.strip()
+        if key not in POLICY_KEYS:
+            raise ValueError(f"Unknown mail lane setting {key!r}, expected one of {POLICY_KEYS}")
+        try:
+            policy[key] = parse_rate(value.strip()) if key == "rate" else int(value)
+        except ValueError:
+            raise ValueError(f"Invalid mail lane setting {part!r}")
+    if policy["workers"] < 1 or policy["retries"] < 0:
+        raise ValueError(f"Invalid mail lane {spec!r}")
+    return policy
+
+
+class Lane:
+    def __init__(self, name, workers=1, rate=None, retries=0):
+        self.name = name
+        self.workers = workers
+        self.bucket = Bucket(*rate) if rate else None
+        self.retries = retries
+
+
+class OutboundMail:
+    def __init__(self):
+        self.transport = None
+        self.lanes = {}
+        self.shared = None
+        self.sos_reserve = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app, transport):
+        """`transport(message)` delivers one message and raises on failure."""
+        self.transport = transport
+        policies = app.config.get("MAIL_LANES", {})
+        self.lanes = {name: Lane(name, **parse_lane(policies.get(name, ""))) for name in LANES}
+        self.shared = Bucket(*parse_rate(app.config.get("MAIL_RATE", "60/60")))
+        self.sos_reserve = app.config.get("MAIL_SOS_RESERVE", 10)
+        if not 0 <= self.sos_reserve < self.shared.capacity:
+            raise ValueError("MAIL_SOS_RESERVE must be less than the MAIL_RATE count")
+        app.extensions["outbound_mail"] = self
+
+    def deliver(self, messages, lane=CRITICAL):
+        """Send `messages` now, retrying failures; returns how many were delivered.
+        Raises MailRateLimited when a non-SOS lane is out of quota."""
+        target = self.lanes[lane]
+        if not messages:
+            return 0
+        self._take(target, len(messages))
+        if len(messages) == 1 or target.workers == 1:
+            return sum(self._send(target, message) for message in messages)
+        # A pool per call: retries and backoff of one alert never hold up another's sends
+        with ThreadPoolExecutor(max_workers=min(target.workers, len(messages)),
+                                thread_name_prefix=f"mail-{lane}") as pool:
+            return sum(pool.map(lambda message: self._send(target, message), messages))
+
+    def _take(self, lane, count):
+        with self._lock:
+            now = time.monotonic()
+            self.shared.refill(now)
+            if lane.name != CRITICAL:
+                if lane.bucket is not None:
+                    lane.bucket.refill(now)
+                if self.shared.tokens < count + self.sos_reserve or (
+                        lane.bucket is not None and lane.bucket.tokens < count):
+                    MAIL_MESSAGES.inc(lane.name, "rejected", amount=count)
+                    raise MailRateLimited(f"The {lane.name} mail quota is used up, try again shortly")
+                if lane.bucket is not None:
+                    lane.bucket.tokens -= count
+            self.shared.tokens -= count     # SOS may leave it in debt; other lanes then wait for the refill
+
+    def _send(self, lane, message):
+        for attempt in range(lane.retries + 1):
+            if attempt:
+                time.sleep(2 ** (attempt - 1))
+            try:
+                self.transport(message)
+            except Exception as e:
+                retry = attempt < lane.retries
+                MAIL_MESSAGES.inc(lane.name, "retried" if retry else "failed")
+                log.warning(f"Mail ({lane.name}) to {message['To']} failed{', retrying' if retry else ''}: {e}")
+                continue
+            MAIL_MESSAGES.inc(lane.name, "sent")
+            log.info(f"Mail ({lane.name}) sent to {message['To']}")
+            return True
+        return False
+
+
+outbound_mail = OutboundMail()
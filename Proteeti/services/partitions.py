@@ -0,0 +1,293 @@
+"""Monthly partitions of reports and SOS alerts, and archival of old months.
+
+On PostgreSQL, migration c3f8a1d6e592 turns ``reports`` and ``sos_alerts`` into
+tables range-partitioned by month on their time column (``reports.timestamp``,
+``sos_alerts.created_at``). For example, ``reports_p2026_10`` holds
+['2026-10-01 00:00', '2026-11-01 00:00'). A ``<table>_default`` partition
+catches anything outside the months that exist. A query with a time range on
+that column only reads the matching partitions, so a "last 30 days" query
+reads one or two months whatever the table's age.
+
+``ensure_partitions()`` creates the partitions for this month and the next
+``PARTITION_MONTHS_AHEAD``. It runs at startup and from
+``manage_partitions.py`` (cron), so new rows do not pile up in the default
+partition. If rows for a month are already there, they are moved into the
+new partition as it is attached.
+
+``archive()`` takes months older than ``ARCHIVE_AFTER_MONTHS`` out of the
+live tables. With ``to="table"``, the partition is detached from the live
+table and attached to ``<table>_archive`` without copying any rows. With
+``to="parquet"``, the month is written to
+``ARCHIVE_DIR/<table>/<YYYY-MM>.parquet`` (pyarrow required) and dropped.
+
+A partitioned table's primary key is (id, <time column>), so nothing can
+hold a foreign key to its id, and the models declare none. What those keys
+did is done here instead, whenever rows leave a live table: submissions of
+an archived report get ``report_id`` NULL (was ON DELETE SET NULL), and the
+track points of an archived SOS alert are deleted (was ON DELETE CASCADE).
+
+Tables that are not partitioned are archived by moving rows month by month,
+with the same result. That covers SQLite, which has no partitioning, and a
+Postgres database created by ``db.create_all()`` instead of the migrations.
+"""
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.user import db
+from services.http_cache import bump_data_version
+
+
+log = logging.getLogger(__name__)
+
+
+# Live table -> partition key (a 'YYYY-MM-DD HH:MM' text column)
+TABLES = {
+    "reports": "timestamp",
+    "sos_alerts": "created_at",
+}
+
+
+class PartitionError(ValueError):
+    pass
+
+
+def bd_today():
+    return (datetime.now(timezone.utc) + timedelta(hours=6)).date()
+
+
+def add_months(month, n):
+    years, index = divmod(month.month - 1 + n, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def bound(month):
+    """Lower bound of a month as stored in the time columns."""
+    return month.strftime("%Y-%m-01 00:00")
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+class PartitionManager:
+    def __init__(self, months_ahead=3, archive_after_months=12, archive_to="table", archive_dir="archive"):
+        self.months_ahead = months_ahead
+        self.archive_after_months = archive_after_months
+        self.archive_to = archive_to
+        self.archive_dir = archive_dir
+
+    def init_app(self, app):
+        self.months_ahead = app.config.get("PARTITION_MONTHS_AHEAD", self.months_ahead)
+        self.archive_after_months = app.config.get("ARCHIVE_AFTER_MONTHS", self.archive_after_months)
+        self.archive_to = app.config.get("ARCHIVE_TO", self.archive_to)
+        self.archive_dir = app.config.get("ARCHIVE_DIR", self.archive_dir)
+        app.extensions["partitions"] = self
+        with app.app_context():
+            try:
+                self.ensure_partitions()
+            except SQLAlchemyError as e:
+                log.warning(f"Could not create upcoming partitions: {e}")
+
+    # ----- catalog -----
+    @staticmethod
+    def is_partitioned(conn, table):
+        if conn.dialect.name != "postgresql":
+            return False
+        return conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+        ), {"table": table}).first() is not None
+
+    @staticmethod
+    def month_partitions(conn, table):
+        """{partition name: (lower, upper)} of the month partitions attached to `table`."""
+        rows = conn.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table AND pg_table_is_visible(p.oid)"
+        ), {"table": table}).all()
+        partitions = {}
+        for name, spec in rows:
+            match = re.search(r"FROM \('([^']*)'\) TO \('([^']*)'\)", spec or "")
+            if match:
+                partitions[name] = (match.group(1), match.group(2))
+        return partitions
+
+    @staticmethod
+    def copy_columns(conn, source, target):
+        """Quoted column list present in both tables, generated columns left out."""
+        if conn.dialect.name == "postgresql":
+            query = ("SELECT column_name FROM information_schema.columns WHERE table_name = :table "
+                     "AND table_schema = current_schema() AND is_generated = 'NEVER' ORDER BY ordinal_position")
+            names = lambda table: conn.execute(text(query), {"table": table}).scalars().all()
+        else:
+            names = lambda table: [row[1] for row in conn.execute(text(f'PRAGMA table_info("{table}")'))]
+        wanted = set(names(target))
+        return ", ".join(f'"{name}"' for name in names(source) if name in wanted)
+
+    # ----- upcoming months -----
+    def ensure_partitions(self, today=None):
+        """Create missing partitions for this month and the next `months_ahead`; returns their names."""
+        created = []
+        first = (today or bd_today()).replace(day=1)
+        with db.engine.begin() as conn:
+            for table, column in TABLES.items():
+                if not self.is_partitioned(conn, table):
+                    continue
+                existing = self.month_partitions(conn, table)
+                for n in range(self.months_ahead + 1):
+                    month = add_months(first, n)
+                    if partition_name(table, month) not in existing:
+                        created.append(self._create_partition(conn, table, column, month))
+        if created:
+            log.info(f"Created partitions: {', '.join(created)}")
+        return created
+
+    def _create_partition(self, conn, table, column, month):
+        name = partition_name(table, month)
+        low, high = bound(month), bound(add_months(month, 1))
+        default = f"{table}_default"
+        stray = conn.execute(text(
+            f'SELECT count(*) FROM {default} WHERE "{column}" >= :low AND "{column}" < :high'
+        ), {"low": low, "high": high}).scalar()
+        if not stray:
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{low}') TO ('{high}')"))
+            return name
+        # The default partition already holds rows of this month, which would block
+        # CREATE ... PARTITION OF: build the partition aside, move them, then attach
+        conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED)"))
+        columns = self.copy_columns(conn, default, name)
+        conn.execute(text(
+            f'WITH moved AS (DELETE FROM {default} WHERE "{column}" >= :low AND "{column}" < :high RETURNING *) '
+            f"INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+        ), {"low": low, "high": high})
+        conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{low}') TO ('{high}')"))
+        log.info(f"Moved {stray} rows from {default} into {name}")
+        return name
+
+    # ----- archival -----
+    def archive(self, to=None, older_than_months=None, today=None):
+        """Move whole months older than the cutoff out of the live tables; returns a summary per table."""
+        to = to or self.archive_to
+        if to not in ("table", "parquet"):
+            raise PartitionError("archive target must be 'table' or 'parquet'")
+        if to == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise PartitionError("Archiving to Parquet requires pyarrow (pip install pyarrow)")
+        months = self.archive_after_months if older_than_months is None else older_than_months
+        cutoff = bound(add_months((today or bd_today()).replace(day=1), -months))
+
+        summary = {}
+        for table, column in TABLES.items():
+            moved = {"months": [], "rows": 0}
+            with db.engine.begin() as conn:
+                if self.is_partitioned(conn, table):
+                    for name, (low, high) in sorted(self.month_partitions(conn, table).items()):
+                        if high <= cutoff:
+                            moved["rows"] += self._archive_partition(conn, table, name, low, high, to)
+                            moved["months"].append(low[:7])
+                    # Old rows that landed in the default partition
+                    source = f"{table}_default"
+                else:
+                    source = table
+                moved["rows"] += self._archive_rows(conn, table, source, column, cutoff, to, moved["months"])
+                if moved["rows"]:
+                    # "reports_removed" makes the in-memory report indexes rebuild (services/report_feed.py)
+                    bump_data_version(table, *(["reports_removed"] if table == "reports" else []), conn=conn)
+            summary[table] = moved
+            log.info(f"Archived {moved['rows']} rows of {table} to {to} "
+                     f"({', '.join(sorted(set(moved['months']))) or 'nothing older than ' + cutoff[:7]})")
+        return summary
+
+    def _archive_partition(self, conn, table, name, low, high, to):
+        rows = conn.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        archive = f"{table}_archive"
+        if to == "table" and self.is_partitioned(conn, archive):
+            conn.execute(text(f"ALTER TABLE {archive} ATTACH PARTITION {name} FOR VALUES FROM ('{low}') TO ('{high}')"))
+            self._release_dependents(conn, table, f"SELECT id FROM {archive} WHERE \"{TABLES[table]}\" >= :low "
+                                                  f"AND \"{TABLES[table]}\" < :high", {"low": low, "high": high})
+            return rows
+        if to == "table":
+            columns = self.copy_columns(conn, name, archive)
+            conn.execute(text(f"INSERT INTO {archive} ({columns}) SELECT {columns} FROM {name}"))
+        else:
+            self._write_parquet(conn, table, name, f"SELECT * FROM {name}", {}, low[:7])
+        self._release_dependents(conn, table, f"SELECT id FROM {name}", {})
+        conn.execute(text(f"DROP TABLE {name}"))
+        return rows
+
+    def _archive_rows(self, conn, table, source, column, cutoff, to, months):
+        archive = f"{table}_archive"
+        columns = self.copy_columns(conn, source, archive)
+        moved = 0
+        after = ""
+        while True:
+            oldest = conn.execute(text(
+                f'SELECT min("{column}") FROM {source} WHERE "{column}" >= :after AND "{column}" < :cutoff'
+            ), {"after": after, "cutoff": cutoff}).scalar()
+            if oldest is None:
+                return moved
+            try:
+                month = date(int(oldest[:4]), int(oldest[5:7]), 1)
+                low, high, label = bound(month), min(bound(add_months(month, 1)), cutoff), oldest[:7]
+            except ValueError:
+                # Not a 'YYYY-MM-DD HH:MM' value: move the rows holding exactly that text
+                low, high, label = oldest, oldest + "\uffff", "unknown"
+            where = f'"{column}" >= :low AND "{column}" < :high'
+            params = {"low": low, "high": high}
+            if to == "table":
+                count = conn.execute(text(
+                    f"INSERT INTO {archive} ({columns}) SELECT {columns} FROM {source} WHERE {where}"), params).rowcount
+            else:
+                count = self._write_parquet(conn, table, source, f"SELECT * FROM {source} WHERE {where}",
+                                            params, label)
+            if count:
+                self._release_dependents(conn, table, f"SELECT id FROM {source} WHERE {where}", params)
+                conn.execute(text(f"DELETE FROM {source} WHERE {where}"), params)
+                moved += count
+                months.append(label)
+            after = high
+
+    def _release_dependents(self, conn, table, ids, params):
+        """What the dropped foreign keys did for the rows `ids` (a SELECT of their ids) leaving `table`."""
+        if table == "reports":
+            conn.execute(text(f"UPDATE report_submissions SET report_id = NULL WHERE report_id IN ({ids})"), params)
+        elif table == "sos_alerts":
+            conn.execute(text(f"DELETE FROM sos_track_points WHERE alert_id IN ({ids})"), params)
+
+    def _write_parquet(self, conn, table, source, query, params, label):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        skip = set()
+        if conn.dialect.name == "postgresql":
+            skip = set(conn.execute(text(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = :table "
+                "AND table_schema = current_schema() AND is_generated <> 'NEVER'"), {"table": source}).scalars())
+        result = conn.execute(text(query), params)
+        names = [name for name in result.keys() if name not in skip]
+        rows = [row._mapping for row in result]
+        if not rows:
+            return 0
+        directory = os.path.join(self.archive_dir, table)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{label}.parquet")
+        suffix = 1
+        while os.path.exists(path):
+            # A later run found more rows for a month already written: keep both files
+            suffix += 1
+            path = os.path.join(directory, f"{label}.{suffix}.parquet")
+        pq.write_table(pa.Table.from_pydict({name: [row[name] for row in rows] for name in names}),
+                       path, compression="snappy")
+        return len(rows)
+
+
+partition_manager = PartitionManager()
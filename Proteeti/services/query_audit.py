@@ -0,0 +1,140 @@
+"""Per-request SQL auditing for development and tests.
+
+When ``QUERY_AUDIT`` is on (the default in DEV_MODE and under TESTING) every
+statement a request executes is recorded. After the request the log is
+grouped by statement shape: a shape that repeats ``QUERY_AUDIT_N_PLUS_ONE``
+times or more is reported as a likely N+1 (typically a lazy ``report.user``
+touched in a loop), and statements slower than ``QUERY_AUDIT_SLOW_MS`` are
+reported as slow.
+
+Routes can be given a query budget through ``QUERY_BUDGETS`` (rule -> max
+statements) or the ``query_budget`` decorator. Going over budget is logged,
+and with ``QUERY_AUDIT_STRICT`` (on under TESTING) it turns the response into
+a 500 so the offending test fails. ``assert_max_queries`` does the same for a
+block of code.
+"""
+import re
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+
+# Statements are recorded by the SQL listeners in services/metrics.py
+from services.metrics import STATEMENT_RECORDERS
+
+
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%\([^)]*\)s|%s|:\w+)\s*,)+\s*(?:\?|%\([^)]*\)s|%s|:\w+)\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def statement_shape(statement):
+    """Normalise a statement so repeats differing only in parameters compare equal."""
+    shape = _STRING.sub("?", statement)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("(?)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+def query_budget(limit):
+    """Declare the maximum number of SQL statements a view may run."""
+    def decorator(view):
+        view._query_budget = limit
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.query_budget = limit
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail if the wrapped block runs more than `limit` SQL statements."""
+    log = []
+    STATEMENT_RECORDERS.append(log)
+    try:
+        yield log
+    finally:
+        STATEMENT_RECORDERS.remove(log)
+    if len(log) > limit:
+        shapes = "\n".join(f"  {n}x {shape}" for shape, n in Counter(statement_shape(s) for s, _ in log).most_common(5))
+        raise QueryBudgetExceeded(f"{len(log)} queries executed, budget is {limit}:\n{shapes}")
+
+
+class QueryAuditor:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        testing = app.config.get("TESTING", False)
+        app.config.setdefault("QUERY_AUDIT", testing)
+        app.config.setdefault("QUERY_AUDIT_STRICT", testing)
+        app.config.setdefault("QUERY_AUDIT_N_PLUS_ONE", 5)
+        app.config.setdefault("QUERY_AUDIT_SLOW_MS", 200)
+        app.config.setdefault("QUERY_BUDGETS", {})
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions["query_audit"] = self
+
+    def _enabled(self):
+        # TESTING is usually switched on after import, so re-check it per request
+        config = current_app.config
+        return config["QUERY_AUDIT"] or config.get("TESTING", False)
+
+    def _before_request(self):
+        if self._enabled():
+            g.query_log = []
+
+    def _budget(self):
+        if "query_budget" in g:
+            return g.query_budget
+        rule = request.url_rule
+        if rule is None:
+            return None
+        view = current_app.view_functions.get(rule.endpoint)
+        budget = getattr(view, "_query_budget", None)
+        return current_app.config["QUERY_BUDGETS"].get(rule.rule, budget)
+
+    def _after_request(self, response):
+        log = g.pop("query_log", None)
+        if log is None:
+            return response
+
+        config = current_app.config
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        response.headers["X-Query-Count"] = str(len(log))
+
+        shapes = Counter(statement_shape(statement) for statement, _ in log)
+        for shape, count in shapes.items():
+            if count >= config["QUERY_AUDIT_N_PLUS_ONE"]:
+                current_app.logger.warning(f"[QUERY AUDIT] Possible N+1 on {route}: {count}x {shape}")
+
+        slow_ms = config["QUERY_AUDIT_SLOW_MS"]
+        for statement, elapsed in log:
+            if elapsed * 1000 >= slow_ms:
+                current_app.logger.warning(
+                    f"[QUERY AUDIT] Slow query on {route} ({elapsed * 1000:.0f} ms): {statement_shape(statement)}"
+                )
+
+        budget = self._budget()
+        if budget is not None and len(log) > budget:
+            message = f"{route} ran {len(log)} queries, budget is {budget}"
+            current_app.logger.warning(f"[QUERY AUDIT] {message}")
+            if config["QUERY_AUDIT_STRICT"] or config.get("TESTING", False):
+                failure = jsonify({"error": "Query budget exceeded", "detail": message})
+                failure.status_code = 500
+                failure.headers["X-Query-Count"] = str(len(log))
+                return failure
+        return response
+
+
+query_auditor = QueryAuditor()
@@ -0,0 +1,243 @@
+"""Token-bucket rate limiting for the write endpoints.
+
+Each limited endpoint has a policy such as ``"ip:30/60, user:10/60"``: a
+bucket per client IP holding 30 tokens that refills at 30 per 60 seconds,
+and a bucket per logged-in user holding 10 that refills at 10 per 60
+seconds. Only state-changing requests (POST, PUT, PATCH, DELETE) spend
+tokens, so the login and register forms themselves can always be shown.
+
+IP buckets are checked in a WSGI wrapper, before Flask pushes a request
+context, so a rejected request never opens a session and never reaches the
+database. User buckets need the session and are checked in a
+``before_request`` hook, ahead of the view. A rejection is a 429 with a
+``Retry-After`` header.
+
+The IP is ``REMOTE_ADDR``. Behind a proxy, ``TRUSTED_PROXIES`` has ProxyFix
+take it from the right-most trusted ``X-Forwarded-For`` hop. A client cannot
+pick its own bucket by sending the header.
+
+Bucket state lives in process memory by default (one budget per worker) or
+in Redis, or anything speaking its protocol, when ``RATE_LIMIT_STORAGE`` is
+``redis``. If Redis is unreachable requests are let through rather than
+blocking SOS traffic.
+
+SOS keeps its own, much larger budget; an empty policy exempts an endpoint.
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request, session
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Response
+
+from services.metrics import RATE_LIMITED
+
+
+log = logging.getLogger(__name__)
+
+
+LIMITED_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+SCOPES = ("ip", "user")
+
+
+class Limit:
+    """`capacity` tokens, refilled at `capacity` per `period` seconds."""
+
+    __slots__ = ("scope", "capacity", "period", "rate")
+
+    def __init__(self, scope, capacity, period):
+        self.scope = scope
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+
+    def __repr__(self):
+        return f"{self.scope}:{self.capacity}/{self.period:g}"
+
+
+def parse_policy(spec):
+    """Parse ``"ip:30/60, user:10/60"`` into a list of Limits."""
+    limits = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            scope, rest = part.split(":", 1)
+            capacity, period = rest.split("/", 1)
+            limit = Limit(scope.strip(), int(capacity), float(period))
+        except ValueError:
+            raise ValueError(f"Invalid rate limit {part!r}, expected scope:count/seconds")
+        if limit.scope not in SCOPES:
+            raise ValueError(f"Unknown rate limit scope {limit.scope!r}, expected one of {SCOPES}")
+        if limit.capacity < 1 or limit.period <= 0:
+            raise ValueError(f"Invalid rate limit {part!r}")
+        limits.append(limit)
+    return limits
+
+
+# ======= Bucket storage =======
+class MemoryBucketStore:
+    """Process-local buckets. The least recently used are dropped past `maxsize` (a dropped bucket is full)."""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()   # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def consume(self, key, limit, now, cost=1):
+        """Take `cost` tokens. Returns (allowed, seconds until enough tokens are back)."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(limit.capacity), now]
+                if len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return True, 0.0
+            return False, (cost - bucket[0]) / limit.rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# Refill and take in one round trip; the key expires once the bucket would be full again
+_REDIS_CONSUME = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisBucketStore:
+    """Buckets shared by every worker, kept in Redis (or a Redis-compatible server)."""
+
+    def __init__(self, url, prefix="proteeti:ratelimit:"):
+        import redis
+        self.redis = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self.prefix = prefix
+        self._script = self.redis.register_script(_REDIS_CONSUME)
+
+    def consume(self, key, limit, now, cost=1):
+        try:
+            allowed, wait = self._script(keys=[self.prefix + key], args=[limit.capacity, limit.rate, now, cost])
+        except Exception as e:
+            log.warning(f"Redis unavailable, allowing request: {e}")
+            return True, 0.0
+        return bool(allowed), float(wait)
+
+    def clear(self):
+        for key in self.redis.scan_iter(self.prefix + "*"):
+            self.redis.delete(key)
+
+
+# ======= Flask integration =======
+def _environ_ip(environ):
+    """Client address as app.client_ip() sees it. X-Forwarded-For is never read here: the
+    client controls it, and behind TRUSTED_PROXIES ProxyFix has already set REMOTE_ADDR."""
+    return environ.get("REMOTE_ADDR", "")
+
+
+def too_many_requests(retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    body = json.dumps({"error": f"Too many requests. Please try again in {seconds} second(s)."})
+    return Response(body, status=429, mimetype="application/json", headers={"Retry-After": str(seconds)})
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.store = None
+        self.policies = {}   # endpoint -> {scope: [Limit, ...]}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("RATE_LIMIT_ENABLED", True)
+        if app.config.get("RATE_LIMIT_STORAGE", "memory") == "redis":
+            self.store = RedisBucketStore(app.config["RATE_LIMIT_REDIS_URL"])
+        else:
+            self.store = MemoryBucketStore()
+
+        self.policies = {}
+        for endpoint, spec in app.config.get("RATE_LIMITS", {}).items():
+            by_scope = {}
+            for limit in parse_policy(spec):
+                by_scope.setdefault(limit.scope, []).append(limit)
+            if by_scope:
+                self.policies[endpoint] = by_scope
+
+        self.app = app
+        app.wsgi_app = _IPGate(app.wsgi_app, self)
+        app.before_request(self._check_user)
+        app.extensions["rate_limiter"] = self
+
+    def hit(self, endpoint, scope, identity, now=None):
+        """Spend a token from every `scope` bucket of `endpoint`. Returns a 429 response or None."""
+        limits = self.policies.get(endpoint, {}).get(scope)
+        if not limits or not identity:
+            return None
+        now = time.time() if now is None else now
+        for limit in limits:
+            allowed, retry_after = self.store.consume(f"{endpoint}:{limit!r}:{identity}", limit, now)
+            if not allowed:
+                RATE_LIMITED.inc(endpoint, scope)
+                return too_many_requests(retry_after)
+        return None
+
+    def _check_user(self):
+        if not self.enabled or request.method not in LIMITED_METHODS:
+            return None
+        if request.endpoint not in self.policies:
+            return None
+        return self.hit(request.endpoint, "user", session.get("username"))
+
+
+class _IPGate:
+    """WSGI wrapper applying the per-IP buckets before Flask (and the session) is involved."""
+
+    def __init__(self, wsgi_app, limiter):
+        self.wsgi_app = wsgi_app
+        self.limiter = limiter
+
+    def __call__(self, environ, start_response):
+        limiter = self.limiter
+        if limiter.enabled and environ.get("REQUEST_METHOD") in LIMITED_METHODS:
+            try:
+                endpoint, _ = limiter.app.url_map.bind_to_environ(environ).match()
+            except HTTPException:
+                endpoint = None
+            if endpoint in limiter.policies:
+                rejected = limiter.hit(endpoint, "ip", _environ_ip(environ))
+                if rejected is not None:
+                    return rejected(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+
+rate_limiter = RateLimiter()
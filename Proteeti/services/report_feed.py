@@ -0,0 +1,77 @@
+"""Keeps in-memory report indexes (route hazards, risk grid) in step with the table.
+
+Each index owns a ``ReportFeed``. ``changes()`` is cheap while the "reports"
+data version is unchanged; after a change it reads only rows with an id past
+the last one seen, never counting the table. Removing reports (admin delete,
+archiving) also bumps the "reports_removed" version, and a change there
+returns every report inside the window instead, so the index rebuilds from
+scratch.
+
+Another worker can commit an older id after a newer one, so each read looks
+back ``COMMIT_LAG_IDS`` ids past the last one seen and skips the ids it has
+already applied.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from models.user import db, Report
+from services.http_cache import http_cache
+
+
+REPORT_FEED_COLUMNS = (Report.id, Report.lat, Report.lng, Report.category, Report.timestamp)
+VERSIONS = ("reports", "reports_removed")
+COMMIT_LAG_IDS = 100
+
+
+class ReportFeed:
+    def __init__(self, window_days=180):
+        self.window_days = window_days
+        self.versions = None  # VERSIONS last read
+        self.last_id = 0
+        self.recent = set()   # ids applied within COMMIT_LAG_IDS of last_id
+
+    @staticmethod
+    def current():
+        return [version for version, _ in http_cache.current_versions(VERSIONS)]
+
+    def stale(self):
+        return self.current() != self.versions
+
+    def seen(self, report):
+        """Record a report the caller applied itself; False if it was already applied."""
+        if report.id in self.recent or report.id <= self.last_id - COMMIT_LAG_IDS:
+            return False
+        self._track([report.id])
+        return True
+
+    def _track(self, ids):
+        self.last_id = max([self.last_id, *ids])
+        self.recent.update(ids)
+        self.recent = {i for i in self.recent if i > self.last_id - COMMIT_LAG_IDS}
+
+    def changes(self):
+        """None when up to date, else (full, rows). Call with the owner's lock held."""
+        versions = self.current()
+        if versions == self.versions:
+            return None
+        columns = select(*REPORT_FEED_COLUMNS)
+        full = self.versions is None or versions[1] != self.versions[1]
+        with db.engine.connect() as conn:
+            if full:
+                self.last_id = conn.execute(select(func.max(Report.id))).scalar() or 0
+                self.recent = set(conn.execute(
+                    select(Report.id).where(Report.id > self.last_id - COMMIT_LAG_IDS)).scalars())
+                # Time columns hold 'YYYY-MM-DD HH:MM' strings, which compare correctly as text
+                cutoff = (datetime.now(timezone.utc) + timedelta(hours=6, days=-self.window_days)
+                          ).strftime("%Y-%m-%d %H:%M")
+                # Newer ids are left to the next read; older ones committed meanwhile count as applied
+                rows = conn.execute(columns.where(Report.timestamp >= cutoff, Report.id <= self.last_id)).all()
+                self._track([row.id for row in rows if row.id > self.last_id - COMMIT_LAG_IDS])
+            else:
+                rows = conn.execute(columns.where(Report.id > self.last_id - COMMIT_LAG_IDS)
+                                    .order_by(Report.id)).all()
+                rows = [row for row in rows if row.id not in self.recent]
+                self._track([row.id for row in rows])
+        self.versions = versions
+        return full, rows
@@ -0,0 +1,317 @@
+"""Nearest police station / hospital / shelter lookups.
+
+The safety_resources table is loaded at startup into a KD-tree over points
+on the unit sphere (lat/lng -> x, y, z). Straight-line distance between unit
+vectors grows monotonically with great-circle distance, so a plain 3-d
+nearest-neighbour search gives exact haversine results, with no special
+cases at the antimeridian. A k-nearest query touches O(log n) nodes and
+never hits the database.
+
+Admin edits are applied incrementally: new or changed rows go into a small
+``pending`` map that queries scan linearly, and their old tree entries are
+masked by a ``removed`` set. Once the two together exceed
+``RESOURCES_REBUILD_THRESHOLD`` entries the tree is rebuilt. Other workers
+notice the change through the "resources" data version (the same counter
+the HTTP cache uses) and read only the rows whose ``updated_at`` moved.
+
+Seeds the table from data/resources.json when it is empty.
+"""
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.user import db, SafetyResource
+from services.http_cache import http_cache, bump_data_version
+
+
+log = logging.getLogger(__name__)
+
+
+KINDS = ("police", "hospital", "shelter")
+EARTH_RADIUS_KM = 6371.0088
+SEED_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "resources.json")
+
+Responder = namedtuple("Responder", "id kind name lat lng phone website xyz")
+
+RESPONDER_COLUMNS = [SafetyResource.id, SafetyResource.kind, SafetyResource.name, SafetyResource.lat,
+                     SafetyResource.lng, SafetyResource.phone, SafetyResource.website,
+                     SafetyResource.active, SafetyResource.updated_at]
+
+
+class ResponderError(ValueError):
+    pass
+
+
+def to_xyz(lat, lng):
+    phi, lam = math.radians(lat), math.radians(lng)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+
+def chord2_to_km(d2):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(d2) / 2))
+
+
+def km_to_chord2(km):
+    return (2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)) ** 2
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def parse_resource(data, partial=False):
+    """Validated column values from an admin JSON body; `partial` allows missing fields (updates)."""
+    if not isinstance(data, dict):
+        raise ResponderError("JSON object required")
+    values = {}
+    if "kind" in data or not partial:
+        kind = str(data.get("kind") or "").strip().lower()
+        if kind not in KINDS:
+            raise ResponderError(f"kind must be one of: {', '.join(KINDS)}")
+        values["kind"] = kind
+    if "name" in data or not partial:
+        name = str(data.get("name") or "").strip()
+        if not name or len(name) > 200:
+            raise ResponderError("name is required (max 200 characters)")
+        values["name"] = name
+    for field, limit in (("lat", 90), ("lng", 180)):
+        if field in data or not partial:
+            try:
+                value = float(data.get(field))
+            except (TypeError, ValueError):
+                raise ResponderError(f"{field} must be a number")
+            if not -limit <= value <= limit:
+                raise ResponderError(f"{field} out of range")
+            values[field] = value
+    for field, limit in (("phone", 40), ("website", 255)):
+        if field in data:
+            value = str(data.get(field) or "").strip() or None
+            if value and len(value) > limit:
+                raise ResponderError(f"{field} is too long")
+            values[field] = value
+    return values
+
+
+class KDTree:
+    """Static balanced 3-d tree, stored implicitly: the node for [lo, hi) is at
+    the middle index, its children cover [lo, mid) and [mid + 1, hi)."""
+
+    def __init__(self, entries):
+        entries = list(entries)   # [(xyz, id)]
+        self.axes = [0] * len(entries)
+        self._build(entries, 0, len(entries))
+        self.points = [xyz for xyz, _ in entries]
+        self.ids = [rid for _, rid in entries]
+        self.id_set = frozenset(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _build(self, entries, lo, hi):
+        if hi - lo <= 1:
+            return
+        # Split on the axis with the widest spread
+        spreads = [max(e[0][a] for e in entries[lo:hi]) - min(e[0][a] for e in entries[lo:hi]) for a in range(3)]
+        axis = spreads.index(max(spreads))
+        entries[lo:hi] = sorted(entries[lo:hi], key=lambda e: e[0][axis])
+        mid = (lo + hi) >> 1
+        self.axes[mid] = axis
+        self._build(entries, lo, mid)
+        self._build(entries, mid + 1, hi)
+
+    def nearest(self, q, k, max_d2=math.inf, accept=None):
+        """Up to `k` (squared chord distance, id) pairs within `max_d2`, nearest first."""
+        points, ids, axes = self.points, self.ids, self.axes
+        heap = []   # max-heap of (-d2, id)
+
+        def limit():
+            return -heap[0][0] if len(heap) == k else max_d2
+
+        def visit(lo, hi):
+            if lo >= hi:
+                return
+            mid = (lo + hi) >> 1
+            p = points[mid]
+            d2 = (q[0] - p[0]) ** 2 + (q[1] - p[1]) ** 2 + (q[2] - p[2]) ** 2
+            if d2 <= limit() and (accept is None or accept(ids[mid])):
+                if len(heap) == k:
+                    heapq.heapreplace(heap, (-d2, ids[mid]))
+                else:
+                    heapq.heappush(heap, (-d2, ids[mid]))
+            diff = q[axes[mid]] - p[axes[mid]]
+            if diff < 0:
+                visit(lo, mid)
+                if diff * diff <= limit():
+                    visit(mid + 1, hi)
+            else:
+                visit(mid + 1, hi)
+                if diff * diff <= limit():
+                    visit(lo, mid)
+
+        if k > 0:
+            visit(0, len(ids))
+        return sorted((-d, rid) for d, rid in heap)
+
+
+class ResponderIndex:
+    def __init__(self, app=None):
+        self.rebuild_threshold = 64
+        self.max_results = 50
+        self.seed_file = SEED_FILE
+        # One tuple, swapped whole, so readers never see half an update:
+        #   resources  id -> Responder, active only
+        #   tree       KDTree as of the last rebuild
+        #   pending    id -> Responder added or changed since that rebuild
+        #   removed    ids whose tree entry is stale
+        self._state = ({}, KDTree([]), {}, frozenset())
+        self.version = None          # "resources" data version the index reflects
+        self.loaded_until = 0        # highest updated_at applied
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rebuild_threshold = app.config.get("RESOURCES_REBUILD_THRESHOLD", self.rebuild_threshold)
+        self.max_results = app.config.get("RESOURCES_NEAREST_MAX", self.max_results)
+        self.seed_file = app.config.get("RESOURCES_SEED_FILE") or self.seed_file
+        app.extensions["responders"] = self
+        with app.app_context():
+            try:
+                self.seed()
+                self.refresh()
+            except SQLAlchemyError as e:
+                log.warning(f"Responder index not loaded: {e}")
+
+    def seed(self):
+        """Fill an empty table from the seed file."""
+        with db.engine.begin() as conn:
+            if conn.execute(select(func.count()).select_from(SafetyResource)).scalar():
+                return 0
+            try:
+                with open(self.seed_file, encoding="utf-8") as f:
+                    rows = json.load(f)
+            except (OSError, ValueError):
+                return 0
+            stamp = now_ms()
+            values = [dict(parse_resource(row), active=True, updated_at=stamp) for row in rows]
+            if values:
+                conn.execute(insert(SafetyResource), values)
+        if values:
+            bump_data_version("resources")
+        log.info(f"Seeded {len(values)} safety resources from {self.seed_file}")
+        return len(values)
+
+    # ----- loading -----
+    def refresh(self):
+        """Catch up with changes made by any worker; cheap when nothing changed."""
+        version = http_cache.current_versions(("resources",))[0][0]
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            since = self.loaded_until
+            query = select(*RESPONDER_COLUMNS)
+            if self.version is not None:
+                # >= : rows written in the same millisecond as the last one we saw
+                query = query.where(SafetyResource.updated_at >= since)
+            with db.engine.connect() as conn:
+                rows = conn.execute(query).all()
+            if self.version is None:
+                self._rebuild({row.id: self._responder(row) for row in rows if row.active})
+            else:
+                for row in rows:
+                    self._apply(row.id, self._responder(row) if row.active else None)
+            self.loaded_until = max([since] + [row.updated_at for row in rows])
+            self.version = version
+
+    def apply(self, resource):
+        """Apply a committed admin change in this worker right away (others catch up via refresh)."""
+        with self._lock:
+            self._apply(resource.id, self._responder(resource) if resource.active else None)
+
+    @staticmethod
+    def _responder(row):
+        return Responder(row.id, row.kind, row.name, row.lat, row.lng, row.phone, row.website,
+                         to_xyz(row.lat, row.lng))
+
+    def _apply(self, rid, responder):
+        resources, tree, pending, removed = self._state
+        resources, pending = dict(resources), dict(pending)
+        pending.pop(rid, None)
+        if responder is None:
+            resources.pop(rid, None)
+        else:
+            resources[rid] = pending[rid] = responder
+        if rid in tree.id_set:
+            removed = removed | {rid}
+        if len(pending) + len(removed) > self.rebuild_threshold:
+            self._rebuild(resources)
+        else:
+            self._state = (resources, tree, pending, removed)
+
+    def _rebuild(self, resources):
+        tree = KDTree((r.xyz, rid) for rid, r in resources.items())
+        self._state = (resources, tree, {}, frozenset())
+
+    def __len__(self):
+        return len(self._state[0])
+
+    # ----- queries -----
+    def nearest(self, lat, lng, k=5, kind=None, max_km=None):
+        """The `k` nearest active resources (optionally of one kind) as dicts with `distance_km`."""
+        try:
+            self.refresh()
+        except SQLAlchemyError as e:
+            log.warning(f"Responder index refresh failed, serving last copy: {e}")
+        k = max(0, min(int(k), self.max_results))
+        resources, tree, pending, removed = self._state
+        q = to_xyz(lat, lng)
+        max_d2 = km_to_chord2(max_km) if max_km is not None else math.inf
+
+        if kind is None and not removed:
+            accept = None
+        else:
+            def accept(rid):
+                if rid in removed:
+                    return False
+                return kind is None or resources[rid].kind == kind
+
+        found = tree.nearest(q, k, max_d2, accept)
+        for rid, r in pending.items():
+            if kind is not None and r.kind != kind:
+                continue
+            d2 = (q[0] - r.xyz[0]) ** 2 + (q[1] - r.xyz[1]) ** 2 + (q[2] - r.xyz[2]) ** 2
+            if d2 <= max_d2:
+                found.append((d2, rid))
+        found.sort()
+
+        results = []
+        for d2, rid in found[:k]:
+            r = pending.get(rid) or resources[rid]
+            results.append({
+                "id": r.id, "kind": r.kind, "name": r.name, "lat": r.lat, "lng": r.lng,
+                "phone": r.phone, "website": r.website, "distance_km": round(chord2_to_km(d2), 2),
+            })
+        return results
+
+    def nearest_one(self, lat, lng, kind="police"):
+        """Closest resource of `kind`, or None; never raises (used while sending SOS mail)."""
+        try:
+            found = self.nearest(lat, lng, k=1, kind=kind)
+        except Exception as e:
+            log.warning(f"Nearest {kind} lookup failed: {e}")
+            return None
+        return found[0] if found else None
+
+
+responders = ResponderIndex()
@@ -0,0 +1,288 @@
+"""Time-decayed hazard risk scores on a fixed grid over the coverage area.
+
+Every report adds ``CATEGORY_WEIGHTS[category] * exp(-age / tau)`` to the
+cell it falls in (``RISK_CELL_M`` metres square, default 250 m) of a grid
+covering ``RISK_BBOX`` (default: Bangladesh). Scores are stored relative
+to a reference time ``t0``: adding a report is one cell update and reading
+multiplies by ``exp(-(now - t0) / tau)``, so nothing is recomputed as time
+passes. A report from last night therefore weighs about twice as much as
+one from ``RISK_HALF_LIFE_DAYS`` ago, and one from two years ago has
+faded out.
+
+NumPy is in requirements.txt, so deployments keep the grid as a dense
+float32 array and area and route lookups are array slices. That costs
+about 21 MB per worker for the default area (2761 x 1918 cells); a larger
+``RISK_BBOX`` or smaller ``RISK_CELL_M`` grows it accordingly. Without
+NumPy it falls back to a dict of the non-empty cells, which answers the
+same lookups by scanning only the few cells involved.
+
+Lookups:
+    point(lat, lng, radius_m)   summed score of the cells around a point
+    area(bbox, limit)           highest-scoring cells in a box, for map shading
+    route(path, radius_m)       total / peak / mean score along a polyline
+
+Other workers follow new reports through services/report_feed.py.
+"""
+import logging
+import math
+import threading
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.user import bd_to_epoch
+from services.report_feed import ReportFeed
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional
+    np = None
+
+log = logging.getLogger(__name__)
+
+
+METRES_PER_DEGREE = 111320.0
+
+# Shared with the route planner: how much one report of each category counts
+CATEGORY_WEIGHTS = {
+    "Harassment": 1.0,
+    "Suspicious Activity": 0.7,
+    "Unsafe Lighting": 0.5,
+    "Other": 0.3,
+}
+DEFAULT_CATEGORY_WEIGHT = 0.3
+
+
+class RiskError(ValueError):
+    pass
+
+
+class _DenseScores:
+    def __init__(self, rows, cols):
+        self.values = np.zeros((rows, cols), dtype=np.float32)
+
+    def add(self, i, j, weight):
+        self.values[i, j] += weight
+
+    def window_sum(self, i0, i1, j0, j1):
+        return float(self.values[i0:i1, j0:j1].sum())
+
+    def top_cells(self, i0, i1, j0, j1, limit):
+        window = self.values[i0:i1, j0:j1]
+        ii, jj = np.nonzero(window)
+        scores = window[ii, jj]
+        if len(scores) > limit:
+            keep = np.argpartition(scores, -limit)[-limit:]
+            ii, jj, scores = ii[keep], jj[keep], scores[keep]
+        return zip((ii + i0).tolist(), (jj + j0).tolist(), scores.tolist())
+
+    def values_at(self, cells):
+        if not cells:
+            return []
+        ii, jj = zip(*cells)
+        return self.values[list(ii), list(jj)].tolist()
+
+    def scale(self, factor):
+        self.values *= factor
+
+
+class _SparseScores:
+    def __init__(self, rows, cols):
+        self.values = {}
+
+    def add(self, i, j, weight):
+        self.values[(i, j)] = self.values.get((i, j), 0.0) + weight
+
+    def window_sum(self, i0, i1, j0, j1):
+        if (i1 - i0) * (j1 - j0) > len(self.values):
+            return sum(v for (i, j), v in self.values.items() if i0 <= i < i1 and j0 <= j < j1)
+        get = self.values.get
+        return sum(get((i, j), 0.0) for i in range(i0, i1) for j in range(j0, j1))
+
+    def top_cells(self, i0, i1, j0, j1, limit):
+        cells = [(i, j, v) for (i, j), v in self.values.items() if i0 <= i < i1 and j0 <= j < j1]
+        cells.sort(key=lambda c: c[2], reverse=True)
+        return cells[:limit]
+
+    def values_at(self, cells):
+        get = self.values.get
+        return [get(cell, 0.0) for cell in cells]
+
+    def scale(self, factor):
+        self.values = {cell: v * factor for cell, v in self.values.items()}
+
+
+class RiskGrid:
+    def __init__(self, app=None):
+        self.bbox = (88.0, 20.5, 92.7, 26.7)   # min_lng, min_lat, max_lng, max_lat
+        self.cell_m = 250.0
+        self.half_life_days = 30.0
+        self.window_days = 365
+        self.scores = None
+        self.t0 = time.time()
+        self.feed = ReportFeed(self.window_days)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.bbox = app.config.get("RISK_BBOX", self.bbox)
+        self.cell_m = app.config.get("RISK_CELL_M", self.cell_m)
+        self.half_life_days = app.config.get("RISK_HALF_LIFE_DAYS", self.half_life_days)
+        self.window_days = app.config.get("RISK_WINDOW_DAYS", self.window_days)
+        self.feed = ReportFeed(self.window_days)
+
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        mid_lat = math.radians((min_lat + max_lat) / 2)
+        # Cells are square in metres at the middle of the area
+        self.cell_lat = self.cell_m / METRES_PER_DEGREE
+        self.cell_lng = self.cell_m / (METRES_PER_DEGREE * max(math.cos(mid_lat), 0.01))
+        self.rows = max(1, math.ceil((max_lat - min_lat) / self.cell_lat))
+        self.cols = max(1, math.ceil((max_lng - min_lng) / self.cell_lng))
+        self.scores = self._empty()
+        app.extensions["risk"] = self
+        with app.app_context():
+            try:
+                self.refresh()
+            except SQLAlchemyError as e:
+                log.warning(f"Risk grid not loaded: {e}")
+
+    def _empty(self):
+        return (_DenseScores if np is not None else _SparseScores)(self.rows, self.cols)
+
+    @property
+    def tau(self):
+        return self.half_life_days * 86400 / math.log(2)
+
+    def decay(self):
+        """Factor turning stored scores into scores as of now."""
+        return math.exp(-(time.time() - self.t0) / self.tau)
+
+    def cell(self, lat, lng):
+        """(row, col) of the cell containing the point, or None outside the coverage area."""
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+            return None
+        return (min(int((lat - min_lat) / self.cell_lat), self.rows - 1),
+                min(int((lng - min_lng) / self.cell_lng), self.cols - 1))
+
+    def cell_center(self, i, j):
+        return (self.bbox[1] + (i + 0.5) * self.cell_lat, self.bbox[0] + (j + 0.5) * self.cell_lng)
+
+    # ----- updates -----
+    def _add(self, scores, lat, lng, category, timestamp):
+        cell = self.cell(lat, lng)
+        if cell is None:
+            return
+        try:
+            shift = (bd_to_epoch(timestamp) - self.t0) / self.tau
+        except (TypeError, ValueError):
+            return
+        scores.add(cell[0], cell[1], CATEGORY_WEIGHTS.get(category, DEFAULT_CATEGORY_WEIGHT) * math.exp(shift))
+
+    def add_report(self, report):
+        """Count a just-committed report in this worker right away."""
+        if self.scores is None:
+            return
+        with self._lock:
+            if self.feed.seen(report):
+                self._add(self.scores, report.lat, report.lng, report.category, report.timestamp)
+
+    def refresh(self):
+        if self.scores is None or not self.feed.stale():
+            return
+        with self._lock:
+            changes = self.feed.changes()
+            if changes is None:
+                return
+            full, rows = changes
+            if full:
+                self.t0 = time.time()
+                scores = self._empty()
+            else:
+                scores = self.scores
+            for row in rows:
+                self._add(scores, row.lat, row.lng, row.category, row.timestamp)
+            self.scores = scores
+
+            if time.time() - self.t0 > 20 * self.tau:
+                # Keep exp((t - t0) / tau) in float range: fold the decay so far into the scores
+                self.scores.scale(self.decay())
+                self.t0 = time.time()
+
+    def _fresh(self):
+        try:
+            self.refresh()
+        except SQLAlchemyError as e:
+            log.warning(f"Risk grid refresh failed, using last scores: {e}")
+        if self.scores is None:
+            raise RiskError("Risk grid is not loaded")
+
+    # ----- lookups -----
+    def _window(self, lat, lng, radius_m):
+        """Cell index ranges [i0, i1) x [j0, j1) covering radius_m around a point, clipped to the grid."""
+        min_lng, min_lat = self.bbox[0], self.bbox[1]
+        i, j = (lat - min_lat) / self.cell_lat, (lng - min_lng) / self.cell_lng
+        di, dj = radius_m / self.cell_m, radius_m / self.cell_m
+        i0, i1 = max(0, int(i - di)), min(self.rows, int(i + di) + 1)
+        j0, j1 = max(0, int(j - dj)), min(self.cols, int(j + dj) + 1)
+        return i0, max(i0, i1), j0, max(j0, j1)
+
+    def point(self, lat, lng, radius_m=250):
+        """Current score of the cells within about radius_m of a point."""
+        self._fresh()
+        return self.scores.window_sum(*self._window(lat, lng, radius_m)) * self.decay()
+
+    def area(self, bbox, limit=500):
+        """The `limit` highest-scoring cells inside bbox (min_lng, min_lat, max_lng, max_lat)."""
+        self._fresh()
+        min_lng, min_lat, max_lng, max_lat = bbox
+        if min_lng > max_lng or min_lat > max_lat:
+            raise RiskError("bbox must be min_lng,min_lat,max_lng,max_lat")
+        g = self.bbox
+        i0 = max(0, int((min_lat - g[1]) / self.cell_lat))
+        i1 = min(self.rows, int((max_lat - g[1]) / self.cell_lat) + 1)
+        j0 = max(0, int((min_lng - g[0]) / self.cell_lng))
+        j1 = min(self.cols, int((max_lng - g[0]) / self.cell_lng) + 1)
+        if i0 >= i1 or j0 >= j1:
+            return []
+        decay = self.decay()
+        cells = []
+        for i, j, v in self.scores.top_cells(i0, i1, j0, j1, limit):
+            lat, lng = self.cell_center(i, j)
+            cells.append((lat, lng, v * decay))
+        cells.sort(key=lambda c: c[2], reverse=True)
+        return cells
+
+    def route(self, path, radius_m=0):
+        """Score along a polyline [(lat, lng), ...]: every cell it crosses counted once."""
+        self._fresh()
+        cells = []
+        seen = set()
+        step = self.cell_m / 2
+        for (lat1, lng1), (lat2, lng2) in zip(path, path[1:] or path):
+            dy = (lat2 - lat1) * METRES_PER_DEGREE
+            dx = (lng2 - lng1) * METRES_PER_DEGREE * math.cos(math.radians(lat1))
+            samples = max(1, int(math.hypot(dx, dy) / step))
+            for k in range(samples + 1):
+                lat, lng = lat1 + (lat2 - lat1) * k / samples, lng1 + (lng2 - lng1) * k / samples
+                if radius_m:
+                    i0, i1, j0, j1 = self._window(lat, lng, radius_m)
+                    around = [(i, j) for i in range(i0, i1) for j in range(j0, j1)]
+                else:
+                    around = [self.cell(lat, lng)]
+                for cell in around:
+                    if cell is not None and cell not in seen:
+                        seen.add(cell)
+                        cells.append(cell)
+        decay = self.decay()
+        values = [v * decay for v in self.scores.values_at(cells)]
+        return {
+            "total": round(sum(values), 4),
+            "peak": round(max(values, default=0.0), 4),
+            "mean": round(sum(values) / len(values), 4) if values else 0.0,
+            "cells": len(values),
+        }
+
+
+risk_grid = RiskGrid()
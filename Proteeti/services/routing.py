@@ -0,0 +1,409 @@
+"""Safety-weighted walking routes.
+
+The street network is loaded at startup from ``ROUTING_GRAPH_FILE``: either
+an OpenStreetMap XML extract (``.osm`` / ``.osm.gz``) or the compact file
+written from one by ``python build_road_graph.py`` (much faster to load). It
+is kept in flat ``array`` columns with CSR adjacency (the neighbours of node
+``i`` are ``targets[offsets[i]:offsets[i + 1]]``), so a city of a few hundred
+thousand nodes fits in tens of MB. Streets are treated as two-way, since
+routes are for walking.
+
+Each segment's cost is its length times a hazard multiplier of
+``1 + safety * ROUTING_HAZARD_PENALTY * (1 - exp(-hazard))``: a heavily
+reported street costs at most (1 + penalty) times its length, and a
+``safety=0`` query is the plain shortest path. Hazard is the sum of nearby
+reports (within ``ROUTING_HAZARD_RADIUS_M``, weighted by category and
+distance), each decaying with a half-life of ``ROUTING_HALF_LIFE_DAYS``.
+Scores are stored relative to a reference time ``t0``, so decay is one
+multiplication per query instead of a pass over every segment, and a new
+report only touches the segments around it. Other workers pick up new
+reports through services/report_feed.py.
+
+Paths are found with A*; straight-line distance is a valid lower bound
+because every multiplier is at least 1.
+"""
+import gzip
+import heapq
+import logging
+import math
+import struct
+import threading
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.user import bd_to_epoch
+from services.report_feed import ReportFeed
+from services.risk import CATEGORY_WEIGHTS, DEFAULT_CATEGORY_WEIGHT
+
+
+log = logging.getLogger(__name__)
+
+
+GRAPH_MAGIC = b"PRG1"
+EARTH_RADIUS_M = 6371008.8
+CELL_DEG = 0.002          # grid cell for snapping and report lookups, ~220 m
+WALKING_M_PER_MIN = 80
+
+# highway=* values a pedestrian can use
+WALKABLE = {
+    "trunk", "primary", "secondary", "tertiary", "unclassified", "residential", "living_street",
+    "service", "pedestrian", "footway", "path", "steps", "track", "road", "cycleway",
+    "primary_link", "secondary_link", "tertiary_link", "trunk_link",
+}
+
+
+class RoutingError(ValueError):
+    pass
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))
+
+
+def grid_cell(lat, lng):
+    return (math.floor(lat / CELL_DEG), math.floor(lng / CELL_DEG))
+
+
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+class RoadGraph:
+    """Undirected street network in flat arrays.
+
+    Node i is at (lat[i], lng[i]). Segment s joins seg_a[s] and seg_b[s] and is
+    seg_len[s] metres long. Edge slot e in offsets[i]:offsets[i + 1] leads to
+    targets[e] along segment edge_seg[e].
+    """
+
+    def __init__(self, lat, lng, seg_a, seg_b, seg_len):
+        self.lat, self.lng = lat, lng
+        self.seg_a, self.seg_b, self.seg_len = seg_a, seg_b, seg_len
+        self._build_adjacency()
+        self._build_grids()
+
+    @property
+    def node_count(self):
+        return len(self.lat)
+
+    @property
+    def segment_count(self):
+        return len(self.seg_len)
+
+    # ----- loading -----
+    @classmethod
+    def load(cls, path):
+        if path.endswith((".osm", ".osm.gz", ".xml")):
+            return cls.from_osm(path)
+        with _open(path) as f:
+            data = f.read()
+        if data[:4] != GRAPH_MAGIC:
+            raise ValueError(f"{path} is not a road graph file")
+        n_nodes, n_segs = struct.unpack_from("<II", data, 4)
+        pos = 12
+        columns = []
+        for typecode, count in (("d", n_nodes), ("d", n_nodes), ("I", n_segs), ("I", n_segs), ("f", n_segs)):
+            column = array(typecode)
+            size = column.itemsize * count
+            column.frombytes(data[pos:pos + size])
+            pos += size
+            columns.append(column)
+        return cls(*columns)
+
+    @classmethod
+    def from_osm(cls, path):
+        """Walkable ways of an OSM XML extract; only nodes on those ways are kept."""
+        coords, ways = {}, []
+        with _open(path) as f:
+            for _, elem in ET.iterparse(f, events=("end",)):
+                if elem.tag == "node":
+                    coords[elem.get("id")] = (float(elem.get("lat")), float(elem.get("lon")))
+                    elem.clear()
+                elif elem.tag == "way":
+                    tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                    if tags.get("highway") in WALKABLE and tags.get("foot") != "no" and tags.get("access") != "private":
+                        ways.append([nd.get("ref") for nd in elem.iter("nd")])
+                    elem.clear()
+
+        index = {}
+        lat, lng = array("d"), array("d")
+        seg_a, seg_b, seg_len = array("I"), array("I"), array("f")
+        seen = set()
+
+        def node(ref):
+            i = index.get(ref)
+            if i is None:
+                i = index[ref] = len(lat)
+                lat.append(coords[ref][0])
+                lng.append(coords[ref][1])
+            return i
+
+        for refs in ways:
+            refs = [r for r in refs if r in coords]
+            for r1, r2 in zip(refs, refs[1:]):
+                if r1 == r2:
+                    continue
+                a, b = node(r1), node(r2)
+                key = (a, b) if a < b else (b, a)
+                if key in seen:
+                    continue
+                seen.add(key)
+                seg_a.append(a)
+                seg_b.append(b)
+                seg_len.append(haversine_m(lat[a], lng[a], lat[b], lng[b]))
+        return cls(lat, lng, seg_a, seg_b, seg_len)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(GRAPH_MAGIC + struct.pack("<II", self.node_count, self.segment_count))
+            for column in (self.lat, self.lng, self.seg_a, self.seg_b, self.seg_len):
+                f.write(column.tobytes())
+
+    def _build_adjacency(self):
+        n = self.node_count
+        offsets = [0] * (n + 1)
+        for a, b in zip(self.seg_a, self.seg_b):
+            offsets[a + 1] += 1
+            offsets[b + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        targets = array("I", bytes(4 * offsets[n]))
+        edge_seg = array("I", bytes(4 * offsets[n]))
+        cursor = offsets[:n]
+        for s, (a, b) in enumerate(zip(self.seg_a, self.seg_b)):
+            targets[cursor[a]], edge_seg[cursor[a]] = b, s
+            cursor[a] += 1
+            targets[cursor[b]], edge_seg[cursor[b]] = a, s
+            cursor[b] += 1
+        self.offsets, self.targets, self.edge_seg = array("I", offsets), targets, edge_seg
+
+        # Unit-sphere coordinates for the A* heuristic (chord length <= arc length)
+        self.x, self.y, self.z = array("d"), array("d"), array("d")
+        for la, ln in zip(self.lat, self.lng):
+            phi, lam = math.radians(la), math.radians(ln)
+            self.x.append(math.cos(phi) * math.cos(lam))
+            self.y.append(math.cos(phi) * math.sin(lam))
+            self.z.append(math.sin(phi))
+
+    def _build_grids(self):
+        self.node_cells = {}
+        for i, (la, ln) in enumerate(zip(self.lat, self.lng)):
+            if self.offsets[i + 1] > self.offsets[i]:
+                self.node_cells.setdefault(grid_cell(la, ln), []).append(i)
+        self.seg_cells = {}
+        for s, (a, b) in enumerate(zip(self.seg_a, self.seg_b)):
+            mid = ((self.lat[a] + self.lat[b]) / 2, (self.lng[a] + self.lng[b]) / 2)
+            self.seg_cells.setdefault(grid_cell(*mid), []).append(s)
+
+    # ----- spatial lookups -----
+    @staticmethod
+    def _cell_metres(lat):
+        # The narrower (east-west) side of a cell at this latitude
+        return CELL_DEG * math.pi / 180 * EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 0.01)
+
+    @staticmethod
+    def _ring(ci, cj, r):
+        if r == 0:
+            yield (ci, cj)
+            return
+        for dj in range(-r, r + 1):
+            yield (ci - r, cj + dj)
+            yield (ci + r, cj + dj)
+        for di in range(-r + 1, r):
+            yield (ci + di, cj - r)
+            yield (ci + di, cj + r)
+
+    def nearest_node(self, lat, lng, max_m=1000):
+        """Closest routable node within `max_m` metres, or None."""
+        ci, cj = grid_cell(lat, lng)
+        cell_m = self._cell_metres(lat)
+        best, best_d = None, math.inf
+        for r in range(int(max_m // cell_m) + 2):
+            for cell in self._ring(ci, cj, r):
+                for i in self.node_cells.get(cell, ()):
+                    d = haversine_m(lat, lng, self.lat[i], self.lng[i])
+                    if d < best_d:
+                        best, best_d = i, d
+            if best is not None and best_d <= r * cell_m:
+                break
+        return best if best_d <= max_m else None
+
+    def segments_near(self, lat, lng, radius_m):
+        """(segment, distance in metres) for segments passing within `radius_m` (by midpoint)."""
+        ci, cj = grid_cell(lat, lng)
+        rings = int(radius_m // self._cell_metres(lat)) + 1
+        for r in range(rings + 1):
+            for cell in self._ring(ci, cj, r):
+                for s in self.seg_cells.get(cell, ()):
+                    a, b = self.seg_a[s], self.seg_b[s]
+                    mid_lat, mid_lng = (self.lat[a] + self.lat[b]) / 2, (self.lng[a] + self.lng[b]) / 2
+                    d = max(0.0, haversine_m(lat, lng, mid_lat, mid_lng) - self.seg_len[s] / 2)
+                    if d <= radius_m:
+                        yield s, d
+
+
+class RoutePlanner:
+    def __init__(self, app=None):
+        self.graph = None
+        self.half_life_days = 14.0
+        self.radius_m = 120.0
+        self.penalty = 4.0
+        self.window_days = 180
+        self.hazard = array("d")       # per segment, relative to t0
+        self.t0 = time.time()
+        self.feed = ReportFeed(self.window_days)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.half_life_days = app.config.get("ROUTING_HALF_LIFE_DAYS", self.half_life_days)
+        self.radius_m = app.config.get("ROUTING_HAZARD_RADIUS_M", self.radius_m)
+        self.penalty = app.config.get("ROUTING_HAZARD_PENALTY", self.penalty)
+        self.window_days = app.config.get("ROUTING_HAZARD_WINDOW_DAYS", self.window_days)
+        self.feed = ReportFeed(self.window_days)
+        app.extensions["routing"] = self
+        path = app.config.get("ROUTING_GRAPH_FILE")
+        if not path:
+            return
+        try:
+            started = time.perf_counter()
+            self.graph = RoadGraph.load(path)
+            log.info(f"Road graph {path}: {self.graph.node_count} nodes, "
+                     f"{self.graph.segment_count} segments in {time.perf_counter() - started:.1f}s")
+        except (OSError, ValueError, KeyError, ET.ParseError) as e:
+            log.warning(f"Route planner disabled, could not load {path}: {e}")
+            return
+        self.hazard = array("d", bytes(8 * self.graph.segment_count))
+        with app.app_context():
+            try:
+                self.refresh()
+            except SQLAlchemyError as e:
+                log.warning(f"Route hazards not loaded: {e}")
+
+    @property
+    def enabled(self):
+        return self.graph is not None
+
+    @property
+    def tau(self):
+        return self.half_life_days * 86400 / math.log(2)
+
+    # ----- hazards -----
+    def _add(self, hazard, lat, lng, category, timestamp):
+        try:
+            age_shift = (bd_to_epoch(timestamp) - self.t0) / self.tau
+        except (TypeError, ValueError):
+            return
+        weight = CATEGORY_WEIGHTS.get(category, DEFAULT_CATEGORY_WEIGHT) * math.exp(age_shift)
+        for s, d in self.graph.segments_near(lat, lng, self.radius_m):
+            hazard[s] += weight * (1 - d / self.radius_m)
+
+    def add_report(self, report):
+        """Fold a just-committed report into this worker's hazards right away."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.feed.seen(report):
+                self._add(self.hazard, report.lat, report.lng, report.category, report.timestamp)
+
+    def refresh(self):
+        """Apply reports written by any worker since the last refresh."""
+        if not self.enabled or not self.feed.stale():
+            return
+        with self._lock:
+            changes = self.feed.changes()
+            if changes is None:
+                return
+            full, rows = changes
+            if full:
+                self.t0 = time.time()
+                hazard = array("d", bytes(8 * self.graph.segment_count))
+            else:
+                hazard = self.hazard
+            for row in rows:
+                self._add(hazard, row.lat, row.lng, row.category, row.timestamp)
+            self.hazard = hazard
+
+            if time.time() - self.t0 > 20 * self.tau:
+                # Keep exp((t - t0) / tau) in range: fold the decay so far into the scores
+                factor = math.exp(-(time.time() - self.t0) / self.tau)
+                self.hazard = array("d", (h * factor for h in self.hazard))
+                self.t0 = time.time()
+
+    def hazard_now(self, segment):
+        return self.hazard[segment] * math.exp(-(time.time() - self.t0) / self.tau)
+
+    # ----- routing -----
+    def route(self, start, end, safety=1.0, snap_m=1000):
+        """Safest reasonable walking path between two (lat, lng) points."""
+        if not self.enabled:
+            raise RoutingError("Route planning is not configured")
+        try:
+            self.refresh()
+        except SQLAlchemyError as e:
+            log.warning(f"Route hazard refresh failed, using last scores: {e}")
+
+        graph = self.graph
+        source = graph.nearest_node(*start, max_m=snap_m)
+        target = graph.nearest_node(*end, max_m=snap_m)
+        if source is None or target is None:
+            raise RoutingError("Start or destination is not near a mapped street")
+
+        hazard, seg_len = self.hazard, graph.seg_len
+        offsets, targets, edge_seg = graph.offsets, graph.targets, graph.edge_seg
+        xs, ys, zs = graph.x, graph.y, graph.z
+        tx, ty, tz = xs[target], ys[target], zs[target]
+        decay = math.exp(-(time.time() - self.t0) / self.tau)
+        scale = max(0.0, safety) * self.penalty
+        exp = math.exp
+
+        def heuristic(v):
+            return EARTH_RADIUS_M * math.sqrt((xs[v] - tx) ** 2 + (ys[v] - ty) ** 2 + (zs[v] - tz) ** 2)
+
+        best = {source: 0.0}
+        previous = {}
+        heap = [(heuristic(source), 0.0, source)]
+        while heap:
+            _, cost, u = heapq.heappop(heap)
+            if u == target:
+                break
+            if cost > best[u]:
+                continue
+            for e in range(offsets[u], offsets[u + 1]):
+                v, s = targets[e], edge_seg[e]
+                h = hazard[s]
+                step = seg_len[s] * (1 + scale * (1 - exp(-h * decay))) if h and scale else seg_len[s]
+                new_cost = cost + step
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    previous[v] = (u, s)
+                    heapq.heappush(heap, (new_cost + heuristic(v), new_cost, v))
+        else:
+            if source != target:
+                raise RoutingError("No walkable route between these points")
+
+        nodes, segments = [target], []
+        while nodes[-1] != source:
+            u, s = previous[nodes[-1]]
+            nodes.append(u)
+            segments.append(s)
+        nodes.reverse()
+
+        distance = sum(seg_len[s] for s in segments)
+        exposure = sum(seg_len[s] * hazard[s] * decay for s in segments)
+        return {
+            "path": [[round(graph.lat[i], 6), round(graph.lng[i], 6)] for i in nodes],
+            "distance_m": round(distance),
+            "duration_min": round(distance / WALKING_M_PER_MIN, 1),
+            "risk": round(exposure / distance, 3) if distance else 0.0,
+            "nodes_explored": len(best),
+        }
+
+
+route_planner = RoutePlanner()
@@ -0,0 +1,157 @@
+"""Full-text search over report descriptions.
+
+On PostgreSQL, ``reports.search_vector`` is a generated ``tsvector`` column
+(``to_tsvector(SEARCH_TS_CONFIG, description)``) with a GIN index. On SQLite,
+which is used for local testing, the ``reports_fts`` FTS5 table holds the same
+words and is kept in sync by triggers. Either way the index is updated in
+the same statement as the insert, update or delete. A search is then one
+index lookup, filtered further by category, time range and bbox, ranked,
+and returned one page at a time.
+
+The migration creates these structures. ``init_app`` also creates them when
+they are missing, because databases set up with ``db.create_all()`` never
+run the migration.
+
+Query syntax follows ``websearch_to_tsquery``: words are ANDed, "quoted
+phrases" match in order, ``or`` gives alternatives and ``-word`` excludes a
+word. The SQLite fallback handles words and phrases only.
+"""
+import logging
+import re
+
+from sqlalchemy import column, func, inspect, literal_column, select, table, text
+
+from models.user import db, Report
+
+
+log = logging.getLogger(__name__)
+
+
+SEARCH_COLUMNS = (Report.id, Report.username, Report.lat, Report.lng, Report.category,
+                  Report.description, Report.timestamp, Report.confirmations)
+
+# External-content FTS5 table over reports.description, maintained by triggers
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5("
+    "description, content='reports', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS reports_fts_ai AFTER INSERT ON reports BEGIN "
+    "INSERT INTO reports_fts(rowid, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS reports_fts_ad AFTER DELETE ON reports BEGIN "
+    "INSERT INTO reports_fts(reports_fts, rowid, description) VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS reports_fts_au AFTER UPDATE OF description ON reports BEGIN "
+    "INSERT INTO reports_fts(reports_fts, rowid, description) VALUES ('delete', old.id, old.description); "
+    "INSERT INTO reports_fts(rowid, description) VALUES (new.id, new.description); END",
+)
+
+
+class SearchError(ValueError):
+    pass
+
+
+def fts5_query(q):
+    """Words and "phrases" of a search box query as an FTS5 MATCH expression (all required)."""
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\w+)', q):
+        words = re.findall(r"\w+", phrase) if phrase else [word]
+        if words:
+            terms.append('"' + " ".join(words) + '"')
+    return " AND ".join(terms)
+
+
+class ReportSearch:
+    def __init__(self, ts_config="english", max_per_page=100):
+        self.ts_config = ts_config
+        self.max_per_page = max_per_page
+
+    def init_app(self, app):
+        self.ts_config = app.config.get("SEARCH_TS_CONFIG", self.ts_config)
+        self.max_per_page = app.config.get("SEARCH_MAX_PER_PAGE", self.max_per_page)
+        if not re.fullmatch(r"\w+", self.ts_config):
+            raise SearchError(f"SEARCH_TS_CONFIG must be a text search configuration name, got {self.ts_config!r}")
+        app.extensions["report_search"] = self
+        with app.app_context():
+            self.ensure_index(db.engine)
+
+    def ensure_index(self, engine):
+        """Create the search column/table, index and triggers if this database lacks them."""
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                columns = {c["name"] for c in inspect(conn).get_columns("reports")}
+                if "search_vector" not in columns:
+                    log.info("Adding reports.search_vector and its GIN index")
+                    conn.execute(text(
+                        "ALTER TABLE reports ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+                        f"(to_tsvector('{self.ts_config}'::regconfig, coalesce(description, ''))) STORED"
+                    ))
+                    conn.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_reports_search_vector ON reports USING GIN (search_vector)"
+                    ))
+            elif conn.dialect.name == "sqlite":
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reports_fts'"
+                )).first()
+                if not exists:
+                    log.info("Creating reports_fts and filling it from reports")
+                    for statement in SQLITE_FTS_DDL:
+                        conn.execute(text(statement))
+                    conn.execute(text("INSERT INTO reports_fts(reports_fts) VALUES ('rebuild')"))
+
+    def search(self, q, category=None, start=None, end=None, bbox=None, page=1, per_page=20):
+        """One page of matching reports, best match first: {"results", "total", "page", "per_page"}."""
+        q = (q or "").strip()
+        if not q:
+            raise SearchError("q is required")
+        if page < 1 or per_page < 1:
+            raise SearchError("page and per_page must be positive")
+        per_page = min(per_page, self.max_per_page)
+
+        # Time columns hold 'YYYY-MM-DD HH:MM' strings, which compare correctly as text
+        filters = []
+        if category:
+            filters.append(Report.category == category)
+        if start:
+            filters.append(Report.timestamp >= start)
+        if end:
+            filters.append(Report.timestamp < end)
+        if bbox:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            filters += [Report.lat.between(min_lat, max_lat), Report.lng.between(min_lng, max_lng)]
+
+        dialect = db.engine.dialect.name
+        if dialect == "postgresql":
+            tsquery = func.websearch_to_tsquery(literal_column(f"'{self.ts_config}'::regconfig"), q)
+            vector = literal_column("reports.search_vector")
+            matches = vector.op("@@")(tsquery)
+            rank = func.ts_rank_cd(vector, tsquery)
+            count = select(func.count()).select_from(Report).where(matches, *filters)
+            query = select(*SEARCH_COLUMNS, rank.label("rank")).where(matches, *filters)
+        elif dialect == "sqlite":
+            match = fts5_query(q)
+            if not match:
+                raise SearchError("q has no searchable words")
+            fts = table("reports_fts", column("rowid"))
+            matches = literal_column("reports_fts").op("MATCH")(match)
+            # Matching ids come from the FTS index first; with a plain join SQLite
+            # would rather walk reports by category and probe the index per row.
+            count = select(func.count()).select_from(Report).where(
+                Report.id.in_(select(fts.c.rowid).where(matches)), *filters)
+            # bm25() is lower for better matches
+            hits = select(fts.c.rowid.label("id"), (-literal_column("bm25(reports_fts)")).label("rank")).where(
+                matches).subquery("hits")
+            rank = hits.c.rank
+            query = select(*SEARCH_COLUMNS, rank.label("rank")).join(hits, hits.c.id == Report.id).where(*filters)
+        else:
+            raise SearchError(f"Full-text search is not available on {dialect}")
+
+        total = db.session.execute(count).scalar()
+        query = query.order_by(rank.desc(), Report.id.desc())
+        rows = db.session.execute(query.limit(per_page).offset((page - 1) * per_page)).all()
+        results = []
+        for row in rows:
+            result = dict(row._mapping)
+            result["rank"] = round(float(result["rank"]), 6)
+            results.append(result)
+        return {"results": results, "total": total, "page": page, "per_page": per_page}
+
+
+report_search = ReportSearch()
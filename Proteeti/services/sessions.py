@@ -0,0 +1,277 @@
+"""Server-side sessions.
+
+Replaces Flask's signed-cookie sessions: the cookie carries only a random
+session id, the data lives in a backend, and loading a session is one
+primary-key read (skipped entirely while the session sits in a small hot
+cache). Sessions can be revoked by username, which is how admins force a
+compromised account out on every worker.
+
+Backends (``SESSION_BACKEND``):
+    database  server_sessions table (default)
+    redis     needs the redis package and ``SESSION_REDIS_URL``
+    memory    process-local, for tests
+    cookie    Flask's default signed cookie, i.e. this module is not used
+
+The hot cache is per worker, so after a revocation other workers may serve a
+cached session for up to ``SESSION_HOT_CACHE_TTL`` seconds (default 2).
+"""
+import hashlib
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import delete, select, update
+from werkzeug.datastructures import CallbackDict
+
+from models.user import db, ServerSession
+from services.cache import TTLCache
+
+
+def _session_username(data):
+    return data.get("username") or data.get("admin_username")
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.original_username = _session_username(self)
+
+
+# ======= Backends =======
+class DatabaseSessionBackend:
+    def __init__(self, purge_interval=600):
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+
+    def load(self, key, now):
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(ServerSession.data, ServerSession.expires_at).where(ServerSession.id == key)
+            ).first()
+        if row is None or row.expires_at < now:
+            return None
+        return row.data, row.expires_at
+
+    def store(self, key, payload, username, expires_at, now):
+        with db.engine.begin() as conn:
+            updated = conn.execute(
+                update(ServerSession).where(ServerSession.id == key).values(
+                    data=payload, username=username, expires_at=expires_at, updated_at=now
+                )
+            ).rowcount
+            if not updated:
+                conn.execute(ServerSession.__table__.insert().values(
+                    id=key, data=payload, username=username, expires_at=expires_at, updated_at=now
+                ))
+            if now - self._last_purge > self.purge_interval:
+                self._last_purge = now
+                conn.execute(delete(ServerSession).where(ServerSession.expires_at < now))
+
+    def touch(self, key, expires_at, now):
+        with db.engine.begin() as conn:
+            conn.execute(update(ServerSession).where(ServerSession.id == key).values(
+                expires_at=expires_at, updated_at=now
+            ))
+
+    def delete(self, key):
+        with db.engine.begin() as conn:
+            conn.execute(delete(ServerSession).where(ServerSession.id == key))
+
+    def revoke_user(self, username):
+        with db.engine.begin() as conn:
+            result = conn.execute(delete(ServerSession).where(ServerSession.username == username))
+        return result.rowcount
+
+
+class MemorySessionBackend:
+    def __init__(self):
+        self._data = {}   # key -> (payload, username, expires_at)
+        self._lock = threading.Lock()
+
+    def load(self, key, now):
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or entry[2] < now:
+            return None
+        return entry[0], entry[2]
+
+    def store(self, key, payload, username, expires_at, now):
+        with self._lock:
+            self._data[key] = (payload, username, expires_at)
+
+    def touch(self, key, expires_at, now):
+        with self._lock:
+            if key in self._data:
+                payload, username, _ = self._data[key]
+                self._data[key] = (payload, username, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def revoke_user(self, username):
+        with self._lock:
+            keys = [k for k, entry in self._data.items() if entry[1] == username]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+
+class RedisSessionBackend:
+    def __init__(self, url, prefix="proteeti:session:"):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _user_key(self, username):
+        return f"{self.prefix}user:{username}"
+
+    def load(self, key, now):
+        pipe = self.redis.pipeline()
+        pipe.get(self.prefix + key)
+        pipe.ttl(self.prefix + key)
+        payload, ttl = pipe.execute()
+        if payload is None:
+            return None
+        return payload.decode("utf-8"), now + max(ttl, 0)
+
+    def store(self, key, payload, username, expires_at, now):
+        ttl = max(int(expires_at - now), 1)
+        pipe = self.redis.pipeline()
+        pipe.setex(self.prefix + key, ttl, payload)
+        if username:
+            pipe.sadd(self._user_key(username), key)
+            pipe.expire(self._user_key(username), ttl)
+        pipe.execute()
+
+    def touch(self, key, expires_at, now):
+        self.redis.expire(self.prefix + key, max(int(expires_at - now), 1))
+
+    def delete(self, key):
+        self.redis.delete(self.prefix + key)
+
+    def revoke_user(self, username):
+        keys = [k.decode("utf-8") for k in self.redis.smembers(self._user_key(username))]
+        if keys:
+            self.redis.delete(*[self.prefix + k for k in keys])
+        self.redis.delete(self._user_key(username))
+        return len(keys)
+
+
+# ======= Flask session interface =======
+class ServerSideSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, backend, hot_cache_size=2048, hot_cache_ttl=2.0, touch_interval=300):
+        self.backend = backend
+        self.hot_cache = TTLCache(maxsize=hot_cache_size, ttl=hot_cache_ttl)
+        self.touch_interval = touch_interval
+
+    @staticmethod
+    def _key(sid):
+        return hashlib.sha256(sid.encode("utf-8")).hexdigest()
+
+    def _lifetime(self, app):
+        lifetime = app.permanent_session_lifetime
+        return lifetime.total_seconds() if isinstance(lifetime, timedelta) else float(lifetime)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or len(sid) > 64:
+            return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+        key = self._key(sid)
+        cached = self.hot_cache.get(key)
+        if cached is not None:
+            data, expires_at = cached
+        else:
+            loaded = self.backend.load(key, time.time())
+            if loaded is None:
+                return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+            payload, expires_at = loaded
+            data = self.serializer.loads(payload)
+            self.hot_cache.set(key, (data, expires_at))
+
+        session = ServerSideSession(dict(data), sid=sid)
+        session.expires_at = expires_at
+        return session
+
+    def save_session(self, app, session, response):
+        cookie_name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        now = time.time()
+
+        if not session:
+            if not session.new:
+                key = self._key(session.sid)
+                self.backend.delete(key)
+                self.hot_cache.pop(key)
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+
+        # New identity (login / logout-login): rotate the id to prevent fixation
+        if not session.new and _session_username(session) != session.original_username:
+            old_key = self._key(session.sid)
+            self.backend.delete(old_key)
+            self.hot_cache.pop(old_key)
+            session.sid = secrets.token_urlsafe(32)
+            session.new = True
+
+        key = self._key(session.sid)
+        expires_at = now + self._lifetime(app)
+        if session.new or session.modified:
+            payload = self.serializer.dumps(dict(session))
+            self.backend.store(key, payload, _session_username(session), expires_at, now)
+            self.hot_cache.set(key, (dict(session), expires_at))
+        elif getattr(session, "expires_at", expires_at) < expires_at - self.touch_interval:
+            # Sliding expiry without rewriting the data on every request
+            self.backend.touch(key, expires_at, now)
+            self.hot_cache.pop(key)
+        else:
+            return
+
+        response.set_cookie(
+            cookie_name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def revoke_user(self, username):
+        """Delete every session belonging to `username`. Returns how many were removed."""
+        self.hot_cache.clear()
+        return self.backend.revoke_user(username)
+
+
+def init_sessions(app):
+    """Install the configured backend. Returns the interface, or None for cookie sessions."""
+    kind = app.config.get("SESSION_BACKEND", "database")
+    if kind == "cookie":
+        return None
+    if kind == "memory":
+        backend = MemorySessionBackend()
+    elif kind == "redis":
+        backend = RedisSessionBackend(app.config["SESSION_REDIS_URL"])
+    else:
+        backend = DatabaseSessionBackend()
+
+    interface = ServerSideSessionInterface(
+        backend,
+        hot_cache_size=app.config.get("SESSION_HOT_CACHE_SIZE", 2048),
+        hot_cache_ttl=app.config.get("SESSION_HOT_CACHE_TTL", 2.0),
+    )
+    app.session_interface = interface
+    return interface
@@ -0,0 +1,364 @@
+"""Escalation of SOS alerts that nobody has acknowledged.
+
+After the first emails, an active alert works through the steps of
+``SOS_ESCALATION_STEPS``. Each step is ``action:minutes``, with the minutes
+counted from the previous step. The actions are:
+
+    renotify    email the primary trusted contacts again
+    secondary   widen to the secondary contacts as well
+    admins      flag the alert for admins (highlighted on the dashboard,
+                and ``SOS_ADMIN_EMAILS`` is mailed)
+
+After the last step, everyone is reminded every ``SOS_ESCALATION_REPEAT_MIN``
+minutes. This stops when the alert is acknowledged or resolved, or after
+``SOS_ESCALATION_MAX_HOURS``. An alert is acknowledged by a contact through
+the link in the emails, or by its owner or an admin.
+
+The level reached and the time of the next step are stored on the alert row
+(``escalation_level``, ``next_escalation_at``), so a restart loses nothing.
+Timers sit in a heap and one thread sleeps until the earliest is due. At
+startup, and then every ``SOS_ESCALATION_RESCAN_SEC`` seconds, each worker
+re-reads the alerts due before its next rescan through the index on
+``next_escalation_at``. Alerts raised on another worker, or whose timers
+died with one, are therefore picked up within one rescan. Several workers
+can hold a timer for the same alert. A step is claimed with a conditional
+UPDATE on (id, escalation_level), so only one worker sends it, and the
+others pick up the new schedule from the row. A step only counts once an
+email of it has been delivered: when the notifier reaches nobody, the claim
+is undone and the same step is retried a minute later.
+
+Where no process outlives its requests (serverless), nothing holds the
+timers: run ``escalate_sos.py`` from cron, or point a scheduler at
+``/api/cron/sos-escalation``, to send every step that is due (``run_due``).
+Vercel Cron can only do that every minute on a paid plan (Hobby allows one
+run a day), so on Hobby use an external pinger. As a fallback, with
+``SOS_ESCALATION_ON_TRACK`` the location updates an open SOS page posts
+every few seconds also run the due step of their alert (``escalate_if_due``).
+"""
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select, update
+
+from models.user import db, SOSAlert, User, bd_now, bd_to_epoch
+from services.http_cache import bump_data_version
+
+
+ACTIONS = ("renotify", "secondary", "admins")
+REPEAT = "repeat"
+RETRY_MS = 60000   # a step that reached nobody is tried again after this long
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def parse_steps(value):
+    """'renotify:5,secondary:10' -> [('renotify', 5.0), ('secondary', 10.0)]"""
+    steps = []
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        action, _, minutes = part.partition(":")
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown SOS escalation action '{action}'")
+        steps.append((action, float(minutes)))
+    return steps
+
+
+def is_secondary(contact):
+    return str(contact.get("tier", "")).lower() == "secondary" or contact.get("secondary") is True
+
+
+def primary_contacts(user):
+    """Contacts alerted straight away; everyone if none are marked secondary-only."""
+    contacts = [c for c in user.trusted_contacts or [] if c.get("email")]
+    primary = [c for c in contacts if not is_secondary(c)]
+    return primary or contacts
+
+
+def all_contacts(user):
+    return [c for c in user.trusted_contacts or [] if c.get("email")]
+
+
+class SOSEscalator:
+    def __init__(self, app=None):
+        self.app = None
+        self.notifier = None
+        self.steps = parse_steps("renotify:5,secondary:10,admins:15")
+        self.repeat_min = 15.0
+        self.max_hours = 12.0
+        self.rescan_sec = 60.0
+        self.enabled = True
+        self._heap = []          # (due_ms, alert_id, level)
+        self._timers = {}        # alert_id -> (due_ms, level), the live entry for each alert
+        self._wakeup = threading.Condition()
+        self._next_rescan = 0.0  # monotonic
+        self._thread = None
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, notifier=None):
+        """`notifier(alert, user, level, contacts, flag_admins)` sends the emails for one step and
+        returns how many were delivered (None when there was nobody to email)."""
+        self.app = app
+        self.notifier = notifier
+        self.steps = parse_steps(app.config.get("SOS_ESCALATION_STEPS", "renotify:5,secondary:10,admins:15"))
+        self.repeat_min = app.config.get("SOS_ESCALATION_REPEAT_MIN", self.repeat_min)
+        self.max_hours = app.config.get("SOS_ESCALATION_MAX_HOURS", self.max_hours)
+        self.rescan_sec = app.config.get("SOS_ESCALATION_RESCAN_SEC", self.rescan_sec)
+        self.enabled = app.config.get("SOS_ESCALATION_ENABLED", True) and bool(self.steps)
+        app.extensions["sos_escalation"] = self
+        if not self.enabled or self._thread is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=app.config.get("SOS_ESCALATION_WORKERS", 4),
+                                            thread_name_prefix="sos-escalation")
+        with app.app_context():
+            try:
+                self.recover()
+            except Exception as e:
+                self.app.logger.warning(f"SOS escalation state not loaded: {e}")
+        self._next_rescan = time.monotonic() + self.rescan_sec
+        self._thread = threading.Thread(target=self._run, name="sos-escalation-timer", daemon=True)
+        self._thread.start()
+
+    # ----- schedule -----
+    def action(self, level):
+        """What the step taking an alert from `level` to `level + 1` does."""
+        return self.steps[level][0] if level < len(self.steps) else REPEAT
+
+    def recipients(self, action, user):
+        """(contacts to email, whether admins are flagged) for one step."""
+        if action == "renotify":
+            return primary_contacts(user), False
+        if action == "secondary":
+            return all_contacts(user), False
+        if action == "admins":
+            return [], True
+        return all_contacts(user), any(step == "admins" for step, _ in self.steps)
+
+    def interval_ms(self, level):
+        minutes = self.steps[level][1] if level < len(self.steps) else self.repeat_min
+        return int(minutes * 60000)
+
+    def first_due(self):
+        """next_escalation_at for a new alert, or None when escalation is off."""
+        return now_ms() + self.interval_ms(0) if self.enabled else None
+
+    def due_after(self, alert, level, previous_due):
+        """When step `level` is due, or None once the alert has escalated for max_hours."""
+        due = previous_due + self.interval_ms(level)
+        try:
+            raised_at = bd_to_epoch(alert.created_at) * 1000
+        except (TypeError, ValueError):
+            raised_at = previous_due
+        return due if due - raised_at <= self.max_hours * 3600000 else None
+
+    # ----- timers -----
+    def track(self, alert_id, due_ms, level):
+        """Set (or move) the timer of an alert."""
+        if not self.enabled or due_ms is None:
+            return
+        with self._wakeup:
+            if self._timers.get(alert_id) == (due_ms, level):
+                return
+            self._timers[alert_id] = (due_ms, level)
+            heapq.heappush(self._heap, (due_ms, alert_id, level))
+            if self._heap[0][1] == alert_id:
+                self._wakeup.notify()
+
+    def cancel(self, alert_id):
+        # The heap entry stays and is skipped when it comes up
+        with self._wakeup:
+            self._timers.pop(alert_id, None)
+
+    def pending(self):
+        with self._wakeup:
+            return len(self._timers)
+
+    def waiting(self, until_ms=None):
+        """(id, next_escalation_at, escalation_level) of alerts waiting for a step, optionally only those due by `until_ms`."""
+        due = SOSAlert.next_escalation_at.isnot(None) if until_ms is None else SOSAlert.next_escalation_at <= until_ms
+        return db.session.execute(
+            select(SOSAlert.id, SOSAlert.next_escalation_at, SOSAlert.escalation_level).where(
+                due,
+                SOSAlert.status == "active",
+                SOSAlert.acknowledged_at.is_(None),
+            ).order_by(SOSAlert.next_escalation_at)
+        ).all()
+
+    def recover(self, until_ms=None):
+        """Load the timers of alerts still waiting for a step (due by `until_ms` if given)."""
+        rows = self.waiting(until_ms)
+        with self._wakeup:
+            new = sum(1 for row in rows if row.id not in self._timers)
+        for row in rows:
+            self.track(row.id, row.next_escalation_at, row.escalation_level)
+        if new:
+            self.app.logger.info(f"Recovered {new} SOS escalation timers")
+
+    def escalate_if_due(self, alert_id):
+        """Run the step of one alert if it is due; returns the action taken or None."""
+        if not self.enabled:
+            return None
+        row = db.session.execute(
+            select(SOSAlert.escalation_level).where(
+                SOSAlert.id == alert_id,
+                SOSAlert.next_escalation_at <= now_ms(),
+                SOSAlert.status == "active",
+                SOSAlert.acknowledged_at.is_(None),
+            )
+        ).first()
+        return self.escalate(alert_id, row.escalation_level) if row else None
+
+    def run_due(self):
+        """Send every step that is due now; for cron when no worker keeps timers. Returns the actions taken."""
+        actions = []
+        if not self.enabled:
+            return actions
+        for row in self.waiting(now_ms()):
+            try:
+                action = self.escalate(row.id, row.escalation_level)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"SOS escalation of alert {row.id} failed: {e}")
+                continue
+            if action:
+                actions.append(action)
+        return actions
+
+    def _next_due_timer(self):
+        """Block until a timer is due, then remove and return it; None when a rescan is due."""
+        with self._wakeup:
+            while True:
+                while self._heap:
+                    due, alert_id, level = self._heap[0]
+                    if self._timers.get(alert_id) == (due, level):
+                        break
+                    heapq.heappop(self._heap)     # cancelled or moved
+                rescan_in = self._next_rescan - time.monotonic()
+                if rescan_in <= 0:
+                    self._next_rescan = time.monotonic() + self.rescan_sec
+                    return None
+                if not self._heap:
+                    self._wakeup.wait(rescan_in)
+                    continue
+                due, alert_id, level = self._heap[0]
+                wait = (due - now_ms()) / 1000
+                if wait > 0:
+                    self._wakeup.wait(min(wait, rescan_in))
+                    continue
+                heapq.heappop(self._heap)
+                del self._timers[alert_id]
+                return alert_id, level
+
+    def _run(self):
+        while True:
+            timer = self._next_due_timer()
+            if timer is None:
+                self._executor.submit(self._rescan)
+            else:
+                self._executor.submit(self._fire, *timer)
+
+    def _rescan(self):
+        with self.app.app_context():
+            try:
+                self.recover(now_ms() + int(self.rescan_sec * 1000))
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.warning(f"SOS escalation rescan failed: {e}")
+
+    def _fire(self, alert_id, level):
+        with self.app.app_context():
+            try:
+                self.escalate(alert_id, level)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.warning(f"SOS escalation of alert {alert_id} failed, retrying in a minute: {e}")
+                self.track(alert_id, now_ms() + 60000, level)
+
+    # ----- steps -----
+    def escalate(self, alert_id, level):
+        """Run the step for an alert at `level` if it is still due; returns the action taken or None."""
+        alert = db.session.get(SOSAlert, alert_id)
+        if alert is None or alert.status != "active" or alert.acknowledged_at or alert.next_escalation_at is None:
+            return None
+        if alert.escalation_level != level or alert.next_escalation_at > now_ms():
+            # Another worker took this step, or the schedule moved: follow the row
+            self.track(alert.id, alert.next_escalation_at, alert.escalation_level)
+            return None
+
+        action = self.action(level)
+        next_due = self.due_after(alert, level + 1, alert.next_escalation_at)
+        claimed = db.session.execute(
+            update(SOSAlert).where(
+                SOSAlert.id == alert_id,
+                SOSAlert.status == "active",
+                SOSAlert.acknowledged_at.is_(None),
+                SOSAlert.escalation_level == level,
+            ).values(escalation_level=level + 1, next_escalation_at=next_due),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            db.session.refresh(alert)
+            if alert.status == "active" and not alert.acknowledged_at:
+                self.track(alert.id, alert.next_escalation_at, alert.escalation_level)
+            return None
+        bump_data_version("sos_alerts")
+
+        db.session.refresh(alert)
+        user = db.session.get(User, alert.user_id)
+        self.app.logger.info(f"SOS alert {alert_id} unacknowledged: escalation level {level + 1} ({action})")
+        if self.notifier is not None and user is not None:
+            contacts, flag_admins = self.recipients(action, user)
+            if self.notifier(alert, user, level + 1, contacts, flag_admins) == 0:
+                return self._retry(alert, level)
+        self.track(alert_id, next_due, level + 1)
+        return action
+
+    def _retry(self, alert, level):
+        """Give back a claimed step whose emails all failed, so it runs again shortly."""
+        retry_at = now_ms() + RETRY_MS
+        try:
+            if retry_at - bd_to_epoch(alert.created_at) * 1000 > self.max_hours * 3600000:
+                retry_at = None
+        except (TypeError, ValueError):
+            pass
+        released = db.session.execute(
+            update(SOSAlert).where(
+                SOSAlert.id == alert.id,
+                SOSAlert.status == "active",
+                SOSAlert.acknowledged_at.is_(None),
+                SOSAlert.escalation_level == level + 1,
+            ).values(escalation_level=level, next_escalation_at=retry_at),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.session.commit()
+        if released:
+            bump_data_version("sos_alerts")
+            self.app.logger.warning(f"SOS escalation {level + 1} of alert {alert.id} reached nobody, "
+                                    f"retrying in {RETRY_MS // 1000} s")
+            self.track(alert.id, retry_at, level)
+        return None
+
+    def acknowledge(self, alert, by):
+        """Stop escalating an alert. Commits; False if it was already acknowledged or not active."""
+        acknowledged = db.session.execute(
+            update(SOSAlert).where(
+                SOSAlert.id == alert.id,
+                SOSAlert.status == "active",
+                SOSAlert.acknowledged_at.is_(None),
+            ).values(acknowledged_at=bd_now(), acknowledged_by=(by or "")[:120], next_escalation_at=None),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.session.commit()
+        self.cancel(alert.id)
+        if acknowledged:
+            bump_data_version("sos_alerts")
+            db.session.refresh(alert)
+        return bool(acknowledged)
+
+
+sos_escalator = SOSEscalator()
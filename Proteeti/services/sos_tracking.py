@@ -0,0 +1,240 @@
+"""Live location tracking for active SOS alerts.
+
+Position updates are checked against a small cache of alert state, buffered in
+memory and written to ``sos_track_points`` with one executemany insert per
+flush, so an update never loads ORM objects. Viewers (the owner, admins and
+trusted contacts holding a tracking token) read a snapshot that is rebuilt at
+most once per ``SOS_TRACK_VIEW_INTERVAL`` seconds per alert, however many of
+them are polling. Both caches are bounded LRUs (``SOS_TRACK_CACHE_SIZE`` alerts).
+
+Buffered points reach the database within ``SOS_TRACK_FLUSH_INTERVAL``
+seconds, or at exit. A serverless function can be frozen between requests
+with points still buffered, so there (and whenever the interval is 0) each
+update is written before the request returns. While the database is
+unreachable the buffer keeps at most ``SOS_TRACK_PENDING_MAX`` points,
+dropping the oldest first: the latest position is what a responder needs.
+
+``sos_track_points`` is keyed on (alert_id, recorded_at), so one alert's trail
+is a single index range. It is not partitioned: its rows are deleted with
+their alert when the month is archived (services/partitions.py).
+"""
+import atexit
+import heapq
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models.user import db, SOSAlert, SOSTrackPoint
+from services.cache import TTLCache
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class SOSTracker:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pending = {}      # (alert_id, recorded_at) -> row
+        self._alerts = TTLCache()       # alert_id -> (username, status)
+        self._snapshots = TTLCache()    # alert_id -> snapshot
+        self._flusher = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_size = app.config.get("SOS_TRACK_FLUSH_SIZE", 200)
+        self.flush_interval = app.config.get("SOS_TRACK_FLUSH_INTERVAL", 2.0)
+        self.pending_max = max(app.config.get("SOS_TRACK_PENDING_MAX", 50000), self.flush_size)
+        self.view_interval = app.config.get("SOS_TRACK_VIEW_INTERVAL", 5.0)
+        self.view_points = app.config.get("SOS_TRACK_VIEW_POINTS", 120)
+        self.alert_cache_ttl = app.config.get("SOS_TRACK_ALERT_CACHE_TTL", 30.0)
+        cache_size = app.config.get("SOS_TRACK_CACHE_SIZE", 10000)
+        self._alerts = TTLCache(maxsize=cache_size, ttl=self.alert_cache_ttl)
+        self._snapshots = TTLCache(maxsize=cache_size, ttl=self.view_interval)
+        app.extensions["sos_tracker"] = self
+
+        if self.flush_interval > 0 and self._flusher is None:
+            self._flusher = threading.Thread(target=self._run, name="sos-track-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    # ----- alert state -----
+    def alert_state(self, alert_id):
+        """Return (username, status) for an alert, or None if it does not exist."""
+        cached = self._alerts.get(alert_id)
+        if cached:
+            return cached
+
+        row = db.session.execute(
+            select(SOSAlert.username, SOSAlert.status).where(SOSAlert.id == alert_id)
+        ).first()
+        if row is None:
+            self._alerts.pop(alert_id, None)
+            return None
+        self._alerts.set(alert_id, (row.username, row.status))
+        return row.username, row.status
+
+    def forget_alert(self, alert_id):
+        """Drop cached state after an alert changes status (e.g. resolved)."""
+        self._alerts.pop(alert_id, None)
+        self._snapshots.pop(alert_id, None)
+
+    # ----- write path -----
+    def record(self, alert_id, points):
+        """Queue position updates for an alert. Returns the number accepted."""
+        now = now_ms()
+        rows = []
+        for point in points:
+            try:
+                lat = float(point.get("lat", point.get("latitude")))
+                lng = float(point.get("lng", point.get("longitude")))
+            except (TypeError, ValueError, AttributeError):
+                continue
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                continue
+
+            recorded_at = point.get("recorded_at") or point.get("ts")
+            try:
+                recorded_at = int(recorded_at)
+            except (TypeError, ValueError):
+                recorded_at = now
+            # Device clocks drift; never accept points from the future
+            recorded_at = min(recorded_at, now)
+
+            accuracy = point.get("accuracy")
+            try:
+                accuracy = float(accuracy) if accuracy is not None else None
+            except (TypeError, ValueError):
+                accuracy = None
+
+            rows.append({
+                "alert_id": alert_id,
+                "recorded_at": recorded_at,
+                "lat": lat,
+                "lng": lng,
+                "accuracy": accuracy,
+            })
+
+        if not rows:
+            return 0
+
+        with self._lock:
+            for row in rows:
+                self._pending[(row["alert_id"], row["recorded_at"])] = row
+            dropped = self._trim()
+            should_flush = self.flush_interval <= 0 or len(self._pending) >= self.flush_size
+
+        if dropped:
+            self.app.logger.warning(f"SOS track buffer full, dropped the {dropped} oldest points")
+        if should_flush:
+            self.flush()
+        return len(rows)
+
+    def _insert_statement(self, dialect_name):
+        table = SOSTrackPoint.__table__
+        if dialect_name == "postgresql":
+            return postgresql.insert(table).on_conflict_do_nothing()
+        if dialect_name == "sqlite":
+            return sqlite.insert(table).on_conflict_do_nothing()
+        return table.insert()
+
+    def flush(self):
+        """Write all buffered points in a single batched insert."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            rows = list(self._pending.values())
+            self._pending = {}
+
+        try:
+            with self.app.app_context():
+                engine = db.engine
+                with engine.begin() as conn:
+                    conn.execute(self._insert_statement(engine.dialect.name), rows)
+        except Exception as e:
+            # Put the batch back so the next flush retries it
+            with self._lock:
+                for row in rows:
+                    self._pending.setdefault((row["alert_id"], row["recorded_at"]), row)
+                dropped = self._trim()
+            self.app.logger.warning(f"SOS track flush failed ({len(rows)} points"
+                                    f"{f', dropped the {dropped} oldest' if dropped else ''}): {e}")
+            return 0
+        return len(rows)
+
+    def _trim(self):
+        """Drop the oldest buffered points beyond `pending_max`; caller holds the lock."""
+        excess = len(self._pending) - self.pending_max
+        if excess <= 0:
+            return 0
+        for key in heapq.nsmallest(excess, self._pending, key=lambda key: key[1]):
+            del self._pending[key]
+        return excess
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    # ----- read path -----
+    def _pending_for(self, alert_id):
+        with self._lock:
+            return [row for (aid, _), row in self._pending.items() if aid == alert_id]
+
+    def snapshot(self, alert_id, since=None):
+        """Latest position and recent trail, rebuilt at most once per view interval."""
+        snap = self._snapshots.get(alert_id)
+        if snap is None:
+            state = self.alert_state(alert_id)
+            rows = db.session.execute(
+                select(
+                    SOSTrackPoint.recorded_at,
+                    SOSTrackPoint.lat,
+                    SOSTrackPoint.lng,
+                    SOSTrackPoint.accuracy,
+                )
+                .where(SOSTrackPoint.alert_id == alert_id)
+                .order_by(SOSTrackPoint.recorded_at.desc())
+                .limit(self.view_points)
+            ).all()
+            trail = {
+                r.recorded_at: {"recorded_at": r.recorded_at, "lat": r.lat, "lng": r.lng, "accuracy": r.accuracy}
+                for r in rows
+            }
+            for row in self._pending_for(alert_id):
+                trail[row["recorded_at"]] = {k: row[k] for k in ("recorded_at", "lat", "lng", "accuracy")}
+            points = [trail[ts] for ts in sorted(trail)][-self.view_points:]
+
+            latest = points[-1] if points else None
+            if latest is None:
+                # No updates yet: fall back to the position the alert was raised at
+                origin = db.session.execute(
+                    select(SOSAlert.lat, SOSAlert.lng, SOSAlert.accuracy).where(SOSAlert.id == alert_id)
+                ).first()
+                if origin is not None:
+                    latest = {"recorded_at": None, "lat": origin.lat, "lng": origin.lng, "accuracy": origin.accuracy}
+
+            snap = {
+                "alert_id": alert_id,
+                "status": state[1] if state else None,
+                "latest": latest,
+                "points": points,
+                "generated_at": now_ms(),
+                "next_poll_ms": int(self.view_interval * 1000),
+            }
+            self._snapshots.set(alert_id, snap)
+
+        if since is None:
+            return snap
+        return dict(snap, points=[p for p in snap["points"] if p["recorded_at"] > since])
+
+
+sos_tracker = SOSTracker()
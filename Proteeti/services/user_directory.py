@@ -0,0 +1,132 @@
+"""Server-side user listing for the admin dashboard.
+
+Every predicate has an index behind it:
+
+    q            case-insensitive prefix of username or email, as a range on
+                 lower(username) / lower(email) (ix_users_*_lower)
+    verified     ix_users_verified_created_at, which also serves the default order
+    city         users.city, a copy of profile["city"]
+    joined_from / joined_to   created_at ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM')
+
+Pages use keyset pagination: the cursor holds the sort value and id of the
+last row shown, so page 1000 costs the same as page 1 and rows inserted
+meanwhile never shift a page. Rows with no sort value (created_at is
+nullable) come last in either order; their cursor holds a null value.
+"""
+import base64
+import json
+
+from sqlalchemy import and_, func, or_, select
+
+from models.user import User
+
+
+SORTS = {
+    "created_at": User.created_at,
+    "username": User.username,
+    "email": User.email,
+}
+MAX_LIMIT = 200
+
+# Past the last character any username or email can contain
+PREFIX_END = "\uffff"
+
+
+class UserQueryError(ValueError):
+    pass
+
+
+def encode_cursor(value, user_id):
+    return base64.urlsafe_b64encode(json.dumps([value, user_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        value, user_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if value is not None and not isinstance(value, str):
+            raise TypeError(value)
+        return value, int(user_id)
+    except (ValueError, TypeError):
+        raise UserQueryError("Invalid cursor")
+
+
+def parse_verified(value):
+    if value in (None, ""):
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise UserQueryError("verified must be true or false")
+
+
+def prefix_match(column, prefix):
+    lowered = func.lower(column)
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    # The range can use the lower() index; LIKE drops the odd row a collation sorts into it
+    return and_(lowered >= prefix, lowered < prefix + PREFIX_END, lowered.like(escaped + "%", escape="\\"))
+
+
+def build_query(q=None, verified=None, city=None, joined_from=None, joined_to=None,
+                sort="created_at", order="desc", cursor=None, limit=50):
+    if sort not in SORTS:
+        raise UserQueryError(f"sort must be one of {', '.join(SORTS)}")
+    if order not in ("asc", "desc"):
+        raise UserQueryError("order must be asc or desc")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise UserQueryError(f"limit must be between 1 and {MAX_LIMIT}")
+
+    query = select(User.id, User.username, User.email, User.verified, User.city,
+                   User.created_at, User.trusted_contacts)
+    q = (q or "").strip().lower()
+    if q:
+        query = query.where(or_(prefix_match(User.username, q), prefix_match(User.email, q)))
+    if verified is True:
+        query = query.where(User.verified.is_(True))
+    elif verified is False:
+        query = query.where(or_(User.verified.is_(False), User.verified.is_(None)))
+    if city:
+        query = query.where(User.city == city)
+    # Time columns hold 'YYYY-MM-DD HH:MM' strings, which compare correctly as text
+    if joined_from:
+        query = query.where(User.created_at >= joined_from)
+    if joined_to:
+        query = query.where(User.created_at < joined_to)
+
+    key = SORTS[sort]
+    if cursor:
+        value, user_id = decode_cursor(cursor)
+        after_id = User.id < user_id if order == "desc" else User.id > user_id
+        if value is None:
+            # Already into the NULLs, which come last either way
+            query = query.where(key.is_(None), after_id)
+        else:
+            after = key < value if order == "desc" else key > value
+            query = query.where(or_(after, and_(key == value, after_id), key.is_(None)))
+    if order == "desc":
+        query = query.order_by(key.desc().nulls_last(), User.id.desc())
+    else:
+        query = query.order_by(key.asc().nulls_last(), User.id.asc())
+    # One extra row tells whether there is a next page
+    return query.limit(limit + 1)
+
+
+def page_of_users(session, sort="created_at", limit=50, **filters):
+    """{"users": [...], "next_cursor": str or None} for one page of the admin user list."""
+    rows = session.execute(build_query(sort=sort, limit=limit, **filters)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    users = [{
+        "id": r.id,
+        "username": r.username,
+        "email": r.email,
+        "verified": bool(r.verified),
+        "city": r.city,
+        "trusted_contacts_count": len(r.trusted_contacts or []),
+        "created_at": r.created_at,
+    } for r in rows]
+    next_cursor = None
+    if more:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort), last.id)
+    return {"users": users, "next_cursor": next_cursor}
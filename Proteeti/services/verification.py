@@ -0,0 +1,225 @@
+"""Server-side store for pending email verifications.
+
+Registration used to keep the plaintext password and the code in the cookie
+session, with no expiry and no limit on guesses or resends. Pending sign-ups
+now live here: the password is stored as its bcrypt hash, the code as an
+HMAC, and every record expires after ``VERIFICATION_TTL`` seconds. Wrong
+guesses are counted, and code sends are limited per email and per client IP
+so resend loops cannot drain the SMTP quota that SOS mail depends on.
+
+Two backends share the logic: the database (default, shared by all workers)
+and an in-memory one for tests and single-process local runs
+(``VERIFICATION_STORE=memory``).
+"""
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import delete, func, select
+
+from models.user import db, PendingVerification
+
+
+def generate_code():
+    return f"{secrets.randbelow(1000000):06d}"
+
+
+class VerificationStore:
+    """Database backed store (pending_verifications table)."""
+
+    def __init__(self, secret_key, ttl=600, max_attempts=5, email_sends=3, ip_sends=10,
+                 send_window=3600, resend_interval=60):
+        self.secret_key = secret_key.encode("utf-8")
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.email_sends = email_sends          # code emails per address per window
+        self.ip_sends = ip_sends                # code emails per client IP per window
+        self.send_window = send_window
+        self.resend_interval = resend_interval  # minimum gap between two sends to one address
+
+    @classmethod
+    def from_config(cls, config):
+        kwargs = dict(
+            secret_key=config["SECRET_KEY"],
+            ttl=config.get("VERIFICATION_TTL", 600),
+            max_attempts=config.get("VERIFICATION_MAX_ATTEMPTS", 5),
+            email_sends=config.get("VERIFICATION_EMAIL_SENDS", 3),
+            ip_sends=config.get("VERIFICATION_IP_SENDS", 10),
+            send_window=config.get("VERIFICATION_SEND_WINDOW", 3600),
+            resend_interval=config.get("VERIFICATION_RESEND_INTERVAL", 60),
+        )
+        if config.get("VERIFICATION_STORE") == "memory":
+            return MemoryVerificationStore(**kwargs)
+        return cls(**kwargs)
+
+    def hash_code(self, email, code):
+        return hmac.new(self.secret_key, f"{email.lower()}:{code}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    # ----- persistence (overridden by the memory backend) -----
+    def _get(self, email):
+        return db.session.execute(
+            select(PendingVerification).where(PendingVerification.email == email)
+        ).scalar_one_or_none()
+
+    def _new(self, **fields):
+        record = PendingVerification(**fields)
+        db.session.add(record)
+        return record
+
+    def _save(self, record):
+        db.session.commit()
+
+    def _delete(self, record):
+        db.session.delete(record)
+        db.session.commit()
+
+    def _ip_send_count(self, ip, since):
+        return db.session.execute(
+            select(func.coalesce(func.sum(PendingVerification.send_count), 0)).where(
+                PendingVerification.ip == ip,
+                PendingVerification.window_started_at > since,
+            )
+        ).scalar()
+
+    def _purge_expired(self, now):
+        # Keep expired rows that still count toward the send window
+        db.session.execute(delete(PendingVerification).where(
+            PendingVerification.expires_at < now,
+            PendingVerification.window_started_at <= now - self.send_window,
+        ))
+
+    # ----- public API -----
+    def start(self, email, username, password_hash, ip=None):
+        """Create or refresh a pending sign-up. Returns (code, None) or (None, error)."""
+        now = int(time.time())
+        self._purge_expired(now)
+
+        record = self._get(email)
+        error = self._start_error(record, ip, now)
+        if error:
+            return None, error
+        if record is None:
+            code = generate_code()
+            self._new(
+                email=email, username=username, password_hash=password_hash,
+                code_hash=self.hash_code(email, code), attempts=0, send_count=1,
+                window_started_at=now, last_sent_at=now, expires_at=now + self.ttl, ip=ip,
+            )
+            self._save(None)
+            return code, None
+
+        record.username = username
+        record.password_hash = password_hash
+        return self._issue(record, ip, now), None
+
+    def start_error(self, email, ip=None):
+        """The limit start() would refuse with, or None. Cheap, so callers run it before hashing the password."""
+        return self._start_error(self._get(email), ip, int(time.time()))
+
+    def _start_error(self, record, ip, now):
+        if record is None:
+            if ip and self._ip_send_count(ip, now - self.send_window) >= self.ip_sends:
+                return "Too many verification requests from your network. Please try again later."
+            return None
+        return self._check_send_limits(record, ip, now)
+
+    def resend(self, email, ip=None):
+        now = int(time.time())
+        record = self._get(email)
+        if record is None or record.expires_at < now:
+            return None, "Verification has expired. Please register again."
+        error = self._check_send_limits(record, ip, now)
+        if error:
+            return None, error
+        return self._issue(record, ip, now), None
+
+    def _check_send_limits(self, record, ip, now):
+        if now - record.last_sent_at < self.resend_interval:
+            return "Please wait a minute before requesting another code."
+        if now - record.window_started_at < self.send_window and record.send_count >= self.email_sends:
+            return "Too many codes sent to this address. Please try again later."
+        if ip and self._ip_send_count(ip, now - self.send_window) >= self.ip_sends:
+            return "Too many verification requests from your network. Please try again later."
+        return None
+
+    def _issue(self, record, ip, now):
+        code = generate_code()
+        if now - record.window_started_at >= self.send_window:
+            record.window_started_at = now
+            record.send_count = 0
+        record.send_count += 1
+        record.code_hash = self.hash_code(record.email, code)
+        record.attempts = 0
+        record.last_sent_at = now
+        record.expires_at = now + self.ttl
+        record.ip = ip or record.ip
+        self._save(record)
+        return code
+
+    def verify(self, email, code):
+        """Check a code. Returns (record, None) on success, consuming it, or (None, error)."""
+        now = int(time.time())
+        record = self._get(email)
+        if record is None:
+            return None, "Verification not found. Please register again."
+        if record.expires_at < now:
+            self._delete(record)
+            return None, "Verification code expired. Please register again."
+        if record.attempts >= self.max_attempts:
+            return None, "Too many incorrect attempts. Please request a new code."
+
+        if not hmac.compare_digest(record.code_hash, self.hash_code(email, code.strip())):
+            record.attempts += 1
+            self._save(record)
+            remaining = self.max_attempts - record.attempts
+            if remaining <= 0:
+                return None, "Too many incorrect attempts. Please request a new code."
+            return None, f"Verification code incorrect. {remaining} attempt(s) left."
+
+        result = SimpleNamespace(email=record.email, username=record.username, password_hash=record.password_hash)
+        self._delete(record)
+        return result, None
+
+    def discard(self, email):
+        record = self._get(email)
+        if record is not None:
+            self._delete(record)
+
+
+class MemoryVerificationStore(VerificationStore):
+    """Process-local stand-in for tests and single-process development."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def _get(self, email):
+        with self._lock:
+            return self._records.get(email)
+
+    def _new(self, **fields):
+        record = SimpleNamespace(**fields)
+        with self._lock:
+            self._records[record.email] = record
+        return record
+
+    def _save(self, record):
+        pass
+
+    def _delete(self, record):
+        with self._lock:
+            self._records.pop(record.email, None)
+
+    def _ip_send_count(self, ip, since):
+        with self._lock:
+            return sum(r.send_count for r in self._records.values() if r.ip == ip and r.window_started_at > since)
+
+    def _purge_expired(self, now):
+        cutoff = now - self.send_window
+        with self._lock:
+            for email in [e for e, r in self._records.items() if r.expires_at < now and r.window_started_at <= cutoff]:
+                del self._records[email]
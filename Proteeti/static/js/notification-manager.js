@@ -20,7 +20,7 @@ class NotificationManager {
 
   async registerServiceWorker() {
     try {
-      const registration = await navigator.serviceWorker.register('/static/service-worker.js');
+      const registration = await navigator.serviceWorker.register('/service-worker.js');
       console.log('Service Worker registered:', registration);
       return registration;
     } catch (error) {
@@ -0,0 +1,50 @@
+// Decoder for the binary point format served with ?format=binary
+// (application/vnd.proteeti.points, see services/serialization.py).
+// Returns [{lat, lng, category}, ...].
+function decodePoints(buffer) {
+    const bytes = new Uint8Array(buffer);
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(bytes[0], bytes[1], bytes[2], bytes[3]);
+    if (magic !== 'PTP1') throw new Error('Not a PTP1 point payload');
+
+    const nCategories = view.getUint16(4, true);
+    const count = view.getUint32(6, true);
+    const scale = view.getUint32(10, true);
+    let pos = 14;
+
+    const decoder = new TextDecoder();
+    const categories = [];
+    for (let i = 0; i < nCategories; i++) {
+        const length = bytes[pos];
+        categories.push(decoder.decode(bytes.subarray(pos + 1, pos + 1 + length)));
+        pos += 1 + length;
+    }
+
+    function readVarint() {
+        let value = 0, multiplier = 1, byte;
+        do {
+            byte = bytes[pos++];
+            value += (byte & 0x7f) * multiplier;
+            multiplier *= 128;
+        } while (byte >= 0x80);
+        return value;
+    }
+    function readDeltas() {
+        const values = new Float64Array(count);
+        let previous = 0;
+        for (let i = 0; i < count; i++) {
+            const raw = readVarint();
+            previous += raw % 2 ? -(raw + 1) / 2 : raw / 2;   // zigzag
+            values[i] = previous / scale;
+        }
+        return values;
+    }
+
+    const lats = readDeltas();
+    const lngs = readDeltas();
+    const points = new Array(count);
+    for (let i = 0; i < count; i++) {
+        points[i] = { lat: lats[i], lng: lngs[i], category: categories[readVarint()] };
+    }
+    return points;
+}
@@ -1,4 +1,233 @@
-// static/service-worker.js
+// static/service-worker.js  (served at /service-worker.js so its scope is the whole site)
+//
+// Offline support:
+//  - precaches the app shell (main pages, CSS, icons, Leaflet/Bootstrap)
+//  - pages: network first, cached copy when offline. Only the public shell pages
+//    in SHELL_PAGES are ever stored, and logging out clears them along with the
+//    runtime and API caches, so nobody's account or admin pages stay on a shared phone
+//  - fingerprinted /static assets (name.<hash>.ext): cache first, they never change
+//  - other static files and CDN assets: stale-while-revalidate
+//  - /api/reports and /api/sos-alerts: stale-while-revalidate (revalidation is a
+//    cheap 304 when nothing changed, thanks to the server's ETags)
+//  - POST /send_sos and /submit_report: if the network is down the request is
+//    stored in an IndexedDB outbox and replayed on 'sync' (or the next time the
+//    worker runs). Every request carries an Idempotency-Key so replays never
+//    create a second alert or report.
+
+const CACHE_VERSION = 'v2';
+const SHELL_CACHE = `proteeti-shell-${CACHE_VERSION}`;
+const RUNTIME_CACHE = `proteeti-runtime-${CACHE_VERSION}`;
+const API_CACHE = `proteeti-api-${CACHE_VERSION}`;
+
+const SHELL_PAGES = ['/', '/map', '/sos', '/resources'];
+const SHELL_URLS = [
+  ...SHELL_PAGES,
+  '/static/css/style.css',
+  '/static/js/points.js',
+  '/static/img/Logo.png',
+  '/static/img/favicon1.png',
+  'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+  'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.css',
+  'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
+  'https://unpkg.com/leaflet/dist/leaflet.css',
+  'https://unpkg.com/leaflet/dist/leaflet.js'
+];
+
+const SWR_PATHS = ['/api/reports', '/api/sos-alerts'];
+const LOGOUT_PATHS = ['/logout', '/admin/logout'];
+const FINGERPRINTED = /\.[0-9a-f]{10}\.[^./]+$/;   // services/assets.py hashed_name()
+const QUEUED_PATHS = ['/send_sos', '/submit_report'];
+const SYNC_TAG = 'proteeti-outbox';
+
+self.addEventListener('install', event => {
+  event.waitUntil(
+    caches.open(SHELL_CACHE).then(cache =>
+      // One unreachable URL must not abort the whole install
+      Promise.all(SHELL_URLS.map(url => cache.add(url).catch(() => null)))
+    ).then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', event => {
+  const keep = [SHELL_CACHE, RUNTIME_CACHE, API_CACHE];
+  event.waitUntil(
+    caches.keys()
+      .then(names => Promise.all(names.filter(n => n.startsWith('proteeti-') && !keep.includes(n)).map(n => caches.delete(n))))
+      .then(() => self.clients.claim())
+      .then(() => replayOutbox().catch(() => null))
+  );
+});
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  const url = new URL(request.url);
+
+  if (request.method === 'POST' && url.origin === self.location.origin && QUEUED_PATHS.includes(url.pathname)) {
+    event.respondWith(sendOrQueue(request));
+    return;
+  }
+  if (request.method !== 'GET') return;
+
+  const sameOrigin = url.origin === self.location.origin;
+  if (sameOrigin && SWR_PATHS.includes(url.pathname)) {
+    event.respondWith(staleWhileRevalidate(event, request, API_CACHE));
+  } else if (request.mode === 'navigate' && sameOrigin && LOGOUT_PATHS.includes(url.pathname)) {
+    event.respondWith(clearUserCaches().catch(() => null).then(() => fetch(request)));
+  } else if (request.mode === 'navigate') {
+    event.respondWith(networkFirst(request, sameOrigin && SHELL_PAGES.includes(url.pathname)));
+  } else if (sameOrigin && url.pathname.startsWith('/static/') && FINGERPRINTED.test(url.pathname)) {
+    event.respondWith(cacheFirst(request));
+  } else if (!sameOrigin || url.pathname.startsWith('/static/')) {
+    event.respondWith(staleWhileRevalidate(event, request, RUNTIME_CACHE));
+  }
+});
+
+self.addEventListener('sync', event => {
+  if (event.tag === SYNC_TAG) event.waitUntil(replayOutbox());
+});
+
+self.addEventListener('message', event => {
+  if (event.data === 'replay-outbox') event.waitUntil(replayOutbox().catch(() => null));
+});
+
+// ======= Read strategies =======
+async function networkFirst(request, storable) {
+  try {
+    const response = await fetch(request);
+    // Only public shell pages; /account, /admin and the like are never stored
+    if (storable && response.ok && !response.redirected) {
+      const cache = await caches.open(RUNTIME_CACHE);
+      cache.put(request, response.clone());
+    }
+    replayOutbox().catch(() => null);   // we are online again
+    return response;
+  } catch (error) {
+    const cached = await caches.match(request) || await caches.match('/');
+    return cached || new Response('You are offline.', { status: 503, headers: { 'Content-Type': 'text/plain' } });
+  }
+}
+
+async function cacheFirst(request) {
+  const cached = await caches.match(request);
+  if (cached) return cached;
+  const response = await fetch(request);
+  if (response.ok || response.type === 'opaque') {
+    const cache = await caches.open(RUNTIME_CACHE);
+    cache.put(request, response.clone());
+  }
+  return response;
+}
+
+async function staleWhileRevalidate(event, request, cacheName) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(request);
+  const refresh = fetch(request).then(response => {
+    if (response.ok || response.type === 'opaque') cache.put(request, response.clone());
+    return response;
+  }).catch(() => null);
+
+  if (cached) {
+    event.waitUntil(refresh);
+    return cached;
+  }
+  const response = await refresh;
+  if (response) return response;
+  return cacheName === API_CACHE
+    ? new Response('[]', { status: 503, headers: { 'Content-Type': 'application/json' } })
+    : Response.error();
+}
+
+async function clearUserCaches() {
+  // Pages and API data may carry the signed-in user's details; static assets do not
+  await Promise.all([caches.delete(RUNTIME_CACHE), caches.delete(API_CACHE)]);
+  const shell = await caches.open(SHELL_CACHE);
+  await Promise.all(SHELL_PAGES.map(page => shell.delete(page)));
+}
+
+// ======= Outbox (IndexedDB) =======
+function openOutbox() {
+  return new Promise((resolve, reject) => {
+    const open = indexedDB.open('proteeti-outbox', 1);
+    open.onupgradeneeded = () => open.result.createObjectStore('requests', { keyPath: 'id', autoIncrement: true });
+    open.onsuccess = () => resolve(open.result);
+    open.onerror = () => reject(open.error);
+  });
+}
+
+async function outbox(mode, fn) {
+  const db = await openOutbox();
+  return new Promise((resolve, reject) => {
+    const tx = db.transaction('requests', mode);
+    const result = fn(tx.objectStore('requests'));
+    tx.oncomplete = () => resolve(result && 'result' in result ? result.result : undefined);
+    tx.onerror = () => reject(tx.error);
+  });
+}
+
+function withKey(request) {
+  const headers = new Headers(request.headers);
+  if (!headers.has('Idempotency-Key')) headers.set('Idempotency-Key', crypto.randomUUID());
+  return headers;
+}
+
+async function sendOrQueue(request) {
+  const headers = withKey(request);
+  const body = await request.clone().text();
+  try {
+    return await fetch(request.url, { method: 'POST', headers, body, credentials: 'same-origin' });
+  } catch (error) {
+    headers.set('X-Queued-At', String(Date.now()));
+    await outbox('readwrite', store => store.add({
+      url: request.url,
+      headers: [...headers.entries()],
+      body
+    }));
+    if (self.registration.sync) {
+      try { await self.registration.sync.register(SYNC_TAG); } catch (e) { /* replayed on next start */ }
+    }
+    const isSos = new URL(request.url).pathname === '/send_sos';
+    return new Response(JSON.stringify({
+      status: 'queued',
+      message: isSos
+        ? 'You are offline. Your SOS is saved and will be sent automatically as soon as you are back online.'
+        : 'You are offline. Your report will be submitted when you are back online.'
+    }), { status: 202, headers: { 'Content-Type': 'application/json' } });
+  }
+}
+
+let replaying = null;
+
+function replayOutbox() {
+  // One replay at a time; overlapping triggers share it
+  if (!replaying) replaying = doReplay().finally(() => { replaying = null; });
+  return replaying;
+}
+
+async function doReplay() {
+  const entries = await outbox('readonly', store => store.getAll());
+  for (const entry of entries || []) {
+    // Throws while still offline: everything stays queued and sync retries
+    const response = await fetch(entry.url, {
+      method: 'POST',
+      headers: new Headers(entry.headers),
+      body: entry.body,
+      credentials: 'same-origin'
+    });
+    // Retry later on server errors, rate limiting, in-progress and logged-out responses
+    if (response.status >= 500 || [401, 409, 429].includes(response.status)) continue;
+
+    await outbox('readwrite', store => store.delete(entry.id));
+    if (new URL(entry.url).pathname === '/send_sos' && response.ok && self.Notification && Notification.permission === 'granted') {
+      self.registration.showNotification('SOS sent', {
+        body: 'Your queued SOS alert has been delivered to your trusted contacts.',
+        icon: '/static/img/Logo.png',
+        tag: 'proteeti-sos-replayed'
+      });
+    }
+  }
+}
+
+// ======= Push notifications =======
 self.addEventListener('push', event => {
   const data = event.data ? event.data.json() : {};
   const title = data.title || 'Proteeti Alert';
@@ -0,0 +1,46 @@
+"""Test fixtures: the app on a throwaway SQLite database.
+
+The environment is set before ``app`` is imported, because the config and
+``db.create_all()`` run at import time.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_db_dir = tempfile.mkdtemp(prefix="proteeti-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ["HTTP_CACHE_ENABLED"] = "0"       # every request reaches the view
+os.environ["SOS_ESCALATION_ENABLED"] = "0"
+os.environ["DEV_MODE"] = "1"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+from models.user import db  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    flask_app.config["TESTING"] = True
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin_loggedin"] = True
+    return client
+
+
+@pytest.fixture
+def session(app):
+    with app.app_context():
+        yield db.session
@@ -0,0 +1,86 @@
+"""The budgeted endpoints run a fixed number of SQL statements, however many rows they return."""
+import itertools
+
+import pytest
+
+from models.user import Report, SOSAlert, User
+from services.query_audit import QueryBudgetExceeded, assert_max_queries
+
+
+# (url, who is asking, @query_budget of the view)
+BUDGETED = [
+    ("/api/reports", "anonymous", 2),
+    ("/api/reports?format=columnar", "anonymous", 2),
+    ("/api/reports?format=binary", "anonymous", 2),
+    ("/api/sos-alerts", "anonymous", 2),
+    ("/map", "user", 2),
+    ("/api/admin/sos-alerts", "admin", 1),
+    ("/api/admin/users", "admin", 1),
+    ("/api/admin/reports/search?q=streetlight", "admin", 2),
+    ("/api/admin/resources", "admin", 1),
+    ("/api/admin/hotspots", "admin", 2),
+]
+
+_names = itertools.count()
+
+
+def add_rows(session, n):
+    """n users, each with a report and an SOS alert."""
+    for _ in range(n):
+        name = f"user{next(_names)}"
+        user = User(username=name, email=f"{name}@example.com", trusted_contacts=[])
+        session.add(user)
+        session.flush()
+        session.add(Report(username=name, lat=23.8, lng=90.4, category="Unsafe Lighting",
+                           description="broken streetlight near the bus stop"))
+        session.add(SOSAlert(user_id=user.id, username=name, lat=23.8, lng=90.4, status="active"))
+    session.commit()
+
+
+@pytest.fixture
+def clients(app, client, admin_client, session):
+    add_rows(session, 1)
+    user_client = app.test_client()
+    with user_client.session_transaction() as s:
+        s["loggedin"] = True
+        s["username"] = User.query.order_by(User.id.desc()).first().username
+    return {"anonymous": client, "user": user_client, "admin": admin_client}
+
+
+def fetch(client, url):
+    """GET and read the whole body, so streamed responses are fully consumed."""
+    response = client.get(url)
+    response.get_data()
+    return response
+
+
+@pytest.mark.parametrize("url, who, budget", BUDGETED)
+def test_view_within_budget(clients, session, url, who, budget):
+    add_rows(session, 5)
+    response = fetch(clients[who], url)
+    # Under TESTING the query auditor turns an overrun into a 500
+    assert response.status_code == 200, response.get_data(as_text=True)
+    # At least one: the statements of streamed bodies must be counted too
+    assert 1 <= int(response.headers["X-Query-Count"]) <= budget
+
+
+@pytest.mark.parametrize("url, who, budget", BUDGETED)
+def test_query_count_does_not_grow_with_rows(clients, session, url, who, budget):
+    add_rows(session, 3)
+    with assert_max_queries(1000) as baseline:
+        fetch(clients[who], url)
+
+    add_rows(session, 40)
+    # Whole request, session load and save included: same statements as before
+    with assert_max_queries(len(baseline)):
+        response = fetch(clients[who], url)
+    assert response.status_code == 200
+
+
+def test_assert_max_queries_reports_n_plus_one(session):
+    add_rows(session, 3)
+    ids = [r.id for r in Report.query.limit(3)]
+    with pytest.raises(QueryBudgetExceeded, match="3 queries executed, budget is 1"):
+        with assert_max_queries(1):
+            for report_id in ids:
+                session.get(Report, report_id, populate_existing=True)